@@ -1,21 +1,196 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+from django.utils.text import capfirst
+from django.utils.translation import gettext_lazy as _
 
-from .models import Employee, Organization, Phone, User
+from . import deletion, sharding
+from .models import (
+    DeletionJob, Employee, Organization, Phone, User, normalize_phone_number
+)
+from .search import EMPLOYEE, ORGANIZATION, get_lookup_backend
+
+
+# Фильтрованный перечень считается не дальше этого числа строк
+COUNT_LIMIT = 10000
+
+
+def estimate_count(queryset):
+    """Row count of the whole table from statistics, None if unknown"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # -1: таблица еще не анализировалась
+        return row[0] if row and row[0] >= 0 else None
+    # Два обращения к краям индекса pk; удаленные строки завышают оценку
+    bounds = queryset.model._default_manager.using(queryset.db).aggregate(
+        first=Min('pk'), last=Max('pk')
+    )
+    if bounds['last'] is None:
+        return 0
+    return bounds['last'] - bounds['first'] + 1
+
+
+class AtLeast(int):
+    """Row count that stopped at the limit, shown as 10000+"""
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator for big tables: the unfiltered count is estimated,
+    a filtered one stops COUNT_LIMIT rows after the requested page instead
+    of COUNT(*) over all, so every page stays reachable.
+    """
+
+    def __init__(self, *args, skip=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Строк до конца запрошенной страницы
+        self.skip = skip
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        limit = self.skip + COUNT_LIMIT
+        count = queryset[:limit].count()
+        return AtLeast(count) if count == limit else count
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Relation filter with an autocomplete input instead of a link for every
+    related object. Options come from the autocomplete view of the related
+    model admin, so that admin needs search_fields.
+    """
+    template = 'admin/api/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        self.admin_site = model_admin.admin_site
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.query_string = '?'
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        self.query_string = changelist.get_query_string(
+            remove=[self.lookup_kwarg]
+        )
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': self.query_string,
+            'display': _('All'),
+        }
+
+    def widget(self):
+        rel = self.field.remote_field
+        widget = AutocompleteSelect(
+            rel, self.admin_site, attrs={
+                'class': 'autocomplete-filter',
+                'data-parameter': self.lookup_kwarg,
+                'data-query-string': self.query_string,
+                'data-width': '100%',
+            }
+        )
+        field = forms.ModelChoiceField(
+            queryset=rel.model._default_manager.all(),
+            widget=widget,
+            required=False
+        )
+        return field.widget.render(self.lookup_kwarg, self.lookup_val)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelist for tables with millions of rows: estimated counts, no
+    second COUNT(*) for the unfiltered total, relations picked with
+    autocomplete.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Порядок перечня по умолчанию, заодно для страниц автодополнения
+    ordering = ('-pk',)
+    empty_value_display = '-пусто-'
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        try:
+            # Номер страницы перечня считается с нуля
+            page_num = int(request.GET.get(PAGE_VAR, 0))
+        except ValueError:
+            page_num = 0
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            skip=(max(page_num, 0) + 1) * per_page
+        )
+
+    @property
+    def media(self):
+        # Скрипты select2 для AutocompleteFilter на странице перечня
+        return super().media + AutocompleteSelect(None, None).media + (
+            forms.Media(js=[
+                'admin/js/jquery.init.js', 'api/js/autocomplete_filter.js'
+            ])
+        )
+
+
+class NameSearchMixin:
+    """
+    Case-insensitive search anywhere in the name through the trigram index
+    of the search backend (FTS5 or pg_trgm) instead of LIKE over the table
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(
+            get_lookup_backend().match_name(self.search_kind, term)
+        ), False
 
 
 admin.site.register(User, UserAdmin)
 
 
 @admin.register(Organization)
-class OrganizationAdmin(admin.ModelAdmin):
+class OrganizationAdmin(NameSearchMixin, ScalableAdmin):
+    search_kind = ORGANIZATION
     list_display = (
-        'pk', 'name', 'address', 'description', 'owner'
+        'pk', 'name', 'address', 'description', 'owner', 'shard', 'deleting'
     )
+    list_select_related = ('owner',)
+    autocomplete_fields = ('owner',)
     raw_id_fields = ('modifiers',)
     search_fields = ('name',)
-    list_filter = ('modifiers',)
-    empty_value_display = '-пусто-'
+    ordering = ('name',)
+    list_filter = (('modifiers', AutocompleteFilter),)
 
     fieldsets = (
         (None, {
@@ -25,22 +200,96 @@ class OrganizationAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """
+        Counts for the confirmation page instead of the cascade collector,
+        which would load every employee and phone: they are deleted later
+        by a DeletionJob, one count query per table and shard
+        """
+        organizations = list(objs)
+        by_shard = {}
+        for organization in organizations:
+            by_shard.setdefault(
+                sharding.shard_of(organization)
+                if sharding.is_enabled() else None, []
+            ).append(organization.pk)
+        employees = phones = 0
+        for alias, ids in by_shard.items():
+            with sharding.use(alias):
+                employees += Employee.objects.filter(
+                    organization_id__in=ids
+                ).count()
+                phones += Phone.objects.filter(
+                    employee__organization_id__in=ids
+                ).count()
+        deleted_objects = [
+            f'{capfirst(Organization._meta.verbose_name)}: {organization}'
+            for organization in organizations
+        ]
+        model_count = {
+            Organization._meta.verbose_name_plural: len(organizations),
+            Employee._meta.verbose_name_plural: employees,
+            Phone._meta.verbose_name_plural: phones,
+        }
+        return deleted_objects, model_count, set(), []
+
+    def delete_model(self, request, obj):
+        # Как и API: сотрудники удаляются в фоне во всех базах
+        deletion.schedule(obj, request.user)
+
+    def delete_queryset(self, request, queryset):
+        for organization in queryset:
+            deletion.schedule(organization, request.user)
 
+
+# С разделением по организациям (api/sharding.py) здесь видны только
+# сотрудники и телефоны основной базы
 @admin.register(Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(NameSearchMixin, ScalableAdmin):
+    search_kind = EMPLOYEE
     list_display = (
         'pk', 'name', 'position', 'organization'
     )
+    list_select_related = ('organization',)
+    autocomplete_fields = ('organization',)
     search_fields = ('name',)
-    list_filter = ('organization',)
-    empty_value_display = '-пусто-'
+    list_filter = (('organization', AutocompleteFilter),)
 
 
 @admin.register(Phone)
-class PhoneAdmin(admin.ModelAdmin):
+class PhoneAdmin(ScalableAdmin):
     list_display = (
         'pk', 'phone_number', 'phone_type', 'employee'
     )
+    list_select_related = ('employee',)
+    autocomplete_fields = ('employee',)
     search_fields = ('phone_number',)
-    list_filter = ('phone_type',)
-    empty_value_display = '-пусто-'
+    list_filter = (
+        'phone_type', ('employee__organization', AutocompleteFilter),
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Numbers with the digits of the search term anywhere, so a number is
+        found without its country code
+        """
+        digits = normalize_phone_number(search_term)
+        if not search_term.strip():
+            return queryset, False
+        if not digits:
+            return queryset.none(), False
+        return queryset.filter(
+            get_lookup_backend().match_phone(digits)
+        ), False
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'organization_name', 'status', 'deleted_employees',
+        'total_employees', 'created_at', 'finished_at'
+    )
+    list_filter = ('status',)
+    readonly_fields = [
+        field.name for field in DeletionJob._meta.fields
+    ]
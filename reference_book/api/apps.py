@@ -3,3 +3,19 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import checks, signals  # noqa: F401
+        from .db import check_connections
+        from .metrics import install_query_recorder
+        from .sharding import reserve_id_ranges
+
+        connection_created.connect(install_query_recorder)
+        post_migrate.connect(reserve_id_ranges, sender=self)
+        if settings.DB_HEALTH_CHECKS:
+            request_started.connect(check_connections)
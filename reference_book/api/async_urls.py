@@ -0,0 +1,13 @@
+from django.urls import include, path
+
+from .async_views import make_async_urlpatterns
+from .urls import auth_urlpatterns, router_1, swagger_urlpatterns
+from .views import metrics_view
+
+
+urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
+    path('v1/auth/', include(auth_urlpatterns)),
+    path('v1/', include(make_async_urlpatterns(router_1.urls))),
+    path('v1/', include(swagger_urlpatterns))
+]
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework import permissions
+
+from .metrics import current_request
+
+
+# Маршруты чтения, которые под ASGI обслуживаются пулом потоков
+ASYNC_READ_ROUTES = {
+    'autocomplete-list',
+    'organizations-list',
+    'organizations-search',
+    'employees-list',
+    'employees-detail',
+    'phones-list',
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_DB_WORKERS,
+            thread_name_prefix='api-read'
+        )
+    return _executor
+
+
+def _run_read_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # Рендерим в том же потоке, иначе Django выполнит render()
+        # в единственном потоке для синхронного кода
+        if hasattr(response, 'render') and callable(response.render):
+            started = time.perf_counter()
+            response.render()
+            request_metrics = current_request()
+            if request_metrics is not None:
+                request_metrics.render_time += time.perf_counter() - started
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Coroutine wrapper for a synchronous DRF view. Under ASGI Django runs
+    sync views one at a time in a single thread; safe requests are moved
+    to a bounded pool instead, so DB I/O and JWT authentication of
+    concurrent reads never block the event loop or each other.
+    """
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS:
+            return await sync_to_async(view, thread_sensitive=True)(
+                request, *args, **kwargs
+            )
+        loop = asyncio.get_event_loop()
+        # Контекст копируется, чтобы запросы учитывались в метриках запроса
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            get_executor(),
+            partial(context.run, _run_read_view, view, request, *args,
+                    **kwargs)
+        )
+
+    wrapper.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    wrapper.cls = getattr(view, 'cls', None)
+    wrapper.initkwargs = getattr(view, 'initkwargs', None)
+    wrapper.actions = getattr(view, 'actions', None)
+    return wrapper
+
+
+def make_async_urlpatterns(urlpatterns):
+    return [
+        URLPattern(
+            pattern.pattern, async_read_view(pattern.callback),
+            pattern.default_args, pattern.name
+        )
+        if isinstance(pattern, URLPattern)
+        and pattern.name in ASYNC_READ_ROUTES
+        else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed, InvalidToken
+)
+from rest_framework_simplejwt.settings import api_settings
+
+
+DATABASE = 'database'
+CACHED = 'cached'
+CLAIMS = 'claims'
+
+EMAIL_CLAIM = 'email'
+
+User = get_user_model()
+
+
+class UserCache:
+    """
+    LRU of user rows by pk for the current process. Rows live for
+    AUTH_USER_CACHE_SECONDS and are dropped at once by the User signals,
+    so changes made by other processes are seen after that timeout.
+    Field values are cached, every request gets its own User instance.
+    """
+
+    def __init__(self):
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+        # Сброс во время запроса к БД не должен вернуть в кэш старую строку
+        self.invalidations = 0
+        self.fields = [field.attname for field in User._meta.concrete_fields]
+        self.is_active_index = self.fields.index('is_active')
+
+    def get(self, user_id):
+        """User by pk from the cache or one query, None if there is none"""
+        values = self.values(user_id)
+        if values is None:
+            return None
+        return User.from_db('default', self.fields, values)
+
+    def is_active(self, user_id):
+        """
+        is_active of the cached row, None if there is no such user: no
+        User instance is built
+        """
+        values = self.values(user_id)
+        return None if values is None else values[self.is_active_index]
+
+    def values(self, user_id):
+        """Field values of the row from the cache or one query"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.rows.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.rows.move_to_end(user_id)
+                return entry[1]
+            invalidations = self.invalidations
+        values = User.objects.filter(pk=user_id).values_list(
+            *self.fields
+        ).first()
+        if values is None:
+            return None
+        size = settings.AUTH_USER_CACHE_SIZE
+        with self.lock:
+            if size > 0 and invalidations == self.invalidations:
+                self.rows[user_id] = (
+                    now + settings.AUTH_USER_CACHE_SECONDS, values
+                )
+                self.rows.move_to_end(user_id)
+                while len(self.rows) > size:
+                    self.rows.popitem(last=False)
+        return values
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.invalidations += 1
+            self.rows.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += 1
+            self.rows.clear()
+
+
+users = UserCache()
+
+
+def check_active(is_active):
+    if is_active is None:
+        raise AuthenticationFailed(
+            'Пользователь не найден', code='user_not_found'
+        )
+    if not is_active:
+        raise AuthenticationFailed(
+            'Пользователь неактивен', code='user_inactive'
+        )
+
+
+def get_active_user(user_id):
+    user = users.get(user_id)
+    check_active(user and user.is_active)
+    return user
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    User known from the access token: pk and email come from the claims,
+    any other attribute builds the user from the cached row on first use.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, email=None):
+        super().__init__(lambda: get_active_user(user_id))
+        self.__dict__['_user_id'] = user_id
+        self.__dict__['_email'] = email
+
+    def __bool__(self):
+        return True
+
+    @property
+    def pk(self):
+        return self.__dict__['_user_id']
+
+    id = pk
+
+    @property
+    def email(self):
+        # После загрузки строки email берется из нее: в claims он может
+        # устареть до обновления токена
+        if self._email is not None and self._wrapped is empty:
+            return self._email
+        return self.__getattr__('email')
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    JWTAuthentication with the user resolved according to JWT_USER_MODE:
+    database - a query per request as in simplejwt, cached - the row from
+    the in-process user cache, claims - a TokenUser that loads the row only
+    when a view needs more than pk and email. In every mode a deleted or
+    deactivated user is rejected before the view runs.
+    """
+
+    def get_user(self, validated_token):
+        mode = settings.JWT_USER_MODE
+        if mode == DATABASE:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                'Токен не содержит идентификатор пользователя'
+            )
+        if mode == CLAIMS:
+            # Строка из кэша пользователей, экземпляр User не создается
+            check_active(users.is_active(user_id))
+            return TokenUser(user_id, validated_token.get(EMAIL_CLAIM))
+        return get_active_user(user_id)
@@ -0,0 +1,435 @@
+"""
+Typeahead over organization names, employee names and phone numbers from a
+per-process prefix index: sorted lists of short keys searched with
+bisect. Names are indexed from the start of every word, phones by their
+digits. The index is built on first use, kept current by the model
+signals and the bulk paths of this process through update() once their
+transaction commits, and rebuilt in the background every
+AUTOCOMPLETE_MAX_AGE seconds to pick up changes of other processes.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from . import sharding
+from .models import (
+    Employee, Organization, Phone, digits_prefix, normalize_phone_number
+)
+from .search import EMPLOYEE, ORGANIZATION, PHONE
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = (ORGANIZATION, EMPLOYEE, PHONE)
+
+# Ключи обрезаются: префикс длиннее проверяется по полному тексту
+KEY_LENGTH = 12
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Сколько ключей просматривается на запрос, сколько бы их ни совпало
+SCAN_LIMIT = 500
+
+WORD_START = re.compile(r'(?:^|[\s\-"«(])(?=\w)')
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def word_keys(text):
+    """Keys for every word of a name: the rest of the name from the word"""
+    text = normalize(text)
+    return {
+        text[match.end():match.end() + KEY_LENGTH]
+        for match in WORD_START.finditer(text)
+    }
+
+
+def object_keys(kind, text):
+    if kind == PHONE:
+        digits = normalize_phone_number(text)
+        return {digits[:KEY_LENGTH]} if digits else set()
+    return word_keys(text)
+
+
+def matches(kind, text, prefix):
+    """Full check for prefixes longer than the stored keys"""
+    if kind == PHONE:
+        return normalize_phone_number(text).startswith(prefix)
+    text = normalize(text)
+    return any(
+        text.startswith(prefix, match.end())
+        for match in WORD_START.finditer(text)
+    )
+
+
+class PrefixIndex:
+    """
+    For every kind a sorted list of keys with a parallel list of object
+    ids, and the display text of every object. Writes keep the lists
+    sorted with list.insert, lookups are a bisect and a short scan.
+    """
+
+    def __init__(self):
+        self.keys = {kind: [] for kind in KINDS}
+        self.ids = {kind: [] for kind in KINDS}
+        # id -> (текст, id организации, id сотрудника для телефона)
+        self.objects = {kind: {} for kind in KINDS}
+        # Организации в фоновом удалении: их объекты не выдаются
+        self.hidden = set()
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+    def load(self, items):
+        """Fill an empty index from (kind, id, text, org id, employee id)"""
+        pairs = {kind: [] for kind in KINDS}
+        count = 0
+        for kind, object_id, text, organization_id, employee_id in items:
+            self.objects[kind][object_id] = (
+                text, organization_id, employee_id
+            )
+            keys = object_keys(kind, text)
+            pairs[kind].extend((key, object_id) for key in keys)
+            count += len(keys)
+            if count > settings.AUTOCOMPLETE_MAX_KEYS:
+                return False
+        for kind, kind_pairs in pairs.items():
+            kind_pairs.sort()
+            self.keys[kind] = [key for key, _ in kind_pairs]
+            self.ids[kind] = [object_id for _, object_id in kind_pairs]
+        return True
+
+    def _add(self, kind, object_id, text, organization_id, employee_id=None):
+        self._remove(kind, object_id)
+        self.objects[kind][object_id] = (text, organization_id, employee_id)
+        keys, ids = self.keys[kind], self.ids[kind]
+        for key in object_keys(kind, text):
+            position = bisect_left(keys, key)
+            # Одинаковые ключи упорядочены по id
+            while (position < len(keys) and keys[position] == key
+                   and ids[position] < object_id):
+                position += 1
+            keys.insert(position, key)
+            ids.insert(position, object_id)
+
+    def _remove(self, kind, object_id):
+        current = self.objects[kind].pop(object_id, None)
+        if current is None:
+            return
+        keys, ids = self.keys[kind], self.ids[kind]
+        for key in object_keys(kind, current[0]):
+            position = bisect_left(keys, key)
+            while position < len(keys) and keys[position] == key:
+                if ids[position] == object_id:
+                    del keys[position]
+                    del ids[position]
+                    break
+                position += 1
+
+    def index_organization(self, organization):
+        with self.lock:
+            self._add(
+                ORGANIZATION, organization.pk, organization.name,
+                organization.pk
+            )
+
+    def index_employee(self, employee):
+        with self.lock:
+            self._add(
+                EMPLOYEE, employee.pk, employee.name,
+                employee.organization_id
+            )
+
+    def index_phone(self, phone, organization_id):
+        with self.lock:
+            self._add(
+                PHONE, phone.pk, phone.phone_number, organization_id,
+                phone.employee_id
+            )
+
+    def index_bulk(self, organization_id, employees, phones):
+        with self.lock:
+            for employee in employees:
+                self._add(
+                    EMPLOYEE, employee.pk, employee.name, organization_id
+                )
+            for phone in phones:
+                self._add(
+                    PHONE, phone.pk, phone.phone_number, organization_id,
+                    phone.employee_id
+                )
+
+    def remove(self, kind, object_id):
+        with self.lock:
+            self._remove(kind, object_id)
+
+    def remove_many(self, kind, object_ids):
+        with self.lock:
+            for object_id in object_ids:
+                self._remove(kind, object_id)
+
+    def hide_organization(self, organization_id):
+        with self.lock:
+            self.hidden.add(organization_id)
+
+    def unhide_organization(self, organization_id):
+        with self.lock:
+            self.hidden.discard(organization_id)
+
+    def _scan(self, kind, prefix, found, limit):
+        keys, ids = self.keys[kind], self.ids[kind]
+        objects = self.objects[kind]
+        key = prefix[:KEY_LENGTH]
+        position = bisect_left(keys, key)
+        end = min(position + SCAN_LIMIT, len(keys))
+        seen = set()
+        while position < end and len(found) < limit:
+            if not keys[position].startswith(key):
+                break
+            object_id = ids[position]
+            position += 1
+            if object_id in seen:
+                continue
+            seen.add(object_id)
+            text, organization_id, employee_id = objects[object_id]
+            if organization_id in self.hidden:
+                continue
+            if len(prefix) > KEY_LENGTH and not matches(kind, text, prefix):
+                continue
+            item = {
+                'type': kind,
+                'id': object_id,
+                'text': text,
+                'organization_id': organization_id,
+            }
+            if employee_id is not None:
+                item['employee_id'] = employee_id
+            found.append(item)
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """Organizations, then employees, then phones matching the query"""
+        prefix = normalize(query.strip())
+        digits = normalize_phone_number(query)
+        found = []
+        with self.lock:
+            if len(prefix) >= MIN_QUERY_LENGTH:
+                self._scan(ORGANIZATION, prefix, found, limit)
+                self._scan(EMPLOYEE, prefix, found, limit)
+            # Номер ищется, только если в запросе нет букв
+            if (len(digits) >= MIN_QUERY_LENGTH
+                    and not any(char.isalpha() for char in query)):
+                self._scan(PHONE, digits, found, limit)
+        return found
+
+
+def iterate_directory():
+    for pk, name in Organization.objects.filter(
+        deleting=False
+    ).values_list('pk', 'name').iterator(chunk_size=2000):
+        yield ORGANIZATION, pk, name, pk, None
+    for alias in sharding.shards():
+        for pk, name, organization_id in Employee.objects.using(
+            alias
+        ).filter(
+            sharding.exclude_deleting('organization')
+        ).values_list(
+            'pk', 'name', 'organization_id'
+        ).iterator(chunk_size=2000):
+            yield EMPLOYEE, pk, name, organization_id, None
+        for pk, number, employee_id, organization_id in Phone.objects.using(
+            alias
+        ).filter(
+            sharding.exclude_deleting('employee__organization')
+        ).values_list(
+            'pk', 'phone_number', 'employee_id', 'employee__organization_id'
+        ).iterator(chunk_size=2000):
+            yield PHONE, pk, number, organization_id, employee_id
+
+
+def build():
+    """New index of the whole directory, None if it exceeds the limit"""
+    index = PrefixIndex()
+    if not index.load(iterate_directory()):
+        logger.warning(
+            'Autocomplete index disabled: more than %s keys',
+            settings.AUTOCOMPLETE_MAX_KEYS
+        )
+        return None
+    return index
+
+
+_index = None
+_too_large = False
+_build_lock = threading.Lock()
+_rebuilding = threading.Event()
+# Изменения, примененные во время построения индекса: снимок базы мог
+# быть прочитан до них, поэтому они повторяются на новом индексе
+_pending = None
+_pending_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.AUTOCOMPLETE_ENABLED and not _too_large
+
+
+def get_index(build_missing=False):
+    """
+    The index of this process. Without build_missing it is None until the
+    first lookup has built it: writes before that need no indexing.
+    """
+    global _too_large
+    if not is_enabled():
+        return None
+    if _index is None and build_missing:
+        with _build_lock:
+            if _index is None and not _too_large:
+                _start_build()
+                index = None
+                try:
+                    index = build()
+                    _too_large = index is None
+                finally:
+                    _install(index)
+    if (_index is not None and not _rebuilding.is_set()
+            and time.monotonic() - _index.built_at
+            > settings.AUTOCOMPLETE_MAX_AGE):
+        _rebuilding.set()
+        threading.Thread(
+            target=_rebuild, name='autocomplete-rebuild', daemon=True
+        ).start()
+    return _index
+
+
+def _start_build():
+    global _pending
+    with _pending_lock:
+        _pending = []
+
+
+def _install(index):
+    """
+    Replay the writes made while index was built and make it current, under
+    the same lock as the writes: none of them is lost in between. None
+    (the build failed) keeps the current index.
+    """
+    global _index, _pending
+    with _pending_lock:
+        if index is not None:
+            for method, args in _pending:
+                getattr(index, method)(*args)
+            _index = index
+        _pending = None
+
+
+def _rebuild():
+    global _index, _too_large
+    _start_build()
+    index = None
+    try:
+        index = build()
+        if index is None:
+            # Справочник перерос AUTOCOMPLETE_MAX_KEYS
+            _too_large = True
+            _index = None
+    except Exception:
+        logger.exception('Autocomplete index rebuild failed')
+        # Следующая попытка - через AUTOCOMPLETE_MAX_AGE; после reset()
+        # индекса может уже не быть
+        current = _index
+        if current is not None:
+            current.built_at = time.monotonic()
+    finally:
+        _install(index)
+        connections.close_all()
+        _rebuilding.clear()
+
+
+def _apply(method, args):
+    with _pending_lock:
+        if _index is not None:
+            getattr(_index, method)(*args)
+        if _pending is not None:
+            _pending.append((method, args))
+
+
+def update(method, *args, using=None):
+    """
+    Call PrefixIndex.method(*args) once the transaction of using (the
+    active shard by default) commits, so a rolled back write never becomes
+    searchable. Writes made while the index is being (re)built are also
+    replayed on the new one.
+    """
+    if is_enabled():
+        transaction.on_commit(
+            lambda: _apply(method, args),
+            using=using or sharding.current() or DEFAULT_DB_ALIAS
+        )
+
+
+def reset():
+    """Drop the index of this process, the next lookup builds a new one"""
+    global _index, _too_large
+    with _build_lock:
+        _index = None
+        _too_large = False
+
+
+def lookup_database(query, limit=DEFAULT_LIMIT):
+    """The same lookup with queries, when the index is disabled"""
+    query = query.strip()
+    digits = normalize_phone_number(query)
+    found = []
+    if len(query) >= MIN_QUERY_LENGTH:
+        word_start = (
+            Q(name__istartswith=query) | Q(name__icontains=' ' + query)
+        )
+        for pk, name in Organization.objects.filter(
+            word_start, deleting=False
+        ).order_by(
+            'name', 'pk'
+        ).values_list('pk', 'name')[:limit]:
+            found.append({
+                'type': ORGANIZATION, 'id': pk, 'text': name,
+                'organization_id': pk,
+            })
+        for pk, name, organization_id in sharding.everywhere(
+            Employee.objects.filter(
+                word_start, sharding.exclude_deleting('organization')
+            ).order_by('name', 'pk').values_list(
+                'pk', 'name', 'organization_id'
+            ),
+            key=itemgetter(1, 0)
+        )[:limit - len(found)]:
+            found.append({
+                'type': EMPLOYEE, 'id': pk, 'text': name,
+                'organization_id': organization_id,
+            })
+    if (len(digits) >= MIN_QUERY_LENGTH and len(found) < limit
+            and not any(char.isalpha() for char in query)):
+        phones = Phone.objects.filter(
+            sharding.exclude_deleting('employee__organization'),
+            digits_prefix('phone_digits', digits)
+        ).order_by('phone_digits', 'pk').values_list(
+            'pk', 'phone_number', 'employee_id', 'employee__organization_id',
+            'phone_digits'
+        )
+        for pk, number, employee_id, organization_id, _ in sharding.everywhere(
+            phones, key=itemgetter(4, 0)
+        )[:limit - len(found)]:
+            found.append({
+                'type': PHONE, 'id': pk, 'text': number,
+                'organization_id': organization_id,
+                'employee_id': employee_id,
+            })
+    return found
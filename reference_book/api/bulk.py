@@ -0,0 +1,209 @@
+"""
+Bulk operations inside one organization: create employees with phones,
+replace a number, add a phone to many employees, delete a set of phones.
+Every operation is one transaction with set-based validation and bulk
+writes; like the importer it sends no model signals and updates the read
+model, search index, change feed and cache generations itself.
+"""
+from django.db.models import Prefetch
+
+from . import autocomplete, db, read_model, sharding
+from .cache import ORGANIZATIONS, bump_generation, organization_scope
+from .models import (
+    Employee, Phone, PERSONAL, Tombstone, mark_changed,
+    normalize_phone_number
+)
+from .rules import DUPLICATE_PHONE_MESSAGE, PersonalNumberRule
+from .search import PHONE, get_search_backend
+
+
+BATCH_SIZE = 1000
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+FAILED = 'failed'
+
+PHONE_NOT_FOUND_MESSAGE = 'Телефон не найден в организации'
+EMPLOYEE_NOT_FOUND_MESSAGE = 'Сотрудник не найден в организации'
+
+
+def summary(results, status):
+    failed = sum(1 for result in results if 'errors' in result)
+    return {
+        status: len(results) - failed,
+        FAILED: failed,
+        'results': results,
+    }
+
+
+def apply_side_effects(organization_id, employee_ids, removed=(),
+                       indexed=()):
+    if read_model.is_enabled():
+        read_model.refresh_employees(set(employee_ids), create=False)
+    backend = get_search_backend()
+    if backend:
+        backend.remove_many(PHONE, removed)
+        backend.index_bulk(organization_id, [], indexed)
+    autocomplete.update('remove_many', PHONE, list(removed))
+    autocomplete.update('index_bulk', organization_id, [], list(indexed))
+
+
+def create_employees(organization, records):
+    """
+    Create employees with their phones in two bulk inserts. Records are
+    validated data of EmployeeSerializer, the rules are checked by the
+    caller. Returns the employees with phones prefetched, in input order.
+    """
+    with sharding.atomic():
+        Employee.objects.bulk_create(mark_changed(
+            Employee(
+                name=record['name'],
+                position=record['position'],
+                organization=organization
+            )
+            for record in records
+        ), batch_size=BATCH_SIZE)
+        # bulk_create на SQLite не возвращает pk - ФИО уникальны
+        # в рамках организации, поэтому получаем их одним запросом
+        ids = dict(Employee.objects.filter(
+            organization=organization,
+            name__in=[record['name'] for record in records]
+        ).values_list('name', 'pk'))
+        Phone.objects.bulk_create(mark_changed(
+            Phone(
+                employee_id=ids[record['name']],
+                phone_type=phone['phone_type'],
+                phone_number=phone['phone_number'],
+                phone_digits=normalize_phone_number(phone['phone_number'])
+            )
+            for record in records for phone in record['phones']
+        ), batch_size=BATCH_SIZE)
+        employees = list(Employee.objects.filter(
+            pk__in=ids.values()
+        ).order_by('pk').prefetch_related(
+            Prefetch('phones', queryset=Phone.objects.order_by('pk'))
+        ))
+        if read_model.is_enabled():
+            read_model.refresh_employees(ids.values())
+        phones = [
+            phone for employee in employees for phone in employee.phones.all()
+        ]
+        backend = get_search_backend()
+        if backend:
+            backend.index_bulk(organization.pk, employees, phones)
+        autocomplete.update('index_bulk', organization.pk, employees, phones)
+    bump_generation(ORGANIZATIONS, organization_scope(organization.pk))
+    return employees
+
+
+def replace_number(organization, old_number, new_number):
+    """Replace old_number with new_number on every phone of organization"""
+    old_digits = normalize_phone_number(old_number)
+    new_digits = normalize_phone_number(new_number)
+    targets = Phone.objects.filter(
+        employee__organization=organization, phone_digits=old_digits
+    )
+    results = []
+    updated = []
+    with sharding.atomic():
+        rule = PersonalNumberRule([new_digits], exclude=targets.values('pk'))
+        for phone in targets.order_by('pk').only(
+            'pk', 'phone_type', 'employee_id'
+        ):
+            if not rule.add(new_digits, phone.phone_type == PERSONAL):
+                results.append({
+                    'id': phone.pk, 'errors': [DUPLICATE_PHONE_MESSAGE]
+                })
+                continue
+            phone.phone_number = new_number
+            phone.phone_digits = new_digits
+            updated.append(phone)
+            results.append({'id': phone.pk, 'status': UPDATED})
+        Phone.objects.bulk_update(
+            mark_changed(updated),
+            ['phone_number', 'phone_digits', 'revision'],
+            batch_size=BATCH_SIZE
+        )
+        apply_side_effects(
+            organization.pk, [phone.employee_id for phone in updated],
+            removed=[phone.pk for phone in updated], indexed=updated
+        )
+    if updated:
+        bump_generation(ORGANIZATIONS, organization_scope(organization.pk))
+    return summary(results, UPDATED)
+
+
+def add_phone(organization, employees, phone_type, phone_number):
+    """Give every listed employee of organization the same phone"""
+    digits = normalize_phone_number(phone_number)
+    results = []
+    phones = []
+    with sharding.atomic():
+        found = set(Employee.objects.filter(
+            organization=organization, pk__in=employees
+        ).values_list('pk', flat=True))
+        rule = PersonalNumberRule([digits])
+        for employee_id in dict.fromkeys(employees):
+            if employee_id not in found:
+                errors = [EMPLOYEE_NOT_FOUND_MESSAGE]
+            elif not rule.add(digits, phone_type == PERSONAL):
+                errors = [DUPLICATE_PHONE_MESSAGE]
+            else:
+                phones.append(Phone(
+                    employee_id=employee_id,
+                    phone_type=phone_type,
+                    phone_number=phone_number,
+                    phone_digits=digits
+                ))
+                continue
+            results.append({'employee_id': employee_id, 'errors': errors})
+        Phone.objects.bulk_create(
+            mark_changed(phones), batch_size=BATCH_SIZE
+        )
+        if phones and phones[0].pk is None:
+            # bulk_create на SQLite не возвращает pk: берем последний
+            # такой номер каждого сотрудника
+            ids = dict(Phone.objects.filter(
+                employee_id__in=[phone.employee_id for phone in phones],
+                phone_digits=digits, phone_type=phone_type
+            ).order_by('pk').values_list('employee_id', 'pk'))
+            for phone in phones:
+                phone.pk = ids[phone.employee_id]
+        apply_side_effects(
+            organization.pk, [phone.employee_id for phone in phones],
+            indexed=phones
+        )
+    if phones:
+        bump_generation(ORGANIZATIONS, organization_scope(organization.pk))
+    results.extend(
+        {'employee_id': phone.employee_id, 'id': phone.pk, 'status': CREATED}
+        for phone in phones
+    )
+    return summary(results, CREATED)
+
+
+def delete_phones(organization, ids):
+    """Delete the listed phones that belong to organization"""
+    results = []
+    with sharding.atomic():
+        phones = dict(Phone.objects.filter(
+            employee__organization=organization, pk__in=ids
+        ).values_list('pk', 'employee_id'))
+        for phone_id in dict.fromkeys(ids):
+            if phone_id in phones:
+                results.append({'id': phone_id, 'status': DELETED})
+            else:
+                results.append({
+                    'id': phone_id, 'errors': [PHONE_NOT_FOUND_MESSAGE]
+                })
+        # На телефоны никто не ссылается: удаляем без сигналов
+        # post_delete, их работу делает apply_side_effects
+        db.delete_rows(Phone, 'id', phones)
+        Tombstone.record(Phone, phones, organization.pk)
+        apply_side_effects(
+            organization.pk, phones.values(), removed=list(phones)
+        )
+    if phones:
+        bump_generation(ORGANIZATIONS, organization_scope(organization.pk))
+    return summary(results, DELETED)
@@ -0,0 +1,105 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db import is_pinned_to_primary
+
+
+ORGANIZATIONS = 'organizations'
+
+
+def organization_scope(org_id):
+    return f'organization:{org_id}'
+
+
+def acl_scope(org_id):
+    return f'acl:{org_id}'
+
+
+def _generation_key(scope):
+    return f'api:generation:{scope}'
+
+
+def get_generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Старт с текущего времени в мс: после вытеснения счетчика из
+            # кэша новое значение не совпадет с уже использованными
+            generations[key] = int(time.time() * 1000)
+            cache.add(key, generations[key], timeout=None)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(*scopes):
+    """
+    Bump now or, inside a transaction, right after it commits: a response
+    built in between would otherwise be cached under the new generation
+    from rows that are not visible yet
+    """
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+class CachedResponseMixin:
+    """
+    Cache serialized data of read responses keyed by path, query string
+    and generation counters of the scopes the response depends on.
+    Model signals bump the counters (see api/signals.py), so stale entries
+    are never read again and simply expire.
+    """
+    cache_timeout = None
+
+    def get_cache_scopes(self):
+        return [ORGANIZATIONS]
+
+    def get_cache_key(self, request):
+        query = urlencode(sorted(request.query_params.items()))
+        generations = get_generations(self.get_cache_scopes())
+        raw_key = '{}?{}:{}:{}'.format(
+            request.path, query,
+            request.accepted_renderer.format,
+            '.'.join(str(generation) for generation in generations)
+        )
+        return 'api:response:' + hashlib.md5(raw_key.encode()).hexdigest()
+
+    def cached(self, handler, request, *args, **kwargs):
+        timeout = self.cache_timeout
+        if timeout is None:
+            timeout = settings.API_CACHE_TIMEOUT
+        if not timeout:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        etag = '"{}"'.format(key.rsplit(':', 1)[-1])
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # Только что изменивший данные пользователь читает основную
+            # базу; его ответ заменяет запись, возможно собранную по
+            # отстающей реплике
+            data = None if is_pinned_to_primary() else cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, timeout)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        return response
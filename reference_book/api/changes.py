@@ -0,0 +1,217 @@
+"""
+Change feed for sync clients: every write of an organization, employee or
+phone marks it PENDING (see Revisioned in api/models.py), deletes leave
+a Tombstone. Before answering, the feed gives the written rows the next
+revisions (sequence): only committed rows are visible to it, so a change
+committed later always gets a larger revision than every change already
+served, and writers never wait for each other on a shared counter. A
+client keeps the last revision it has applied and asks for what changed
+after it, so a sync reads only the changed rows.
+"""
+from datetime import timedelta
+from operator import itemgetter
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import sharding
+from .models import (
+    COUNTER_ID, PENDING, Employee, Organization, Phone, RevisionCounter,
+    Tombstone
+)
+
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+SEQUENCE_CHUNK_SIZE = 1000
+
+# Порядок выдачи ревизий: организация раньше своих сотрудников, сотрудник
+# раньше своих телефонов
+SEQUENCED_MODELS = (Organization, Employee, Phone, Tombstone)
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# Тип объекта -> строки и поля, которые получает клиент; удаляемая
+# организация уже отдана надгробием (api/deletion.py)
+FEEDS = {
+    queryset.model._meta.model_name: (queryset, fields)
+    for queryset, fields in (
+        (
+            Organization.objects.filter(deleting=False),
+            ('id', 'name', 'address', 'description')
+        ),
+        (
+            Employee.objects.all(),
+            ('id', 'organization_id', 'name', 'position')
+        ),
+        (
+            Phone.objects.all(),
+            ('id', 'employee_id', 'phone_type', 'phone_number')
+        ),
+    )
+}
+
+
+class FeedExpired(Exception):
+    """The tombstones after the requested revision are already pruned"""
+
+    def __init__(self, pruned):
+        super().__init__(pruned)
+        self.pruned = pruned
+
+
+def feed_tables():
+    """(model, alias) of every table of the feed, in the sequencing order"""
+    for model in SEQUENCED_MODELS:
+        if model._meta.model_name in sharding.SHARDED_MODELS:
+            for alias in sharding.shards():
+                yield model, alias
+        else:
+            yield model, DEFAULT_DB_ALIAS
+
+
+def lock_counter():
+    """
+    Last revision, with the counter row locked until the transaction on
+    the default database ends
+    """
+    counter = RevisionCounter.objects.filter(pk=COUNTER_ID)
+    if not counter.update(value=F('value')):
+        # Строку счетчика удаляет flush (TransactionTestCase, загрузка
+        # фикстур); параллельный запрос мог уже создать ее заново
+        try:
+            with transaction.atomic():
+                RevisionCounter.objects.create(pk=COUNTER_ID)
+        except IntegrityError:
+            counter.update(value=F('value'))
+    return counter.values_list('value', flat=True).get()
+
+
+def sequence(chunk_size=SEQUENCE_CHUNK_SIZE):
+    """
+    Give committed PENDING rows the next revisions. Runs under the counter
+    lock, which only the feed takes. Returns the last revision.
+    """
+    tables = [
+        (model, alias) for model, alias in feed_tables()
+        if model.objects.using(alias).filter(revision=PENDING).exists()
+    ]
+    if not tables:
+        return get_counter()[0]
+    with transaction.atomic():
+        last = lock_counter()
+        # Шарды фиксируются раньше счетчика: после сбоя между ними выдача
+        # продолжается с наибольшей уже записанной ревизии
+        for model, alias in feed_tables():
+            last = max(last, model.objects.using(alias).aggregate(
+                last=Max('revision')
+            )['last'] or 0)
+        for model, alias in tables:
+            rows = model.objects.using(alias)
+            while True:
+                ids = list(rows.filter(revision=PENDING).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                with transaction.atomic(using=rows.db):
+                    rows.bulk_update([
+                        model(pk=pk, revision=last + offset)
+                        for offset, pk in enumerate(ids, 1)
+                    ], ['revision'])
+                last += len(ids)
+        RevisionCounter.objects.filter(pk=COUNTER_ID).update(value=last)
+    return last
+
+
+def get_counter():
+    # Пока ничего не записано после flush, строки счетчика нет
+    return RevisionCounter.objects.values_list(
+        'value', 'pruned'
+    ).filter(pk=COUNTER_ID).first() or (0, 0)
+
+
+def changes_since(since, limit=DEFAULT_LIMIT):
+    """
+    Up to limit changes with revisions after since, oldest first. Each of
+    the four tables is read with one range scan of its revision index
+    (employees, phones and tombstones on every shard in parallel).
+    The last committed revision is read first: every revision up to it
+    is already visible, and a change that commits later gets a larger one.
+    """
+    sequence()
+    last, pruned = get_counter()
+    if 0 < since < pruned:
+        raise FeedExpired(pruned)
+    changes = []
+    for kind, (queryset, fields) in FEEDS.items():
+        rows = sharding.everywhere(queryset.filter(
+            revision__gt=since, revision__lte=last
+        ).order_by('revision').values('revision', *fields))[:limit + 1]
+        changes.extend(
+            {
+                'revision': row.pop('revision'),
+                'type': kind,
+                'op': UPSERT,
+                'id': row['id'],
+                'data': row,
+            }
+            for row in rows
+        )
+    for row in sharding.everywhere(Tombstone.objects.filter(
+        revision__gt=since, revision__lte=last
+    ).order_by('revision').values(
+        'revision', 'kind', 'object_id', 'organization_id'
+    ))[:limit + 1]:
+        changes.append({
+            'revision': row['revision'],
+            'type': row['kind'],
+            'op': DELETE,
+            'id': row['object_id'],
+            'organization_id': row['organization_id'],
+        })
+    changes.sort(key=itemgetter('revision'))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        'since': since,
+        # Без изменений клиент может сразу перейти к последней ревизии
+        'next': changes[-1]['revision'] if has_more else max(since, last),
+        'has_more': has_more,
+        'changes': changes,
+    }
+
+
+def prune_tombstones(days):
+    """
+    Delete tombstones older than days. Clients that have not synced since
+    then get FeedExpired and have to start over from revision 0.
+    """
+    old = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days),
+        revision__gt=0
+    )
+    last = max(
+        (
+            last for last in sharding.fan_out(
+                lambda: old.aggregate(last=Max('revision'))['last']
+            )
+            if last is not None
+        ),
+        default=None
+    )
+    if last is None:
+        return 0
+    # Граница сдвигается до удаления: клиент, которому не хватит
+    # надгробий, получит FeedExpired
+    RevisionCounter.objects.filter(pk=COUNTER_ID).update(
+        pruned=Greatest(F('pruned'), last)
+    )
+    return sum(sharding.fan_out(
+        lambda: Tombstone.objects.filter(
+            revision__gt=0, revision__lte=last
+        ).delete()[0]
+    ))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """
+    Generation counters of the response cache must be shared by all worker
+    processes, otherwise a change in one is never seen by the others
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if (settings.API_CACHE_TIMEOUT
+            and backend in settings.PROCESS_LOCAL_CACHES):
+        return [Warning(
+            'API_CACHE_TIMEOUT is set with a per-process cache backend',
+            hint=(
+                'With more than one worker process responses stay stale up '
+                'to API_CACHE_TIMEOUT seconds after a change. Use a shared '
+                'CACHE_BACKEND (Redis, Memcached) or API_CACHE_TIMEOUT=0.'
+            ),
+            id='api.W001',
+        )]
+    return []
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_sticky_cache(app_configs, **kwargs):
+    """
+    Write marks of the replica routing must be seen by every worker
+    process, otherwise a user served by another one reads a stale replica
+    """
+    if not settings.REPLICA_DATABASES:
+        return []
+    alias = settings.REPLICA_STICKY_CACHE
+    if alias not in settings.CACHES:
+        return [Error(
+            f'REPLICA_STICKY_CACHE "{alias}" is not defined in CACHES',
+            id='api.E001',
+        )]
+    if settings.CACHES[alias]['BACKEND'] in settings.PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'REPLICA_STICKY_CACHE "{alias}" is a per-process cache',
+            hint=(
+                'Read replicas need a cache shared by all worker processes '
+                '(Redis, Memcached, a file based cache on one host) to '
+                'send the reads of a user who has just written to the '
+                'primary.'
+            ),
+            id='api.E002',
+        )]
+    return []
@@ -0,0 +1,124 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+
+# Значений в одном DELETE ... IN: ниже лимита параметров старых SQLite
+DELETE_BATCH_SIZE = 500
+
+# Реплика, выбранная для текущего запроса на чтение
+_read_alias = ContextVar('read_alias', default=None)
+
+# Запрос на чтение пользователя, который только что изменял данные
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def use_replica(alias):
+    return _read_alias.set(alias)
+
+
+def reset_replica(token):
+    _read_alias.reset(token)
+
+
+def pin_to_primary():
+    return _pinned.set(True)
+
+
+def unpin(token):
+    _pinned.reset(token)
+
+
+def is_pinned_to_primary():
+    return _pinned.get()
+
+
+def sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def sticky_cache():
+    """Cache shared by all worker processes (checked by api.checks)"""
+    return caches[settings.REPLICA_STICKY_CACHE]
+
+
+def remember_write(user_id):
+    """Read the primary for this user until replicas catch up"""
+    sticky_cache().set(
+        sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def wrote_recently(user_id):
+    return sticky_cache().get(sticky_key(user_id)) is not None
+
+
+def choose_replica():
+    replicas = settings.REPLICA_DATABASES
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaRouter:
+    """
+    Reads of safe-method requests go to the replica chosen for the request,
+    everything else and reads inside transactions to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплик PostgreSQL переносит репликация, локальные файлы
+        # SQLite мигрируются как отдельные базы
+        return db == DEFAULT_DB_ALIAS or connections[db].vendor == 'sqlite'
+
+
+def check_connections(**kwargs):
+    """
+    request_started receiver: drop persistent connections the server has
+    closed (restart, failover, idle timeout) before the view hits them
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.is_usable()):
+            connection.close()
+
+
+def delete_rows(model, field, values, using=None):
+    """
+    DELETE FROM the model table WHERE field IN values, in batches. For rows
+    nothing references (or whose dependants are already gone): unlike
+    QuerySet.delete() it neither loads the rows for the cascade collector
+    nor sends signals - the callers update indexes and the change feed
+    themselves. Returns the number of deleted rows.
+    """
+    values = list(values)
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    column = model._meta.get_field(field).column
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), DELETE_BATCH_SIZE):
+            batch = values[start:start + DELETE_BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {quote(model._meta.db_table)} '
+                f'WHERE {quote(column)} IN '
+                f'({", ".join(["%s"] * len(batch))})',
+                batch
+            )
+            deleted += cursor.rowcount
+    return deleted
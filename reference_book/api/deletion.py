@@ -0,0 +1,203 @@
+"""
+Background deletion of organizations. The API only marks an organization
+as deleting, which hides it from every read at once, and queues a
+DeletionJob. The worker (run_deletion_jobs) then removes employees with
+their phones and read model cards in chunks of DELETION_CHUNK_SIZE
+employees, one short transaction each, in the shard of the organization.
+Like the bulk paths it sends no model signals: the indexes, the change
+feed and the cache are updated here.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import autocomplete, db, sharding
+from .cache import (
+    ORGANIZATIONS, acl_scope, bump_generation, organization_scope
+)
+from .models import (
+    DeletionJob, Employee, EmployeeCard, Organization, Phone, Tombstone
+)
+from .search import EMPLOYEE, ORGANIZATION, PHONE, get_search_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+def schedule(organization, user=None):
+    """Hide organization and queue its deletion, returns the job"""
+    with transaction.atomic():
+        marked = Organization.objects.filter(
+            pk=organization.pk, deleting=False
+        ).update(deleting=True)
+        if not marked:
+            # Параллельный запрос уже поставил удаление в очередь
+            return DeletionJob.objects.filter(
+                organization_id=organization.pk
+            ).latest('pk')
+        with sharding.use_organization(organization):
+            total_employees = Employee.objects.filter(
+                organization_id=organization.pk
+            ).count()
+            total_phones = Phone.objects.filter(
+                employee__organization_id=organization.pk
+            ).count()
+        job = DeletionJob.objects.create(
+            organization_id=organization.pk,
+            organization_name=organization.name,
+            requested_by=user if user and user.is_authenticated else None,
+            total_employees=total_employees,
+            total_phones=total_phones
+        )
+        # Для клиентов ленты изменений организация удалена уже сейчас
+        Tombstone.record(
+            Organization, [organization.pk], organization.pk,
+            using=DEFAULT_DB_ALIAS
+        )
+        backend = get_search_backend()
+        if backend:
+            backend.remove(ORGANIZATION, organization.pk)
+    autocomplete.update('hide_organization', organization.pk)
+    bump_generation(
+        ORGANIZATIONS, organization_scope(organization.pk),
+        acl_scope(organization.pk)
+    )
+    return job
+
+
+def claim():
+    """
+    Take the oldest pending job, or a running one whose worker has not
+    reported for DELETION_STALE_SECONDS. None if there is nothing to do.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.DELETION_STALE_SECONDS
+    )
+    available = Q(status=DeletionJob.PENDING) | Q(
+        status=DeletionJob.RUNNING, updated_at__lt=stale
+    )
+    for job in DeletionJob.objects.filter(available).order_by('pk')[:10]:
+        # Задачу получает тот, чье обновление прошло первым
+        if DeletionJob.objects.filter(
+            available, pk=job.pk, updated_at=job.updated_at
+        ).update(status=DeletionJob.RUNNING, updated_at=timezone.now()):
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def delete_employees(organization_id, chunk_size, tombstones=True):
+    """
+    Delete up to chunk_size employees of the organization in the active
+    shard with their cards and phones, inside the caller's transaction.
+    Without tombstones the change feed and indexes are left alone: the
+    rows are not there yet or live on in another shard (move_organization).
+    Returns the ids of the deleted employees and phones.
+    """
+    employee_ids = list(Employee.objects.filter(
+        organization_id=organization_id
+    ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+    if not employee_ids:
+        return [], []
+    phone_ids = list(Phone.objects.filter(
+        employee_id__in=employee_ids
+    ).values_list('pk', flat=True))
+    # На телефоны и карточки никто не ссылается: удаляем без сборщика
+    # каскада, который загрузил бы все строки в память
+    db.delete_rows(EmployeeCard, 'employee', employee_ids)
+    db.delete_rows(Phone, 'employee', employee_ids)
+    db.delete_rows(Employee, 'id', employee_ids)
+    if tombstones:
+        Tombstone.record(Phone, phone_ids, organization_id)
+        Tombstone.record(Employee, employee_ids, organization_id)
+        backend = get_search_backend()
+        if backend:
+            backend.remove_many(PHONE, phone_ids)
+            backend.remove_many(EMPLOYEE, employee_ids)
+        autocomplete.update('remove_many', PHONE, phone_ids)
+        autocomplete.update('remove_many', EMPLOYEE, employee_ids)
+    return employee_ids, phone_ids
+
+
+def purge_shards(organization, using):
+    """
+    Delete the employees, phones and cards of the organization from every
+    shard other than using, where deleting the organization itself cascades
+    to them. Runs in the caller's transaction on using: for a delete that
+    does not go through schedule (Model or QuerySet delete).
+    """
+    for alias in settings.SHARD_DATABASES:
+        if alias == using:
+            continue
+        with sharding.use(alias), transaction.atomic(using=alias):
+            while delete_employees(
+                organization.pk, settings.DELETION_CHUNK_SIZE
+            )[0]:
+                pass
+
+
+def delete_chunk(job, chunk_size):
+    """
+    Delete up to chunk_size employees of the organization with their cards
+    and phones. Returns the number of deleted employees, 0 when done.
+    """
+    with sharding.atomic():
+        employee_ids, phone_ids = delete_employees(
+            job.organization_id, chunk_size
+        )
+    if not employee_ids:
+        return 0
+    # Задача в основной базе: счетчики растут после фиксации удаления
+    DeletionJob.objects.filter(pk=job.pk).update(
+        deleted_employees=F('deleted_employees') + len(employee_ids),
+        deleted_phones=F('deleted_phones') + len(phone_ids),
+        updated_at=timezone.now()
+    )
+    return len(employee_ids)
+
+
+def finish(job):
+    organization_id = job.organization_id
+    with transaction.atomic():
+        Organization.modifiers.through.objects.filter(
+            organization_id=organization_id
+        ).delete()
+        db.delete_rows(Organization, 'id', [organization_id])
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.DONE,
+            updated_at=timezone.now(),
+            finished_at=timezone.now()
+        )
+    autocomplete.update('remove', ORGANIZATION, organization_id)
+    autocomplete.update('unhide_organization', organization_id)
+    bump_generation(
+        ORGANIZATIONS, organization_scope(organization_id),
+        acl_scope(organization_id)
+    )
+
+
+def run(job, chunk_size=None):
+    """Delete everything of the job's organization, chunk by chunk"""
+    chunk_size = chunk_size or settings.DELETION_CHUNK_SIZE
+    try:
+        with sharding.use(
+            sharding.organization_shard(job.organization_id)
+            if sharding.is_enabled() else None
+        ):
+            while delete_chunk(job, chunk_size):
+                pass
+        finish(job)
+    except Exception as error:
+        logger.exception('Deletion job %s failed', job.pk)
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.FAILED,
+            error=str(error),
+            updated_at=timezone.now(),
+            finished_at=timezone.now()
+        )
+        return False
+    return True
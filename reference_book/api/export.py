@@ -0,0 +1,138 @@
+import csv
+import heapq
+import json
+
+from django.db.models import Q
+
+from . import sharding
+from .models import Employee, Organization
+
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+
+CHUNK_SIZE = 2000
+
+FIELDNAMES = [
+    'organization_id', 'organization_name', 'employee_id', 'employee_name',
+    'employee_position', 'phone_id', 'phone_type', 'phone_number',
+]
+
+# Сотрудник с телефонами: внешнее соединение, у сотрудника без телефонов
+# колонки телефона пустые
+EMPLOYEE_COLUMNS = (
+    'organization_id', 'pk', 'name', 'position',
+    'phones__id', 'phones__phone_type', 'phones__phone_number',
+)
+
+
+def parse_cursor(value):
+    """
+    'organization_id:employee_id:phone_id' of the last received row, empty
+    ids as in the row itself. Raises ValueError.
+    """
+    parts = value.split(':')
+    if len(parts) != 3:
+        raise ValueError(value)
+    return tuple(int(part or 0) for part in parts)
+
+
+def row_key(row):
+    """Export order: organization, employee, phone; missing ids are 0"""
+    return (row[0], row[1] or 0, row[4] or 0)
+
+
+def export_rows(organization_id=None, phone_type=None, after=None,
+                chunk_size=CHUNK_SIZE):
+    """
+    Organization -> employee -> phone rows in id order. Organizations
+    without employees and employees without phones give a row with empty
+    columns, unless phone_type asks for phones of one type. Organizations
+    are read in chunks, their employees with phones with one joined query
+    per shard through QuerySet.iterator, so memory stays constant.
+    after is the parse_cursor() position to resume from.
+    """
+    organizations = Organization.objects.filter(deleting=False)
+    if organization_id is not None:
+        organizations = organizations.filter(pk=organization_id)
+    after = after or (0, 0, 0)
+    last = after[0] - 1
+    while True:
+        chunk = list(organizations.filter(pk__gt=last).order_by(
+            'pk'
+        ).values_list('pk', 'name')[:chunk_size])
+        if not chunk:
+            return
+        yield from export_chunk(chunk, phone_type, after, chunk_size)
+        last = chunk[-1][0]
+
+
+def export_chunk(organizations, phone_type, after, chunk_size):
+    # Одним filter(): условия на телефоны относятся к тому же соединению,
+    # что и колонки телефона в выборке
+    condition = Q(
+        organization_id__gte=organizations[0][0],
+        organization_id__lte=organizations[-1][0]
+    )
+    if phone_type is not None:
+        condition &= Q(phones__phone_type=phone_type)
+    after_organization, after_employee, after_phone = after
+    if after_organization >= organizations[0][0]:
+        condition &= (
+            Q(organization_id__gt=after_organization)
+            | Q(pk__gt=after_employee)
+            | Q(pk=after_employee, phones__id__gt=after_phone)
+        )
+    employees = Employee.objects.filter(condition)
+    rows = heapq.merge(
+        *[
+            employees.using(alias).order_by(
+                'organization_id', 'pk', 'phones__id'
+            ).values_list(*EMPLOYEE_COLUMNS).iterator(chunk_size=chunk_size)
+            for alias in sharding.shards()
+        ],
+        key=row_key
+    )
+    # Строки удаляемых организаций из диапазона пропускаются
+    row = next(rows, None)
+    for organization, name in organizations:
+        found = False
+        while row is not None and row[0] <= organization:
+            if row[0] == organization:
+                found = True
+                yield dict(zip(FIELDNAMES, (organization, name, *row[1:])))
+            row = next(rows, None)
+        if (not found and phone_type is None
+                and organization != after_organization):
+            yield dict(
+                dict.fromkeys(FIELDNAMES),
+                organization_id=organization, organization_name=name
+            )
+
+
+class Echo:
+    """File-like object returning what csv.writer writes into it"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=FIELDNAMES)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+RENDERERS = {CSV: render_csv, NDJSON: render_ndjson}
@@ -0,0 +1,121 @@
+"""
+Serializer-compatible output built straight from .values() rows for the hot
+read endpoints: no serializer instances and no per-field to_representation.
+Output must stay identical to OrganizationListSerializer, EmployeeSerializer
+and PhoneSerialiser (checked by api.tests.test_fast_serializers and the
+benchmark_serializers command).
+"""
+from operator import itemgetter
+
+from django.conf import settings
+
+from . import sharding
+from .models import Phone
+from .serializers import OrganizationListSerializer
+
+
+def is_enabled():
+    return settings.FAST_SERIALIZATION
+
+
+class RowSerializer:
+    """
+    Output key -> values() lookup pairs compiled into one itemgetter.
+    Lookups are what the queryset has to select, keys what the API returns.
+    """
+
+    def __init__(self, *fields):
+        self.keys = tuple(key for key, _ in fields)
+        self.lookups = tuple(lookup for _, lookup in fields)
+        getter = itemgetter(*self.lookups)
+        self.extract = (
+            getter if len(self.lookups) > 1 else lambda row: (getter(row),)
+        )
+
+    def values(self, queryset, *extra):
+        return queryset.values(*self.lookups, *extra)
+
+    def to_representation(self, row):
+        return dict(zip(self.keys, self.extract(row)))
+
+
+organizations = RowSerializer(
+    ('id', 'id'),
+    ('name', 'name'),
+    ('address', 'address'),
+    ('description', 'description'),
+)
+# pk, а не id: по нему идет keyset-пагинация сотрудников
+employees = RowSerializer(
+    ('id', 'pk'),
+    ('name', 'name'),
+    ('position', 'position'),
+)
+phones = RowSerializer(
+    ('id', 'id'),
+    ('phone_type', 'phone_type'),
+    ('phone_number', 'phone_number'),
+)
+
+
+def serialize_phones(rows):
+    to_representation = phones.to_representation
+    return [to_representation(row) for row in rows]
+
+
+def phones_by_employee(employee_ids):
+    grouped = {}
+    rows = phones.values(
+        Phone.objects.filter(employee_id__in=employee_ids).order_by('pk'),
+        'employee_id'
+    )
+    to_representation = phones.to_representation
+    for row in rows:
+        grouped.setdefault(row['employee_id'], []).append(
+            to_representation(row)
+        )
+    return grouped
+
+
+def serialize_employees(rows):
+    """Employees with nested phones, one extra query for the whole page"""
+    rows = list(rows)
+    grouped = phones_by_employee([row['pk'] for row in rows])
+    to_representation = employees.to_representation
+    result = []
+    for row in rows:
+        data = to_representation(row)
+        data['phones'] = grouped.get(row['pk'], [])
+        result.append(data)
+    return result
+
+
+def serialize_organizations(rows, search=None):
+    """
+    Organizations; with a search term also the matching employees as in
+    OrganizationListSerializer.get_employees, two extra queries per page
+    (per shard, run in parallel)
+    """
+    rows = list(rows)
+    to_representation = organizations.to_representation
+    result = [to_representation(row) for row in rows]
+    if not search:
+        return result
+    found = {}
+    matching = employees.values(
+        OrganizationListSerializer.matching_employees(search).filter(
+            organization_id__in=[row['id'] for row in rows]
+        ),
+        'organization_id'
+    )
+
+    def load():
+        employee_rows = list(matching.all())
+        return zip(serialize_employees(employee_rows), employee_rows)
+
+    for loaded in sharding.fan_out(load):
+        for data, row in loaded:
+            found.setdefault(row['organization_id'], []).append(data)
+    for data in result:
+        data['employees'] = found.get(data['id'], [])
+    return result
@@ -1,5 +1,18 @@
 from rest_framework import filters
 
+from .search import get_search_backend
+
 
 class CustomSearchFilter(filters.SearchFilter):
     search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        """Use the indexed search backend for views that opt in"""
+        search_terms = self.get_search_terms(request)
+        backend = (
+            get_search_backend()
+            if getattr(view, 'use_search_backend', False) else None
+        )
+        if backend is None or not search_terms:
+            return super().filter_queryset(request, queryset, view)
+        return backend.filter_queryset(queryset, search_terms)
@@ -0,0 +1,283 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+
+from . import autocomplete, read_model, sharding
+from .cache import ORGANIZATIONS, bump_generation, organization_scope
+from .models import (
+    Employee, Organization, Phone, PHONE_TYPES, PERSONAL, mark_changed,
+    normalize_phone_number
+)
+from .rules import (
+    CONFLICT_MESSAGE, DUPLICATE_NAME_MESSAGE, DUPLICATE_PHONE_MESSAGE,
+    PersonalNumberRule
+)
+from .search import get_search_backend
+
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+CHUNK_SIZE = 1000
+
+DELETING_MESSAGE = 'Организация удаляется, строки не импортированы'
+
+
+PHONE_TYPE_VALUES = {value for value, _ in PHONE_TYPES}
+
+
+def guess_format(filename):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return JSONL
+    return CSV
+
+
+def read_csv(stream):
+    """
+    Rows: name,position,phone_type,phone_number. Consecutive rows with the
+    same name are phones of one employee.
+    """
+    record = None
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        name = (row.get('name') or '').strip()
+        phone = {
+            'phone_type': (row.get('phone_type') or '').strip(),
+            'phone_number': (row.get('phone_number') or '').strip(),
+        }
+        if record is not None and record['name'] == name:
+            record['phones'].append(phone)
+            continue
+        if record is not None:
+            yield record
+        record = {
+            'line': line,
+            'name': name,
+            'position': (row.get('position') or '').strip(),
+            'phones': [phone],
+        }
+    if record is not None:
+        yield record
+
+
+def read_jsonl(stream):
+    """
+    One employee per line: {"name", "position", "phones": [...]} or a flat
+    object with phone_type and phone_number.
+    """
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            yield {'line': line, 'error': 'Некорректный JSON'}
+            continue
+        if not isinstance(data, dict):
+            yield {'line': line, 'error': 'Ожидается JSON-объект'}
+            continue
+        phones = data.get('phones')
+        if phones is None:
+            phones = [{
+                'phone_type': data.get('phone_type'),
+                'phone_number': data.get('phone_number'),
+            }]
+        yield {
+            'line': line,
+            'name': str(data.get('name') or '').strip(),
+            'position': str(data.get('position') or '').strip(),
+            'phones': phones if isinstance(phones, list) else [],
+        }
+
+
+READERS = {CSV: read_csv, JSONL: read_jsonl}
+
+
+class DirectoryImporter:
+    """
+    Import employees with phones into one organization in chunks: one
+    lookup query per rule and two bulk inserts per chunk. Invalid rows are
+    reported and skipped, the rest of the file is still imported.
+    """
+
+    def __init__(self, organization, chunk_size=CHUNK_SIZE):
+        self.organization = organization
+        self.chunk_size = chunk_size
+        self.created_employees = 0
+        self.created_phones = 0
+        self.errors = []
+        # ФИО уже импортированных строк файла
+        self.seen_names = set()
+
+    def run(self, records):
+        with sharding.use_organization(self.organization):
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= self.chunk_size:
+                    imported = self.import_chunk(chunk)
+                    chunk = []
+                    if not imported:
+                        break
+            if chunk:
+                self.import_chunk(chunk)
+        if self.created_employees:
+            bump_generation(
+                ORGANIZATIONS, organization_scope(self.organization.pk)
+            )
+        return self.report()
+
+    def report(self):
+        return {
+            'created_employees': self.created_employees,
+            'created_phones': self.created_phones,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+    def import_chunk(self, chunk):
+        """
+        Validate and save one chunk. False if the organization has been
+        scheduled for deletion meanwhile: the import stops, otherwise its
+        rows would outlive the deletion job.
+        """
+        if Organization.objects.filter(
+            pk=self.organization.pk, deleting=True
+        ).exists():
+            self.add_error(chunk[0], [DELETING_MESSAGE])
+            return False
+        valid = [record for record in chunk if self.validate_fields(record)]
+        existing_names = set(Employee.objects.filter(
+            organization=self.organization,
+            name__in=[record['name'] for record in valid]
+        ).values_list('name', flat=True))
+        # Номера прошлых пачек уже в базе и учитываются запросом
+        rule = PersonalNumberRule(
+            normalize_phone_number(phone['phone_number'])
+            for record in valid for phone in record['phones']
+        )
+        accepted = [
+            record for record in valid
+            if self.validate_rules(record, existing_names, rule)
+        ]
+        if not accepted:
+            return True
+        try:
+            self.save(accepted)
+        except IntegrityError:
+            # Параллельная запись заняла ФИО или личный номер: строки
+            # пачки сохраняются по одной, конфликтующие попадают в ошибки
+            for record in accepted:
+                try:
+                    self.save([record])
+                except IntegrityError:
+                    self.add_error(record, [CONFLICT_MESSAGE])
+        return True
+
+    def add_error(self, record, errors):
+        self.errors.append({'line': record['line'], 'errors': errors})
+
+    def validate_fields(self, record):
+        if 'error' in record:
+            self.add_error(record, [record['error']])
+            return False
+        errors = []
+        for field in ('name', 'position'):
+            try:
+                Employee._meta.get_field(field).clean(record[field], None)
+            except ValidationError as error:
+                errors.extend(f'{field}: {message}' for message in error)
+        if not record['phones']:
+            errors.append(
+                'Должен быть указан как минимум один номер телефона.'
+            )
+        for phone in record['phones']:
+            if not isinstance(phone, dict):
+                errors.append('Некорректные данные телефона')
+                continue
+            phone_type = phone.get('phone_type')
+            if phone_type not in PHONE_TYPE_VALUES:
+                errors.append(
+                    f'phone_type: недопустимое значение {phone_type}'
+                )
+            try:
+                Phone._meta.get_field('phone_number').clean(
+                    str(phone.get('phone_number') or ''), None
+                )
+            except ValidationError as error:
+                errors.extend(f'phone_number: {message}' for message in error)
+        if errors:
+            self.add_error(record, errors)
+            return False
+        return True
+
+    def validate_rules(self, record, existing_names, rule):
+        errors = []
+        name = record['name']
+        if name in existing_names or name in self.seen_names:
+            errors.append(DUPLICATE_NAME_MESSAGE)
+        phones = record['phones']
+        forbidden = rule.add_all(
+            [
+                (
+                    normalize_phone_number(phone['phone_number']),
+                    phone['phone_type'] == PERSONAL
+                )
+                for phone in phones
+            ],
+            dry_run=bool(errors)
+        )
+        errors.extend(
+            f'{phones[position]["phone_number"]}: {DUPLICATE_PHONE_MESSAGE}'
+            for position in forbidden
+        )
+        if errors:
+            self.add_error(record, errors)
+            return False
+        self.seen_names.add(name)
+        return True
+
+    def save(self, records):
+        with sharding.atomic():
+            Employee.objects.bulk_create(mark_changed(
+                Employee(
+                    name=record['name'],
+                    position=record['position'],
+                    organization=self.organization
+                )
+                for record in records
+            ), batch_size=self.chunk_size)
+            # bulk_create на SQLite не возвращает pk - ФИО уникальны
+            # в рамках организации, поэтому получаем их одним запросом
+            employees = Employee.objects.filter(
+                organization=self.organization,
+                name__in=[record['name'] for record in records]
+            )
+            ids = {employee.name: employee.pk for employee in employees}
+            phones = Phone.objects.bulk_create(mark_changed(
+                Phone(
+                    employee_id=ids[record['name']],
+                    phone_type=phone['phone_type'],
+                    phone_number=phone['phone_number'],
+                    phone_digits=normalize_phone_number(phone['phone_number'])
+                )
+                for record in records for phone in record['phones']
+            ), batch_size=self.chunk_size)
+            if read_model.is_enabled():
+                read_model.refresh_employees(ids.values())
+            backend = get_search_backend()
+            if backend or autocomplete.is_enabled():
+                employees = list(employees)
+                phones = list(
+                    Phone.objects.filter(employee_id__in=ids.values())
+                )
+                if backend:
+                    backend.index_bulk(
+                        self.organization.pk, employees, phones
+                    )
+                autocomplete.update(
+                    'index_bulk', self.organization.pk, employees, phones
+                )
+        self.created_employees += len(records)
+        self.created_phones += len(phones)
@@ -0,0 +1,335 @@
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.models import Employee, Organization, Phone, WORK
+
+from api.pagination import PAGINATE_BY
+
+from .seed_directory import BENCH_EMAIL, BENCH_PASSWORD, get_bench_user
+
+
+# Время жизни кэша для --with-cache, если API_CACHE_TIMEOUT не задан
+BENCH_CACHE_TIMEOUT = 300
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency, throughput and SQL query count of every API route '
+        'in-process against the configured database (run seed_directory '
+        'first) and write the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='Run only the given route names, may be repeated'
+        )
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help='Keep the response cache on (measures cache hits)'
+        )
+        parser.add_argument('--output', help='Write JSON results to file')
+        parser.add_argument(
+            '--compare', help='Previous JSON results to print deltas against'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Строка лога на каждый вызов исказила бы замеры и вывод
+        logging.getLogger('api.requests').setLevel(logging.WARNING)
+        self.rng = random.Random(options['seed'])
+        self.user = get_bench_user()
+        organization_ids = list(Organization.objects.filter(
+            owner=self.user, employees__isnull=False
+        ).values_list('pk', flat=True).distinct()[:1000])
+        if not organization_ids:
+            raise CommandError('No benchmark data, run seed_directory first')
+        self.organization_ids = organization_ids
+        # Страница из середины списка: цена OFFSET на реальном объёме
+        self.deep_page = max(
+            1, Organization.objects.count() // PAGINATE_BY // 2
+        )
+        self.client = APIClient(HTTP_HOST='localhost')
+        tokens = self.client.post(
+            '/api/v1/auth/token/',
+            {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD},
+            format='json'
+        ).data
+        self.refresh = tokens['refresh']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {tokens["access"]}'}
+        self.counter = 0
+
+        # Замер идет в одном процессе, кэш в его памяти тоже подходит
+        timeout = (
+            settings.API_CACHE_TIMEOUT or BENCH_CACHE_TIMEOUT
+            if options['with_cache'] else 0
+        )
+        routes = self.get_routes()
+        selected = options['routes'] or list(routes)
+        unknown = set(selected) - set(routes)
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+        results = {}
+        with override_settings(API_CACHE_TIMEOUT=timeout):
+            for name in selected:
+                results[name] = self.measure(name, routes[name], options)
+                self.stdout.write(
+                    '{:<28} p50 {:>8.2f} ms  p99 {:>8.2f} ms  '
+                    '{:>8.1f} req/s  {:>4} queries'.format(
+                        name, results[name]['p50_ms'],
+                        results[name]['p99_ms'], results[name]['rps'],
+                        results[name]['queries']
+                    )
+                )
+        report = {
+            'meta': self.get_meta(options),
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def get_meta(self, options):
+        return {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'cache': options['with_cache'],
+            'organizations': Organization.objects.count(),
+            'employees': Employee.objects.count(),
+            'phones': Phone.objects.count(),
+        }
+
+    def measure(self, name, route, options):
+        for _ in range(options['warmup']):
+            self.call(*route())
+        latencies = []
+        queries = []
+        for _ in range(options['iterations']):
+            # Подготовка данных (например, создание удаляемой записи) в
+            # замер не входит
+            request = route()
+            with CaptureQueriesContext(connection) as context:
+                call_started = time.perf_counter()
+                response = self.call(*request)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append(time.perf_counter() - call_started)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{name}: HTTP {response.status_code} {response.content}'
+                )
+            queries.append(len(context))
+        return {
+            'rps': round(len(latencies) / sum(latencies), 1),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'queries': max(queries),
+        }
+
+    def call(self, method, path, data):
+        # Регистрация выполняется анонимно
+        anonymous = method == 'post' and path == '/api/v1/users/'
+        extra = {} if anonymous else self.auth
+        return getattr(self.client, method)(
+            path, data, format='json' if method != 'get' else None, **extra
+        )
+
+    def unique(self):
+        self.counter += 1
+        return f'{int(time.time() * 1000)}{self.counter}'
+
+    def organization(self):
+        return self.rng.choice(self.organization_ids)
+
+    def employee(self):
+        org_id = self.organization()
+        employee_id = Employee.objects.filter(
+            organization_id=org_id
+        ).values_list('pk', flat=True).first()
+        return org_id, employee_id
+
+    def phone(self):
+        org_id, employee_id = self.employee()
+        phone = Phone.objects.create(
+            employee_id=employee_id, phone_type=WORK,
+            phone_number=f'+7{self.unique()[-10:]}'
+        )
+        return org_id, employee_id, phone.pk
+
+    def get_routes(self):
+        """Route name -> callable returning (method, path, data)"""
+        base = '/api/v1'
+
+        def new_employee():
+            return {
+                'name': f'Бенчмарк {self.unique()}', 'position': 'Тест',
+                'phones': [{
+                    'phone_type': WORK,
+                    'phone_number': f'+7{self.unique()[-10:]}'
+                }],
+            }
+
+        def employees_path():
+            org_id, employee_id = self.employee()
+            return f'{base}/organizations/{org_id}/employees/{employee_id}/'
+
+        def phones_path():
+            org_id, employee_id = self.employee()
+            return (
+                f'{base}/organizations/{org_id}/employees/{employee_id}'
+                '/phones/'
+            )
+
+        def phone_path():
+            org_id, employee_id, phone_id = self.phone()
+            return (
+                f'{base}/organizations/{org_id}/employees/{employee_id}'
+                f'/phones/{phone_id}/'
+            )
+
+        def employee_to_delete():
+            org_id = self.organization()
+            employee = Employee.objects.create(
+                name=f'Удаляемый {self.unique()}', position='Тест',
+                organization_id=org_id
+            )
+            return (
+                f'{base}/organizations/{org_id}/employees/{employee.pk}/'
+            )
+
+        return {
+            'organizations-list': lambda: (
+                'get', f'{base}/organizations/', {}
+            ),
+            'organizations-list-deep': lambda: (
+                'get', f'{base}/organizations/', {'page': self.deep_page}
+            ),
+            'organizations-search-name': lambda: (
+                'get', f'{base}/organizations/search/',
+                {'q': 'Организация 1'}
+            ),
+            'organizations-search-employee': lambda: (
+                'get', f'{base}/organizations/search/', {'q': 'Петров'}
+            ),
+            'organizations-search-phone': lambda: (
+                'get', f'{base}/organizations/search/', {'q': '+7495000'}
+            ),
+            'organization-detail': lambda: (
+                'get', f'{base}/organizations/{self.organization()}/', {}
+            ),
+            'organization-patch': lambda: (
+                'patch', f'{base}/organizations/{self.organization()}/',
+                {'description': self.unique()}
+            ),
+            'organization-new': lambda: (
+                'post', f'{base}/organizations/new/', {
+                    'name': f'Новая {self.unique()}', 'address': 'Адрес',
+                    'description': 'Бенчмарк',
+                }
+            ),
+            'employees-list': lambda: (
+                'get', f'{base}/organizations/{self.organization()}'
+                '/employees/', {}
+            ),
+            'employees-detail': lambda: ('get', employees_path(), {}),
+            'employees-create': lambda: (
+                'post', f'{base}/organizations/{self.organization()}'
+                '/employees/', new_employee()
+            ),
+            'employees-patch': lambda: (
+                'patch', employees_path(), {'position': self.unique()}
+            ),
+            'employees-delete': lambda: ('delete', employee_to_delete(), {}),
+            'phones-list': lambda: ('get', phones_path(), {}),
+            'phones-create': lambda: (
+                'post', phones_path(), {
+                    'phone_type': WORK,
+                    'phone_number': f'+7{self.unique()[-10:]}'
+                }
+            ),
+            'phones-detail': lambda: ('get', phone_path(), {}),
+            'phones-patch': lambda: (
+                'patch', phone_path(), {'phone_type': WORK}
+            ),
+            'phones-delete': lambda: ('delete', phone_path(), {}),
+            'phone-lookup': lambda: (
+                'get', f'{base}/phones/lookup/', {'number': '+74950000001'}
+            ),
+            'users-create': lambda: (
+                'post', f'{base}/users/', {
+                    'email': f'bench{self.unique()}@example.com',
+                    'password': 'Bench-Pass-123',
+                }
+            ),
+            'users-me': lambda: ('get', f'{base}/users/me/', {}),
+            'users-me-patch': lambda: (
+                'patch', f'{base}/users/me/',
+                {'email': BENCH_EMAIL, 'username': 'bench'}
+            ),
+            'token-obtain': lambda: (
+                'post', f'{base}/auth/token/',
+                {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+            ),
+            'token-refresh': lambda: (
+                'post', f'{base}/auth/token/refresh/',
+                {'refresh': self.refresh}
+            ),
+            'export-organization': lambda: (
+                'get', f'{base}/export/',
+                {'organization': self.organization(), 'output': 'ndjson'}
+            ),
+        }
+
+    def compare(self, report, path):
+        with open(path, encoding='utf-8') as stream:
+            previous = json.load(stream)['routes']
+        self.stdout.write('\n{:<28} {:>10}   {}'.format(
+            'route', 'p50 delta', 'queries'
+        ))
+        for name, result in report['routes'].items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            delta = (result['p50_ms'] - before['p50_ms']) / before['p50_ms']
+            self.stdout.write('{:<28} {:>+9.1%}   {} -> {}'.format(
+                name, delta, before['queries'], result['queries']
+            ))
@@ -0,0 +1,112 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import fast_serializers
+from api.models import Employee, Organization, Phone
+from api.renderers import FastJSONRenderer
+from api.serializers import (
+    EmployeeSerializer, OrganizationListSerializer, PhoneSerialiser
+)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that the fast serialization path renders the same bytes as '
+        'the DRF serializers and measure both on rows of the current '
+        'database (run seed_directory first for realistic sizes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--search', default='Петров',
+            help='Search term for the organization search case'
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        search = options['search']
+        organizations = Organization.objects.all()[:rows]
+        employees = Employee.objects.order_by('pk')[:rows]
+        phones = Phone.objects.order_by('pk')[:rows]
+        cases = (
+            (
+                'organizations',
+                lambda: self.drf_organizations(organizations, ''),
+                lambda: fast_serializers.serialize_organizations(
+                    fast_serializers.organizations.values(organizations)
+                ),
+            ),
+            (
+                'organizations-search',
+                lambda: self.drf_organizations(organizations, search),
+                lambda: fast_serializers.serialize_organizations(
+                    fast_serializers.organizations.values(organizations),
+                    search
+                ),
+            ),
+            (
+                'employees',
+                lambda: EmployeeSerializer(
+                    employees.prefetch_related('phones'), many=True
+                ).data,
+                lambda: fast_serializers.serialize_employees(
+                    fast_serializers.employees.values(employees)
+                ),
+            ),
+            (
+                'phones',
+                lambda: PhoneSerialiser(phones, many=True).data,
+                lambda: fast_serializers.serialize_phones(
+                    fast_serializers.phones.values(phones)
+                ),
+            ),
+        )
+        mismatches = []
+        for name, drf, fast in cases:
+            drf_time, drf_bytes = best_of(
+                options['repeat'], lambda: JSONRenderer().render(drf())
+            )
+            fast_time, fast_bytes = best_of(
+                options['repeat'], lambda: FastJSONRenderer().render(fast())
+            )
+            identical = drf_bytes == fast_bytes
+            if not identical:
+                mismatches.append(name)
+            self.stdout.write(
+                '{:<22} drf {:>9.2f} ms  fast {:>9.2f} ms  x{:<6.1f} '
+                '{} bytes {}'.format(
+                    name, drf_time * 1000, fast_time * 1000,
+                    drf_time / fast_time, len(drf_bytes),
+                    'identical' if identical else 'DIFFERENT'
+                )
+            )
+        if mismatches:
+            raise CommandError(
+                f'Output differs from DRF serializers: {", ".join(mismatches)}'
+            )
+
+    @staticmethod
+    def drf_organizations(organizations, search):
+        request = Request(APIRequestFactory().get('/', {'q': search}))
+        if search:
+            organizations = OrganizationListSerializer.setup_eager_loading(
+                organizations, search
+            )
+        return OrganizationListSerializer(
+            organizations, many=True, context={'request': request}
+        ).data
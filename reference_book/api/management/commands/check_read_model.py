@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import read_model, sharding
+from api.cache import ORGANIZATIONS, bump_generation, organization_scope
+from api.models import Employee
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare employee cards of the read model with the tables, '
+        'optionally rebuild the cards that are missing or stale'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Recompute missing and stale cards'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=read_model.CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        shards = read_model.check_shards(options['chunk_size'])
+        broken = [
+            employee_id
+            for employee_ids in shards.values()
+            for employee_id in employee_ids
+        ]
+        if not broken:
+            self.stdout.write(self.style.SUCCESS('Read model is consistent'))
+            return
+        sample = ', '.join(map(str, broken[:20]))
+        self.stdout.write(
+            f'Missing or stale cards: {len(broken)} (employees {sample})'
+        )
+        if not options['repair']:
+            raise CommandError('Read model is inconsistent')
+        org_ids = set()
+        for alias, employee_ids in shards.items():
+            with sharding.use(alias):
+                for start in range(
+                    0, len(employee_ids), options['chunk_size']
+                ):
+                    chunk = employee_ids[start:start + options['chunk_size']]
+                    read_model.refresh_employees(chunk)
+                    org_ids.update(Employee.objects.filter(
+                        pk__in=chunk
+                    ).values_list('organization_id', flat=True))
+        bump_generation(ORGANIZATIONS, *map(organization_scope, org_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired {len(broken)} cards'
+        ))
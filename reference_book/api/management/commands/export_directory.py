@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import (
+    CHUNK_SIZE, CSV, FORMATS, RENDERERS, export_rows, parse_cursor
+)
+from api.models import PHONE_TYPES
+
+
+class Command(BaseCommand):
+    help = 'Stream organizations, employees and phones as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default=CSV)
+        parser.add_argument('--organization', type=int)
+        parser.add_argument(
+            '--phone-type', choices=[value for value, _ in PHONE_TYPES]
+        )
+        parser.add_argument(
+            '--after',
+            help=(
+                'Resume after this organization_id:employee_id:phone_id '
+                '(ids of the last received row, empty if missing)'
+            )
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--output', help='File path, stdout by default')
+
+    def handle(self, *args, **options):
+        try:
+            after = options['after'] and parse_cursor(options['after'])
+        except ValueError:
+            raise CommandError(
+                '--after must be organization_id:employee_id:phone_id'
+            )
+        rows = export_rows(
+            organization_id=options['organization'],
+            phone_type=options['phone_type'],
+            after=after,
+            chunk_size=options['chunk_size']
+        )
+        if options['output']:
+            stream = open(
+                options['output'], 'w', encoding='utf-8', newline=''
+            )
+        else:
+            stream = sys.stdout
+        try:
+            for chunk in RENDERERS[options['format']](rows):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
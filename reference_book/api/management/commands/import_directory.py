@@ -0,0 +1,51 @@
+import io
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import (
+    CHUNK_SIZE, DirectoryImporter, FORMATS, READERS, guess_format
+)
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Import employees with phones from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File path or "-" for stdin')
+        parser.add_argument('--organization', type=int, required=True)
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(
+                pk=options['organization']
+            )
+        except Organization.DoesNotExist:
+            raise CommandError('Organization not found')
+        if organization.deleting:
+            raise CommandError('Organization is being deleted')
+        if organization.moving:
+            raise CommandError('Organization is being moved to another shard')
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        importer = DirectoryImporter(organization, options['chunk_size'])
+        if path == '-':
+            stream = io.TextIOWrapper(
+                sys.stdin.buffer, encoding='utf-8-sig', newline=''
+            )
+            report = importer.run(READERS[file_format](stream))
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = importer.run(READERS[file_format](stream))
+        for error in report['errors']:
+            self.stderr.write(json.dumps(error, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(
+            'Created employees: {created_employees}, '
+            'phones: {created_phones}, errors: {errors}'.format(
+                **dict(report, errors=len(report['errors']))
+            )
+        ))
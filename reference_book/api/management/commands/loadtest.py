@@ -0,0 +1,99 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+DEFAULT_PATHS = (
+    '/api/v1/organizations/',
+    '/api/v1/organizations/search/?q=a',
+)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers), timeout=30) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    except (URLError, OSError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent GET requests at a running server and report '
+        'requests/sec and latency percentiles, e.g. to compare the WSGI '
+        '(runserver/gunicorn) and ASGI (uvicorn reference_book.asgi) paths'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request, may be repeated'
+        )
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--token', help='JWT access token')
+        parser.add_argument('--label', default='')
+        parser.add_argument('--output', help='Write JSON results to file')
+
+    def run_path(self, url, options, headers):
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(
+                lambda _: fetch(url, headers), range(options['requests'])
+            ))
+            elapsed = time.perf_counter() - started
+        latencies = [latency for status, latency in results if status == 200]
+        return {
+            'url': url,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'errors': sum(1 for status, _ in results if status != 200),
+            'rps': round(len(results) / elapsed, 1),
+            'p50_ms': self.ms(percentile(latencies, 0.5)),
+            'p95_ms': self.ms(percentile(latencies, 0.95)),
+            'p99_ms': self.ms(percentile(latencies, 0.99)),
+        }
+
+    @staticmethod
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Bearer {options["token"]}'
+        report = {
+            'label': options['label'],
+            'base_url': options['base_url'],
+            'results': [
+                self.run_path(
+                    options['base_url'] + quote(path, safe='/?&=%'),
+                    options, headers
+                )
+                for path in options['paths'] or DEFAULT_PATHS
+            ],
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rebalancing, sharding
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        'Move employees and phones of an organization to another shard. '
+        'Writes to the organization are refused while it is being moved; '
+        'an interrupted move is completed by running the command again'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int)
+        parser.add_argument(
+            'shard', help=f'One of: {", ".join(settings.SHARD_DATABASES)}'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=rebalancing.CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--grace', type=float, default=10,
+            help='Seconds for writes already in progress to finish'
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError('Sharding is disabled, see DB_SHARDS')
+        if options['shard'] not in settings.SHARD_DATABASES:
+            raise CommandError(
+                f'Unknown shard, expected one of: '
+                f'{", ".join(settings.SHARD_DATABASES)}'
+            )
+        try:
+            organization = Organization.objects.get(
+                pk=options['organization'], deleting=False
+            )
+        except Organization.DoesNotExist:
+            raise CommandError('Organization not found')
+        if (sharding.shard_of(organization) == options['shard']
+                and not organization.moving):
+            self.stdout.write('Organization is already in this shard')
+            return
+        if not rebalancing.keeps_id_ranges(
+            sharding.shard_of(organization), options['shard']
+        ):
+            raise CommandError(
+                'SQLite shards take organizations only from shards earlier '
+                'in DB_SHARDS'
+            )
+        self.stdout.write(
+            f'Moving "{organization.name}" from '
+            f'{sharding.shard_of(organization)} to {options["shard"]}'
+        )
+        moved = rebalancing.move(
+            organization, options['shard'],
+            options['chunk_size'], options['grace']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} employees'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete change feed tombstones older than the given number of days'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        deleted = changes.prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} tombstones'
+        ))
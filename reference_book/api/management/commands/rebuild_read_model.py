@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api import read_model
+
+
+class Command(BaseCommand):
+    help = 'Rebuild employee cards of the read model from the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=read_model.CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        # Документы совпадают с выдачей сериализаторов, кэш не сбрасывается
+        created = read_model.rebuild(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Read model rebuilt: {created} employee cards'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the organization search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError(
+                'SEARCH_BACKEND is not set or not supported by the database'
+            )
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt ({backend.__class__.__name__})'
+        ))
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import deletion
+from api.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker for background deletion of organizations: takes queued '
+        'deletion jobs from the database and runs them chunk by chunk'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the queued jobs and exit instead of polling'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Queue failed jobs again before starting'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.DELETION_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = DeletionJob.objects.filter(
+                status=DeletionJob.FAILED
+            ).update(status=DeletionJob.PENDING, error='', finished_at=None)
+            self.stdout.write(f'Queued again: {retried}')
+        while True:
+            close_old_connections()
+            job = deletion.claim()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(settings.DELETION_POLL_SECONDS)
+                continue
+            self.stdout.write(
+                f'Deleting "{job.organization_name}" (job {job.pk})'
+            )
+            if deletion.run(job, options['chunk_size']):
+                job.refresh_from_db()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Deleted {job.deleted_employees} employees, '
+                    f'{job.deleted_phones} phones'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'Job {job.pk} failed, see the log'
+                ))
@@ -0,0 +1,160 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import read_model, sharding
+from api.cache import ORGANIZATIONS, bump_generation
+from api.models import (
+    Employee, Organization, Phone, FAX, PERSONAL, WORK, mark_changed,
+    normalize_phone_number
+)
+from api.search import get_search_backend
+
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench@example.com'
+BENCH_PASSWORD = 'bench-password'
+
+FIRST_NAMES = (
+    'Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Ольга', 'Алексей', 'Елена',
+    'Дмитрий', 'Наталья', 'Андрей', 'Татьяна', 'Михаил', 'Светлана',
+)
+LAST_NAMES = (
+    'Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов',
+    'Васильев', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов',
+)
+POSITIONS = (
+    'Инженер', 'Бухгалтер', 'Менеджер', 'Юрист', 'Секретарь', 'Директор',
+)
+
+
+def get_bench_user():
+    user = User.objects.filter(email=BENCH_EMAIL).first()
+    if user is None:
+        user = User.objects.create_user(
+            email=BENCH_EMAIL, username='bench', password=BENCH_PASSWORD
+        )
+    return user
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a synthetic directory for benchmarks: '
+        'organizations owned by bench@example.com, employees with a shared '
+        'office number, a unique work number and a personal number'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=100)
+        parser.add_argument('--employees-per-org', type=int, default=100)
+        parser.add_argument(
+            '--phones-per-employee', type=int, default=2, choices=(1, 2, 3)
+        )
+        parser.add_argument(
+            '--shared-numbers', type=int, default=500,
+            help='Size of the pool of office/fax numbers shared by employees'
+        )
+        parser.add_argument(
+            '--shared-ratio', type=float, default=0.7,
+            help='Share of employees whose first number is a shared one'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        owner = get_bench_user()
+        start = (Organization.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0) + 1
+        shared = [
+            f'+7495{number:07d}' for number in range(options['shared_numbers'])
+        ]
+        unique_number = (sum(sharding.fan_out(Phone.objects.count)) + 1) * 10
+        batch_size = options['batch_size']
+        total_phones = 0
+        for org_from in range(0, options['organizations'], batch_size):
+            org_to = min(org_from + batch_size, options['organizations'])
+            with transaction.atomic():
+                organizations = Organization.objects.bulk_create(
+                    mark_changed(
+                        Organization(
+                            name=name,
+                            address=f'ул. Тестовая, {index}',
+                            description='Сгенерировано seed_directory',
+                            owner=owner,
+                            shard=sharding.choose_shard(name)
+                        )
+                        for index, name in (
+                            (index, f'Организация {start + index}')
+                            for index in range(org_from, org_to)
+                        )
+                    )
+                )
+            # bulk_create на SQLite не возвращает pk
+            for org_id, shard in Organization.objects.filter(
+                name__in=[org.name for org in organizations]
+            ).values_list('pk', 'shard'):
+                with sharding.use(shard or None):
+                    total_phones += self.seed_organization(
+                        org_id, options, rng, shared,
+                        unique_number + total_phones
+                    )
+            self.stdout.write(f'Organizations: {org_to}')
+        backend = get_search_backend()
+        if backend:
+            backend.rebuild()
+        if read_model.is_enabled():
+            read_model.rebuild()
+        bump_generation(ORGANIZATIONS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["organizations"]} organizations, '
+            f'{options["organizations"] * options["employees_per_org"]} '
+            f'employees, {total_phones} phones'
+        ))
+
+    def seed_organization(self, org_id, options, rng, shared, number):
+        with sharding.atomic():
+            Employee.objects.bulk_create(mark_changed(
+                Employee(
+                    name=(
+                        f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} '
+                        f'{index}'
+                    ),
+                    position=rng.choice(POSITIONS),
+                    organization_id=org_id
+                )
+                for index in range(options['employees_per_org'])
+            ), batch_size=options['batch_size'])
+            phones = []
+            employee_ids = Employee.objects.filter(
+                organization_id=org_id
+            ).values_list('pk', flat=True)
+            for employee_id in employee_ids:
+                numbers = []
+                if rng.random() < options['shared_ratio']:
+                    numbers.append((WORK, rng.choice(shared)))
+                else:
+                    numbers.append((WORK, f'+79{number:09d}'))
+                    number += 1
+                if options['phones_per_employee'] > 1:
+                    numbers.append((PERSONAL, f'+79{number:09d}'))
+                    number += 1
+                if options['phones_per_employee'] > 2:
+                    numbers.append((FAX, rng.choice(shared)))
+                phones.extend(
+                    Phone(
+                        employee_id=employee_id,
+                        phone_type=phone_type,
+                        phone_number=phone_number,
+                        phone_digits=normalize_phone_number(phone_number)
+                    )
+                    for phone_type, phone_number in numbers
+                )
+            Phone.objects.bulk_create(
+                mark_changed(phones), batch_size=options['batch_size']
+            )
+        return len(phones)
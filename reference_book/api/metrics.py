@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Маршрут для запросов, не сопоставленных ни с одним URL: метки остаются
+# ограниченным множеством
+UNMATCHED = 'unmatched'
+
+_current = ContextVar('request_metrics', default=None)
+
+_project_dir = str(settings.BASE_DIR) + os.sep
+
+
+class RequestMetrics:
+    """SQL and rendering timings of the request being served"""
+
+    __slots__ = ('queries', 'db_time', 'render_time', 'statements')
+
+    def __init__(self, collect_statements=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = [] if collect_statements else None
+
+
+def start_request(collect_statements=False):
+    metrics = RequestMetrics(collect_statements)
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_request():
+    return _current.get()
+
+
+def query_origin():
+    """First frame of project code that led to the query"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_project_dir)
+                and 'site-packages' not in filename):
+            return f'{filename[len(_project_dir):]}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper, installed on every new connection"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        statements = metrics.statements
+        if (statements is not None
+                and len(statements) < settings.SLOW_REQUEST_MAX_QUERIES):
+            statements.append((duration, sql, query_origin()))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def render(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+HISTOGRAMS = (
+    ('api_request_duration_seconds', 'Total request latency',
+     LATENCY_BUCKETS),
+    ('api_request_db_seconds', 'Time spent in SQL per request',
+     LATENCY_BUCKETS),
+    ('api_request_render_seconds', 'Response rendering time per request',
+     LATENCY_BUCKETS),
+    ('api_request_queries', 'SQL queries per request', QUERY_BUCKETS),
+)
+
+
+class Registry:
+    """
+    In-process aggregates per route and method. Every worker process keeps
+    its own registry, Prometheus scrapes each one as a separate target.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+
+    def observe(self, route, method, status, total, metrics):
+        key = (route, method)
+        with self.lock:
+            histograms = self.histograms.get(key)
+            if histograms is None:
+                histograms = self.histograms[key] = [
+                    Histogram(buckets) for _, _, buckets in HISTOGRAMS
+                ]
+            values = (
+                total, metrics.db_time, metrics.render_time, metrics.queries
+            )
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+            status_key = (route, method, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+    def render(self):
+        with self.lock:
+            lines = [
+                '# HELP api_requests_total Requests served',
+                '# TYPE api_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(
+                self.requests.items()
+            ):
+                lines.append(
+                    f'api_requests_total{{route="{route}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+            for index, (name, help_text, _) in enumerate(HISTOGRAMS):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method), histograms in sorted(
+                    self.histograms.items()
+                ):
+                    lines.extend(histograms[index].render(
+                        name, f'route="{route}",method="{method}"'
+                    ))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import db, metrics
+
+
+logger = logging.getLogger('api.requests')
+slow_logger = logging.getLogger('api.slow_requests')
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return metrics.UNMATCHED
+    return match.view_name
+
+
+class SyncAndAsyncMiddleware:
+    """
+    Base of middleware that runs in the mode of the handler chain: under
+    ASGI __call__ returns the coroutine of __acall__, so async views are not
+    forced into a thread by the middleware in front of them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознает экземпляр как корутинную функцию
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class RequestMetricsMiddleware(SyncAndAsyncMiddleware):
+    """
+    Per-request route, SQL query count, DB time, rendering time and total
+    latency: exposed as a Server-Timing header, a JSON log line and the
+    aggregated histograms of api.metrics. Requests slower than
+    SLOW_REQUEST_MS are logged with their SQL and its origin in our code.
+    """
+
+    def handle(self, request):
+        slow_ms = settings.SLOW_REQUEST_MS
+        request_metrics, token = metrics.start_request(
+            collect_statements=slow_ms > 0
+        )
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        total = time.perf_counter() - started
+        self.report(request, response, request_metrics, total, slow_ms)
+        return response
+
+    async def __acall__(self, request):
+        slow_ms = settings.SLOW_REQUEST_MS
+        request_metrics, token = metrics.start_request(
+            collect_statements=slow_ms > 0
+        )
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        total = time.perf_counter() - started
+        self.report(request, response, request_metrics, total, slow_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        request_metrics = metrics.current_request()
+        if request_metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                request_metrics.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, request_metrics, total, slow_ms):
+        route = route_name(request)
+        method = request.method if request.method in METHODS else 'OTHER'
+        db_ms = request_metrics.db_time * 1000
+        render_ms = request_metrics.render_time * 1000
+        total_ms = total * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{request_metrics.queries} queries", '
+            f'render;dur={render_ms:.2f}, '
+            f'app;dur={max(total_ms - db_ms - render_ms, 0):.2f}, '
+            f'total;dur={total_ms:.2f}'
+        )
+        metrics.registry.observe(
+            route, method, response.status_code, total, request_metrics
+        )
+        record = {
+            'route': route,
+            'method': method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': request_metrics.queries,
+            'db_ms': round(db_ms, 2),
+            'render_ms': round(render_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if slow_ms > 0 and total_ms >= slow_ms:
+            record['statements'] = [
+                {'ms': round(duration * 1000, 2), 'sql': sql, 'origin': origin}
+                for duration, sql, origin in sorted(
+                    request_metrics.statements, key=lambda item: -item[0]
+                )
+            ]
+            slow_logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaRoutingMiddleware(SyncAndAsyncMiddleware):
+    """
+    Serve reads of GET/HEAD/OPTIONS requests from one read replica. After a
+    successful write the user reads the primary for REPLICA_STICKY_SECONDS,
+    so editors see their own changes despite replication lag.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.authentication = JWTAuthentication()
+
+    def handle(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self.remember_write(request, response)
+            return response
+        user_id = self.token_user_id(request)
+        with self.reads_routed(
+            user_id is not None and db.wrote_recently(user_id)
+        ):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            # request.user может оказаться ленивым и обратиться к базе
+            await sync_to_async(self.remember_write, thread_sensitive=True)(
+                request, response
+            )
+            return response
+        user_id = self.token_user_id(request)
+        pinned = user_id is not None and await sync_to_async(
+            db.wrote_recently, thread_sensitive=True
+        )(user_id)
+        with self.reads_routed(pinned):
+            return await self.get_response(request)
+
+    @contextmanager
+    def reads_routed(self, pinned):
+        """Route the reads to the primary if pinned, else to a replica"""
+        if pinned:
+            token = db.pin_to_primary()
+            try:
+                yield
+            finally:
+                db.unpin(token)
+        else:
+            token = db.use_replica(db.choose_replica())
+            try:
+                yield
+            finally:
+                db.reset_replica(token)
+
+    def remember_write(self, request, response):
+        user = getattr(request, 'user', None)
+        if (response.status_code < 400 and user is not None
+                and user.is_authenticated):
+            db.remember_write(user.pk)
+
+    def token_user_id(self, request):
+        """User id from the JWT access token, without a database query"""
+        header = self.authentication.get_header(request)
+        raw_token = header and self.authentication.get_raw_token(header)
+        if not raw_token:
+            return None
+        try:
+            token = self.authentication.get_validated_token(raw_token)
+        except InvalidToken:
+            return None
+        return token.get(jwt_settings.USER_ID_CLAIM)
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'api_search_index'
+
+PG_TRIGRAM_INDEXES = (
+    ('api_org_name_trgm', 'api_organization', 'name'),
+    ('api_emp_name_trgm', 'api_employee', 'name'),
+    ('api_phone_number_trgm', 'api_phone', 'phone_number'),
+)
+
+
+def fts5_enabled(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and fts5_enabled(schema_editor.connection):
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            'content, kind UNINDEXED, object_id UNINDEXED, '
+            "organization_id UNINDEXED, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} '
+            '(content, kind, object_id, organization_id) '
+            "SELECT name, 'organization', id, id FROM api_organization"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} '
+            '(content, kind, object_id, organization_id) '
+            "SELECT name, 'employee', id, organization_id FROM api_employee"
+        )
+        # Номера хранятся в формате +79161234567, индексируем только цифры
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} '
+            '(content, kind, object_id, organization_id) '
+            "SELECT replace(p.phone_number, '+', ''), 'phone', p.id, "
+            'e.organization_id FROM api_phone p '
+            'JOIN api_employee e ON e.id = p.employee_id'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index_name, table, column in PG_TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} '
+                f'USING gin ({column} gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        for index_name, _, _ in PG_TRIGRAM_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
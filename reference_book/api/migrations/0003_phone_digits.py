@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+
+BATCH_SIZE = 2000
+
+
+def normalize_phone_number(value):
+    return ''.join(char for char in value or '' if char.isdigit())
+
+
+def fill_phone_digits(apps, schema_editor):
+    phones = apps.get_model('api', 'Phone').objects.using(
+        schema_editor.connection.alias
+    )
+    batch = []
+    for phone in phones.only('id', 'phone_number').iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        phone.phone_digits = normalize_phone_number(phone.phone_number)
+        batch.append(phone)
+        if len(batch) >= BATCH_SIZE:
+            phones.bulk_update(batch, ['phone_digits'])
+            batch = []
+    phones.bulk_update(batch, ['phone_digits'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS api_phone_digits_trgm ON api_phone '
+            'USING gin (phone_digits gin_trgm_ops)'
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS api_phone_digits_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phone',
+            name='phone_digits',
+            field=models.CharField(
+                db_index=True, default='', editable=False, max_length=16,
+                verbose_name='Номер (только цифры)'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
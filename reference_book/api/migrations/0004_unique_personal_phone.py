@@ -0,0 +1,40 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:49
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def reclassify_shared_personal_numbers(apps, schema_editor):
+    """
+    Numbers that are personal for several phones (added through the admin
+    or equal only after normalization, like "+7916..." and "7916...")
+    would break the constraint: they are shared, so they become work
+    """
+    phones = apps.get_model('api', 'Phone').objects.using(
+        schema_editor.connection.alias
+    )
+    shared = phones.filter(phone_type='personal').values(
+        'phone_digits'
+    ).annotate(total=Count('id')).filter(total__gt=1).values_list(
+        'phone_digits', flat=True
+    )
+    phones.filter(
+        phone_type='personal', phone_digits__in=shared
+    ).update(phone_type='work')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_phone_digits'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            reclassify_shared_personal_numbers, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='phone',
+            constraint=models.UniqueConstraint(condition=models.Q(phone_type='personal'), fields=('phone_digits',), name='unique_personal_phone'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_usernames(apps, schema_editor):
+    """Keep the name for the earliest user, add suffixes to the rest"""
+    users = apps.get_model('api', 'User').objects.using(
+        schema_editor.connection.alias
+    )
+    duplicates = users.exclude(username='').values(
+        'username'
+    ).annotate(total=Count('id')).filter(total__gt=1)
+    for row in duplicates:
+        base = row['username']
+        taken = set(users.filter(
+            username__startswith=base
+        ).values_list('username', flat=True))
+        renamed = users.filter(username=base).order_by('pk')[1:]
+        counter = 1
+        for user in renamed:
+            while base + str(counter) in taken:
+                counter += 1
+            user.username = base + str(counter)
+            taken.add(user.username)
+            user.save(update_fields=['username'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_unique_personal_phone'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            rename_duplicate_usernames, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(_negated=True, username=''),
+                fields=('username',), name='unique_username'
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.2 on 2026-10-18 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_unique_username'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeCard',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='api.employee', verbose_name='Работник')),
+                ('document', models.JSONField(verbose_name='Документ')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.organization', verbose_name='Организация')),
+            ],
+        ),
+    ]
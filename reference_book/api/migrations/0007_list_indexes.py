@@ -0,0 +1,62 @@
+from django.db import migrations, models
+
+
+# Перечни сотрудников и телефонов фильтруются по родителю и упорядочены
+# по id: составной индекс отдает страницу без сортировки. Индексы объявлены
+# в Meta.indexes, а в PostgreSQL строятся CONCURRENTLY, без блокировки
+# записи в таблицу.
+LIST_INDEXES = (
+    ('employee', models.Index(
+        fields=['organization', 'id'], name='api_employee_org_id_idx'
+    )),
+    ('phone', models.Index(
+        fields=['employee', 'id'], name='api_phone_employee_id_idx'
+    )),
+    ('employeecard', models.Index(
+        fields=['organization', 'employee'],
+        name='api_employeecard_org_id_idx'
+    )),
+)
+
+
+def index_options(schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        return {'concurrently': True}
+    return {}
+
+
+def create_list_indexes(apps, schema_editor):
+    for model_name, index in LIST_INDEXES:
+        schema_editor.add_index(
+            apps.get_model('api', model_name), index,
+            **index_options(schema_editor)
+        )
+
+
+def drop_list_indexes(apps, schema_editor):
+    for model_name, index in LIST_INDEXES:
+        schema_editor.remove_index(
+            apps.get_model('api', model_name), index,
+            **index_options(schema_editor)
+        )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('api', '0006_employee_card'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_list_indexes, drop_list_indexes),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in LIST_INDEXES
+            ],
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations, models
+
+
+COUNTER_ID = 1
+FEED_MODELS = ('Organization', 'Employee', 'Phone')
+
+
+def assign_initial_revisions(apps, schema_editor):
+    """
+    Existing rows get distinct revisions without reading them: id plus the
+    largest id of the previous tables. The counter starts after the last.
+    """
+    using = schema_editor.connection.alias
+    offset = 0
+    for model_name in FEED_MODELS:
+        rows = apps.get_model('api', model_name).objects.using(using)
+        rows.update(revision=models.F('id') + offset)
+        offset += rows.aggregate(last=models.Max('id'))['last'] or 0
+    apps.get_model('api', 'RevisionCounter').objects.using(using).create(
+        pk=COUNTER_ID, value=offset
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevisionCounter',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('value', models.BigIntegerField(
+                    default=0, verbose_name='Последняя ревизия'
+                )),
+                ('pruned', models.BigIntegerField(
+                    default=0, verbose_name='Удалены надгробия до ревизии'
+                )),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('kind', models.CharField(
+                    max_length=20, verbose_name='Тип объекта'
+                )),
+                ('object_id', models.BigIntegerField(
+                    verbose_name='Id объекта'
+                )),
+                ('organization_id', models.BigIntegerField(
+                    null=True, verbose_name='Id организации'
+                )),
+                ('revision', models.BigIntegerField(
+                    unique=True, verbose_name='Ревизия'
+                )),
+                ('deleted_at', models.DateTimeField(
+                    auto_now_add=True, db_index=True, verbose_name='Удален'
+                )),
+            ],
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='revision',
+            field=models.BigIntegerField(
+                db_index=True, default=0, editable=False,
+                verbose_name='Ревизия'
+            ),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='revision',
+            field=models.BigIntegerField(
+                db_index=True, default=0, editable=False,
+                verbose_name='Ревизия'
+            ),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='revision',
+            field=models.BigIntegerField(
+                db_index=True, default=0, editable=False,
+                verbose_name='Ревизия'
+            ),
+        ),
+        migrations.RunPython(
+            assign_initial_revisions, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='deleting',
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name='Удаляется'
+            ),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('organization_id', models.BigIntegerField(
+                    verbose_name='Id организации'
+                )),
+                ('organization_name', models.CharField(
+                    max_length=200, verbose_name='Наименование'
+                )),
+                ('status', models.CharField(
+                    choices=[
+                        ('pending', 'В очереди'),
+                        ('running', 'Выполняется'),
+                        ('done', 'Завершено'),
+                        ('failed', 'Ошибка'),
+                    ],
+                    db_index=True, default='pending', max_length=20,
+                    verbose_name='Статус'
+                )),
+                ('total_employees', models.IntegerField(
+                    default=0, verbose_name='Сотрудников всего'
+                )),
+                ('total_phones', models.IntegerField(
+                    default=0, verbose_name='Телефонов всего'
+                )),
+                ('deleted_employees', models.IntegerField(
+                    default=0, verbose_name='Удалено сотрудников'
+                )),
+                ('deleted_phones', models.IntegerField(
+                    default=0, verbose_name='Удалено телефонов'
+                )),
+                ('error', models.TextField(
+                    blank=True, verbose_name='Ошибка'
+                )),
+                ('created_at', models.DateTimeField(
+                    auto_now_add=True, verbose_name='Создана'
+                )),
+                ('updated_at', models.DateTimeField(
+                    auto_now=True, verbose_name='Обновлена'
+                )),
+                ('finished_at', models.DateTimeField(
+                    null=True, verbose_name='Завершена'
+                )),
+                ('requested_by', models.ForeignKey(
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='+', to=settings.AUTH_USER_MODEL,
+                    verbose_name='Инициатор'
+                )),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+import copy
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+
+
+# Организации хранятся только в default: в остальных базах разделения
+# (включая тестовую shard_test) сотрудники и карточки ссылаются на строки
+# другой базы, и ограничение внешнего ключа снимается. В default и без
+# разделения ограничение остается.
+SHARD_FOREIGN_KEYS = (('employee', 'organization'),
+                      ('employeecard', 'organization'))
+
+
+def is_shard(connection):
+    alias = connection.alias
+    return alias != DEFAULT_DB_ALIAS and (
+        alias in settings.SHARD_DATABASES
+        or alias in settings.TEST_SHARD_DATABASES
+    )
+
+
+def alter_constraints(apps, schema_editor, db_constraint):
+    if not is_shard(schema_editor.connection):
+        return
+    for model_name, field_name in SHARD_FOREIGN_KEYS:
+        model = apps.get_model('api', model_name)
+        old_field = model._meta.get_field(field_name)
+        new_field = copy.copy(old_field)
+        old_field = copy.copy(old_field)
+        old_field.db_constraint = not db_constraint
+        new_field.db_constraint = db_constraint
+        schema_editor.alter_field(model, old_field, new_field)
+
+
+def drop_constraints(apps, schema_editor):
+    alter_constraints(apps, schema_editor, db_constraint=False)
+
+
+def restore_constraints(apps, schema_editor):
+    alter_constraints(apps, schema_editor, db_constraint=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='shard',
+            field=models.CharField(
+                blank=True, editable=False, max_length=50,
+                verbose_name='База данных'
+            ),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='moving',
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name='Переносится'
+            ),
+        ),
+        migrations.RunPython(drop_constraints, restore_constraints),
+    ]
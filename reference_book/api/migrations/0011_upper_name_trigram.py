@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+# icontains в PostgreSQL - UPPER(name::text) LIKE UPPER(%s): индекс по
+# самому столбцу такой запрос не обслуживает
+UPPER_NAME_INDEXES = (
+    ('api_org_name_trgm', 'api_organization'),
+    ('api_emp_name_trgm', 'api_employee'),
+)
+
+
+def index_upper_names(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for index_name, table in UPPER_NAME_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+            schema_editor.execute(
+                f'CREATE INDEX {index_name} ON {table} '
+                'USING gin (UPPER(name::text) gin_trgm_ops)'
+            )
+
+
+def index_plain_names(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for index_name, table in UPPER_NAME_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+            schema_editor.execute(
+                f'CREATE INDEX {index_name} ON {table} '
+                'USING gin (name gin_trgm_ops)'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sharding'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_upper_names, index_plain_names),
+    ]
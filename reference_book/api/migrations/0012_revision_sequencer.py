@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Ревизии выдает лента изменений (changes.sequence): до этого у
+    # надгробий одна и та же ревизия PENDING
+
+    dependencies = [
+        ('api', '0011_upper_name_trigram'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tombstone',
+            name='revision',
+            field=models.BigIntegerField(
+                db_index=True, default=-1, verbose_name='Ревизия'
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 # from django.core.exceptions import ValidationError
+import re
+
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractUser
 from django.db import models
@@ -16,6 +18,107 @@ PHONE_TYPES = [
 ]
 
 
+def normalize_phone_number(value):
+    """Canonical digits-only form: '+7 (916) 123-45-67' -> '79161234567'"""
+    return re.sub(r'\D', '', value or '')
+
+
+def digits_prefix(field, digits):
+    """
+    Q for digits-only values of field starting with digits: a range scan
+    of its index. The upper bound is the prefix plus one with decimal carry
+    ('129' -> '13', '99' -> no bound), so the range holds under any
+    collation, not only a bytewise one.
+    """
+    query = models.Q(**{f'{field}__gte': digits})
+    head = digits.rstrip('9')
+    if head:
+        query &= models.Q(**{
+            f'{field}__lt': head[:-1] + str(int(head[-1]) + 1)
+        })
+    return query
+
+
+COUNTER_ID = 1
+# Ревизия записанной строки до выдачи следующей (changes.sequence);
+# строки с ревизией 0 в ленту не попадают
+PENDING = -1
+
+
+def mark_changed(objects):
+    """
+    Send objects written in bulk to the change feed: the revision is given
+    by changes.sequence once the write is committed
+    """
+    objects = list(objects)
+    for obj in objects:
+        obj.revision = PENDING
+    return objects
+
+
+class RevisionCounter(models.Model):
+    """
+    The single row holding the last revision of the change feed, locked
+    only by changes.sequence
+    """
+    value = models.BigIntegerField(verbose_name='Последняя ревизия', default=0)
+    # Надгробия до этой ревизии удалены командой prune_tombstones
+    pruned = models.BigIntegerField(
+        verbose_name='Удалены надгробия до ревизии', default=0
+    )
+
+
+class Tombstone(models.Model):
+    """
+    Deleted organization, employee or phone for the change feed, stored
+    in the database of the deleted row
+    """
+    kind = models.CharField(verbose_name='Тип объекта', max_length=20)
+    object_id = models.BigIntegerField(verbose_name='Id объекта')
+    organization_id = models.BigIntegerField(
+        verbose_name='Id организации', null=True
+    )
+    revision = models.BigIntegerField(
+        verbose_name='Ревизия', default=PENDING, db_index=True
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='Удален', auto_now_add=True, db_index=True
+    )
+
+    @classmethod
+    def record(cls, model, object_ids, organization_id, using=None):
+        cls.objects.using(using).bulk_create([
+            cls(
+                kind=model._meta.model_name,
+                object_id=object_id,
+                organization_id=organization_id
+            )
+            for object_id in object_ids
+        ])
+
+
+class Revisioned(models.Model):
+    """
+    Rows of the change feed. Every save marks the row PENDING, the feed
+    gives it the next revision once the write is committed
+    (changes.sequence). Bulk writes use mark_changed, deletes leave a
+    Tombstone.
+    """
+    revision = models.BigIntegerField(
+        verbose_name='Ревизия', default=0, db_index=True, editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            kwargs['update_fields'] = {*update_fields, 'revision'}
+        self.revision = PENDING
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
 class User(AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     username = models.CharField(_('username'), max_length=150, blank=True)
@@ -23,8 +126,17 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['username'],
+                condition=~models.Q(username=''),
+                name='unique_username'
+            ),
+        ]
+
 
-class Organization(models.Model):
+class Organization(Revisioned):
     name = models.CharField(
         verbose_name='Наименование',
         max_length=200,
@@ -44,6 +156,19 @@ class Organization(models.Model):
         verbose_name='Вправе вносить изменения',
         blank=True
     )
+    # Организация удаляется в фоне (DeletionJob) и уже скрыта из API
+    deleting = models.BooleanField(
+        verbose_name='Удаляется', default=False, editable=False
+    )
+    # База сотрудников и телефонов (api/sharding.py), пусто - основная
+    shard = models.CharField(
+        verbose_name='База данных', max_length=50, blank=True,
+        editable=False
+    )
+    # Сотрудники переносятся в другую базу, изменения не принимаются
+    moving = models.BooleanField(
+        verbose_name='Переносится', default=False, editable=False
+    )
 
     def __str__(self):
         return self.name
@@ -55,9 +180,11 @@ class Organization(models.Model):
         ordering = ['name']
 
 
-class Employee(models.Model):
+class Employee(Revisioned):
     name = models.CharField(verbose_name='ФИО', max_length=200)
     position = models.CharField(verbose_name='Должность', max_length=200)
+    # Организации хранятся в default: в остальных базах разделения
+    # ограничение внешнего ключа снимает миграция 0010
     organization = models.ForeignKey(
         Organization,
         on_delete=models.CASCADE,
@@ -84,9 +211,15 @@ class Employee(models.Model):
                 fields=['name', 'organization'], name='unique_employee_name'
             ),
         ]
+        indexes = [
+            # Страница сотрудников организации без сортировки
+            models.Index(
+                fields=['organization', 'id'], name='api_employee_org_id_idx'
+            ),
+        ]
 
 
-class Phone(models.Model):
+class Phone(Revisioned):
     phone_type = models.CharField(
         verbose_name='Тип номера',
         choices=PHONE_TYPES,
@@ -104,9 +237,126 @@ class Phone(models.Model):
         max_length=16,
         validators=[phone_regex]
     )
+    phone_digits = models.CharField(
+        verbose_name='Номер (только цифры)',
+        max_length=16,
+        db_index=True,
+        editable=False
+    )
     employee = models.ForeignKey(
         Employee,
         on_delete=models.CASCADE,
         related_name='phones',
         verbose_name='Работник'
     )
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone_number(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            # Страховка от гонок: личный номер не может повториться
+            models.UniqueConstraint(
+                fields=['phone_digits'],
+                condition=models.Q(phone_type=PERSONAL),
+                name='unique_personal_phone'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['employee', 'id'], name='api_phone_employee_id_idx'
+            ),
+        ]
+
+
+class EmployeeCard(models.Model):
+    """
+    Read model: employee with phones as a ready document, kept in sync by
+    api/signals.py and served by the employee list when enabled
+    """
+    employee = models.OneToOneField(
+        Employee,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+        verbose_name='Работник'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Организация'
+    )
+    document = models.JSONField(verbose_name='Документ')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['organization', 'employee'],
+                name='api_employeecard_org_id_idx'
+            ),
+        ]
+
+
+class DeletionJob(models.Model):
+    """
+    Background deletion of an organization: the worker command
+    run_deletion_jobs removes its employees and phones in chunks
+    (see api/deletion.py) and records the progress here
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    # Не внешний ключ: организация удаляется раньше, чем задача
+    organization_id = models.BigIntegerField(verbose_name='Id организации')
+    organization_name = models.CharField(
+        verbose_name='Наименование', max_length=200
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Инициатор'
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        choices=STATUSES,
+        default=PENDING,
+        max_length=20,
+        db_index=True
+    )
+    total_employees = models.IntegerField(
+        verbose_name='Сотрудников всего', default=0
+    )
+    total_phones = models.IntegerField(
+        verbose_name='Телефонов всего', default=0
+    )
+    deleted_employees = models.IntegerField(
+        verbose_name='Удалено сотрудников', default=0
+    )
+    deleted_phones = models.IntegerField(
+        verbose_name='Удалено телефонов', default=0
+    )
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created_at = models.DateTimeField(
+        verbose_name='Создана', auto_now_add=True
+    )
+    # Отметка исполнителя: задачу с устаревшей отметкой забирает другой
+    updated_at = models.DateTimeField(verbose_name='Обновлена', auto_now=True)
+    finished_at = models.DateTimeField(verbose_name='Завершена', null=True)
+
+    def __str__(self):
+        return f'{self.organization_name}: {self.get_status_display()}'
@@ -1,10 +1,189 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 PAGINATE_BY = 10
 
+PAGE = 'page'
+PAGE_WITHOUT_COUNT = 'page_without_count'
+KEYSET = 'keyset'
+
+FALSE_VALUES = ('0', 'false', 'False', 'no')
+
+MIN_INT = -2 ** 63
+MAX_INT = 2 ** 63 - 1
+
 
 class ResultsSetPagination(PageNumberPagination):
+    """
+    Page number pagination with two opt-in modes:
+    ?cursor= - keyset pagination over view.keyset_ordering, no COUNT/OFFSET;
+    ?count=false - page numbers without the total count query.
+    """
     page_size = PAGINATE_BY
     page_size_query_param = 'page_size'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    default_keyset_ordering = ('id',)
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = PAGE
+        if self.cursor_query_param in request.query_params:
+            return self.paginate_keyset(queryset, request, view)
+        if request.query_params.get(self.count_query_param) in FALSE_VALUES:
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_keyset(self, queryset, request, view):
+        self.mode = KEYSET
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = getattr(
+            view, 'keyset_ordering', self.default_keyset_ordering
+        )
+        position = self.decode_cursor(request, ordering, queryset.model)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            # (a, b) > (x, y) <=> a > x OR a = x AND b > y
+            queryset = queryset.filter(reduce(or_, [
+                Q(**dict(zip(ordering[:i], position[:i])),
+                  **{f'{ordering[i]}__gt': position[i]})
+                for i in range(len(ordering))
+            ]))
+        results = list(queryset[:page_size + 1])
+        self.next_link = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = [
+                self.get_position(results[-1], field) for field in ordering
+            ]
+            self.next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param, self.encode_cursor(last)
+            )
+        self.previous_link = None
+        return results
+
+    def paginate_without_count(self, queryset, request):
+        self.mode = PAGE_WITHOUT_COUNT
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            page_number = _positive_int(
+                request.query_params.get(self.page_query_param, 1),
+                strict=True
+            )
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        offset = (page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        if not results and page_number > 1:
+            raise NotFound(self.invalid_page_message)
+        url = request.build_absolute_uri()
+        self.next_link = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        self.previous_link = None
+        if page_number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param
+            )
+        elif page_number > 2:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return results
+
+    @staticmethod
+    def get_position(row, field):
+        """Ordering value of a model instance or of a .values() row"""
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    def decode_cursor(self, request, ordering, model):
+        """
+        Position from the cursor, each value checked against the model
+        field it is compared with: a tampered cursor is a 404, not a 500
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return [
+            self.clean_position(model, field, value)
+            for field, value in zip(ordering, position)
+        ]
+
+    def clean_position(self, model, name, value):
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        # Внешний ключ сравнивается по типу поля, на которое ссылается
+        field = getattr(field, 'target_field', field)
+        if value is None or isinstance(value, (bool, list, dict)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        # SQLite не задает диапазон целых полей, а больше 64 бит не примет
+        if isinstance(value, int) and not MIN_INT <= value <= MAX_INT:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(
+            json.dumps(position, ensure_ascii=False).encode()
+        ).decode()
+
+    def get_paginated_response(self, data):
+        if self.mode == PAGE:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data)
+        ]))
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.extend([
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': (
+                    'Keyset pagination cursor, empty value for the first page'
+                ),
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'false - skip the total count query',
+                'schema': {'type': 'boolean'},
+            },
+        ])
+        return parameters
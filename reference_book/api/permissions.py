@@ -1,41 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions
 
+from . import sharding
+from .cache import acl_scope, get_generations
 from .models import Organization, Employee
 
 
+def get_organization(view):
+    """Organization from the org_id url kwarg, loaded once per request"""
+    if getattr(view, '_organization', None) is None:
+        view._organization = get_object_or_404(
+            Organization.objects.filter(deleting=False),
+            id=view.kwargs.get('org_id')
+        )
+    return view._organization
+
+
+def get_employee(view):
+    """Employee from emp_id/org_id url kwargs, loaded once per request"""
+    if getattr(view, '_employee', None) is None:
+        if sharding.is_enabled():
+            # Организация и сотрудник в разных базах: два запроса
+            view._employee = get_object_or_404(
+                get_organization(view).employees,
+                id=view.kwargs.get('emp_id')
+            )
+            return view._employee
+        view._employee = get_object_or_404(
+            Employee.objects.select_related('organization'),
+            id=view.kwargs.get('emp_id'),
+            organization_id=view.kwargs.get('org_id'),
+            organization__deleting=False
+        )
+        view._organization = view._employee.organization
+    return view._employee
+
+
+def is_modifier(user, organization):
+    if not user.is_authenticated:
+        return False
+    return Organization.modifiers.through.objects.filter(
+        organization_id=organization.pk, user_id=user.pk
+    ).exists()
+
+
+def can_modify(request, view, organization):
+    """
+    Owner or modifier check: no query for the owner, EXISTS for modifiers.
+    The result is kept on the view for the rest of the request and,
+    if ACL_CACHE_TIMEOUT is set, in the cache until modifiers change.
+    """
+    user = request.user
+    if organization.owner_id is not None and organization.owner_id == user.pk:
+        return True
+    decisions = view.__dict__.setdefault('_acl_decisions', {})
+    if organization.pk in decisions:
+        return decisions[organization.pk]
+    timeout = settings.ACL_CACHE_TIMEOUT
+    key = None
+    if timeout and user.is_authenticated:
+        generation, = get_generations([acl_scope(organization.pk)])
+        key = f'api:acl:{organization.pk}:{user.pk}:{generation}'
+        allowed = cache.get(key)
+        if allowed is not None:
+            decisions[organization.pk] = allowed
+            return allowed
+    allowed = is_modifier(user, organization)
+    if key:
+        cache.set(key, allowed, timeout)
+    decisions[organization.pk] = allowed
+    return allowed
+
+
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 
 class IsOwnerOrModifier(permissions.BasePermission):
     def has_permission(self, request, view):
-        employee = get_object_or_404(
-            Employee, id=view.kwargs.get('emp_id')
-        )
-        return (
-            request.user == employee.organization.owner
-            or request.user in employee.organization.modifiers.all()
-        )
+        employee = get_employee(view)
+        return can_modify(request, view, employee.organization)
 
 
 class IsOwnerOrModifierOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
-        org = get_object_or_404(
-            Organization, id=view.kwargs.get('org_id')
-        )
+        org = get_organization(view)
         return (
             request.method in permissions.SAFE_METHODS
-            or request.user == org.owner
-            or request.user in org.modifiers.all()
+            or can_modify(request, view, org)
         )
 
     def has_object_permission(self, request, view, obj):
-        org = get_object_or_404(
-            Organization, id=view.kwargs.get('org_id')
-        )
-        return (
-            request.user == org.owner
-            or request.user in org.modifiers.all()
-        )
+        return can_modify(request, view, get_organization(view))
+
+
+class IsOrganizationOwnerOrModifier(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return can_modify(request, view, get_organization(view))
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import router, transaction
+
+from . import sharding
+from .models import Employee, EmployeeCard, Phone
+
+
+CHUNK_SIZE = 2000
+
+# Поля документа совпадают с выдачей EmployeeSerializer
+EMPLOYEE_FIELDS = ('id', 'name', 'position', 'organization_id')
+PHONE_FIELDS = ('id', 'phone_type', 'phone_number')
+
+
+def is_enabled():
+    return settings.READ_MODEL_ENABLED
+
+
+def build_cards(employee_ids):
+    """EmployeeCard objects for the given employees, two queries"""
+    phones = {}
+    for row in Phone.objects.filter(
+        employee_id__in=employee_ids
+    ).order_by('pk').values('employee_id', *PHONE_FIELDS):
+        phones.setdefault(row.pop('employee_id'), []).append(row)
+    return [
+        EmployeeCard(
+            employee_id=row['id'],
+            organization_id=row.pop('organization_id'),
+            document={**row, 'phones': phones.get(row['id'], [])}
+        )
+        for row in Employee.objects.filter(
+            pk__in=employee_ids
+        ).values(*EMPLOYEE_FIELDS)
+    ]
+
+
+def refresh_employees(employee_ids, create=True):
+    """
+    Recompute cards of the given employees. With create=False only existing
+    cards are updated: a phone deleted by the cascade of its employee must
+    not bring back the card that cascade has already removed.
+    """
+    employee_ids = list(employee_ids)
+    cards = build_cards(employee_ids)
+    with transaction.atomic(using=router.db_for_write(EmployeeCard)):
+        if not create:
+            for card in cards:
+                EmployeeCard.objects.filter(pk=card.employee_id).update(
+                    organization_id=card.organization_id,
+                    document=card.document
+                )
+            return
+        EmployeeCard.objects.filter(pk__in=employee_ids).delete()
+        EmployeeCard.objects.bulk_create(cards)
+
+
+def remove_employee(employee_id):
+    EmployeeCard.objects.filter(pk=employee_id).delete()
+
+
+def employee_id_chunks(chunk_size=CHUNK_SIZE):
+    ids = Employee.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def rebuild(chunk_size=CHUNK_SIZE):
+    created = 0
+    for alias in sharding.shards():
+        with sharding.use(alias), transaction.atomic(using=alias):
+            EmployeeCard.objects.all().delete()
+            for chunk in employee_id_chunks(chunk_size):
+                created += len(EmployeeCard.objects.bulk_create(
+                    build_cards(chunk), batch_size=chunk_size
+                ))
+    return created
+
+
+def check(chunk_size=CHUNK_SIZE):
+    """
+    Compare stored cards with documents rebuilt from the tables and return
+    ids of employees whose card is missing or stale
+    """
+    return [
+        employee_id
+        for broken in check_shards(chunk_size).values()
+        for employee_id in broken
+    ]
+
+
+def check_shards(chunk_size=CHUNK_SIZE):
+    """check() grouped by the shard the employees are stored in"""
+    broken = {}
+    for alias in sharding.shards():
+        with sharding.use(alias):
+            broken[alias] = list(check_shard(chunk_size))
+    return broken
+
+
+def check_shard(chunk_size):
+    for chunk in employee_id_chunks(chunk_size):
+        stored = {
+            pk: (organization_id, document)
+            for pk, organization_id, document in EmployeeCard.objects.filter(
+                pk__in=chunk
+            ).values_list('pk', 'organization_id', 'document')
+        }
+        yield from (
+            card.employee_id for card in build_cards(chunk)
+            if stored.get(card.employee_id)
+            != (card.organization_id, card.document)
+        )
@@ -0,0 +1,159 @@
+"""
+Moving an organization to another shard (move_organization command). The
+organization is marked moving, so the API refuses writes to it, and its
+employees with phones are copied to the target shard in chunks. Ids are
+unique across the shards (SHARD_ID_RANGE), so copies keep them; revision 0
+keeps the copies out of the change feed until Organization.shard is
+switched. After the switch the copies get new revisions and the rows left
+in the old shard are deleted: sync clients, the search index and
+autocomplete see the same employees and phones. A run interrupted at any
+step is completed by running the command again.
+
+SQLite gives a new row the id after the largest one in the table, whatever
+sqlite_sequence says: copies from a shard later in DB_SHARDS would move
+the ids of the target into the range of the source. On SQLite
+organizations are moved only to shards later in the list.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import read_model, sharding
+from .cache import ORGANIZATIONS, bump_generation, organization_scope
+from .deletion import delete_employees
+from .models import Employee, Organization, Phone, mark_changed
+
+
+CHUNK_SIZE = 500
+
+
+def keeps_id_ranges(source, target):
+    """Whether copies with the ids of source leave the range of target"""
+    return (
+        source == target
+        or connections[target].vendor != 'sqlite'
+        or settings.SHARD_DATABASES.index(source)
+        < settings.SHARD_DATABASES.index(target)
+    )
+
+
+def copy_chunk(source, target, organization_id, after, chunk_size):
+    """
+    Copy up to chunk_size employees with pk after the given one and their
+    phones from source to target. Returns the last copied pk, None when
+    there is nothing left.
+    """
+    with sharding.use(source):
+        employees = list(Employee.objects.filter(
+            organization_id=organization_id, pk__gt=after
+        ).order_by('pk')[:chunk_size])
+        if not employees:
+            return None
+        phones = list(Phone.objects.filter(
+            employee_id__in=[employee.pk for employee in employees]
+        ).order_by('pk'))
+    with sharding.use(target), transaction.atomic(using=target):
+        Employee.objects.bulk_create([
+            Employee(
+                id=employee.pk,
+                name=employee.name,
+                position=employee.position,
+                organization_id=organization_id,
+                revision=0
+            )
+            for employee in employees
+        ])
+        Phone.objects.bulk_create([
+            Phone(
+                id=phone.pk,
+                employee_id=phone.employee_id,
+                phone_type=phone.phone_type,
+                phone_number=phone.phone_number,
+                phone_digits=phone.phone_digits,
+                revision=0
+            )
+            for phone in phones
+        ])
+        if read_model.is_enabled():
+            read_model.refresh_employees(
+                [employee.pk for employee in employees]
+            )
+    return employees[-1].pk
+
+
+def publish_chunk(organization_id, chunk_size):
+    """
+    Send up to chunk_size copied employees of the active shard and their
+    phones to the change feed. The indexes already have them under the
+    same ids. Returns how many were published.
+    """
+    with sharding.atomic():
+        employees = list(Employee.objects.filter(
+            organization_id=organization_id, revision=0
+        ).order_by('pk')[:chunk_size])
+        if not employees:
+            return 0
+        phones = list(Phone.objects.filter(
+            employee_id__in=[employee.pk for employee in employees],
+            revision=0
+        ))
+        Employee.objects.bulk_update(mark_changed(employees), ['revision'])
+        Phone.objects.bulk_update(mark_changed(phones), ['revision'])
+    return len(employees)
+
+
+def purge(alias, organization_id, chunk_size):
+    """
+    Delete every employee of the organization left in alias. Their ids
+    live on in the other shard, so no tombstones and index removals.
+    """
+    deleted = 0
+    with sharding.use(alias):
+        while True:
+            with sharding.atomic():
+                employee_ids, _ = delete_employees(
+                    organization_id, chunk_size, tombstones=False
+                )
+            if not employee_ids:
+                return deleted
+            deleted += len(employee_ids)
+
+
+def move(organization, target, chunk_size=CHUNK_SIZE, grace=0):
+    """
+    Move employees and phones of organization to the target shard. grace
+    is how many seconds writes started before the organization was marked
+    moving get to finish. Returns the number of moved employees.
+    """
+    organization_id = organization.pk
+    if sharding.shard_of(organization) != target:
+        Organization.objects.filter(pk=organization_id).update(moving=True)
+        time.sleep(grace)
+        # Копии, оставшиеся от прерванного переноса
+        purge(target, organization_id, chunk_size)
+        source = sharding.shard_of(organization)
+        after = 0
+        while after is not None:
+            after = copy_chunk(
+                source, target, organization_id, after, chunk_size
+            )
+        Organization.objects.filter(pk=organization_id).update(
+            shard=target
+        )
+        organization.shard = target
+        bump_generation(ORGANIZATIONS, organization_scope(organization_id))
+    moved = 0
+    with sharding.use(target):
+        while True:
+            published = publish_chunk(organization_id, chunk_size)
+            if not published:
+                break
+            moved += published
+    for alias in sharding.shards():
+        if alias != target:
+            purge(alias, organization_id, chunk_size)
+    Organization.objects.filter(pk=organization_id).update(moving=False)
+    organization.moving = False
+    bump_generation(ORGANIZATIONS, organization_scope(organization_id))
+    return moved
@@ -0,0 +1,95 @@
+"""
+Directory rules shared by the serializers, the bulk operations and the
+importer, so every write path accepts and rejects the same data with the
+same message
+"""
+from contextlib import contextmanager
+from itertools import chain
+
+from django.db import IntegrityError
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from . import sharding
+from .models import Phone, PERSONAL
+
+
+DUPLICATE_NAME_MESSAGE = 'Сотрудник с таким ФИО уже существует'
+DUPLICATE_PHONE_MESSAGE = (
+    'Данный номер используется в качестве личного иным'
+    ' сотрудником либо вы пытаетесь сохранить рабочий номер'
+    ' в качестве личного'
+)
+CONFLICT_MESSAGE = (
+    'Сотрудник с таким ФИО или такой личный номер добавлен одновременно '
+    'с вашим запросом'
+)
+
+
+@contextmanager
+def concurrent_conflict(message):
+    """
+    A unique constraint hit by a write that committed after validation
+    (unique_personal_phone, unique_employee_name) is a 400, not a 500. The
+    write runs in a transaction of the active shard, so the error does not
+    break an outer one.
+    """
+    try:
+        with sharding.atomic():
+            yield
+    except IntegrityError:
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+class PersonalNumberRule:
+    """
+    A personal number belongs to one phone only, and a number in use can
+    not become personal. A number already on several phones still takes
+    more non-personal ones. Current usage is loaded with one query per
+    shard, then phones are added in order.
+    """
+
+    def __init__(self, numbers, exclude=None):
+        phones = Phone.objects.filter(phone_digits__in=set(numbers))
+        if exclude is not None:
+            phones = phones.exclude(pk__in=exclude)
+        rows = phones.values_list('phone_digits', 'phone_type').annotate(
+            total=Count('pk')
+        ).order_by()
+        # Номер -> (сколько телефонов, есть ли среди них личный)
+        self.used = {}
+        for digits, phone_type, total in chain.from_iterable(
+            sharding.fan_out(lambda: list(rows.all()))
+        ):
+            count, has_personal = self.used.get(digits, (0, False))
+            self.used[digits] = (
+                count + total, has_personal or phone_type == PERSONAL
+            )
+
+    def add(self, digits, is_personal):
+        """Take the number for one more phone, False if the rule forbids"""
+        count, has_personal = self.used.get(digits, (0, False))
+        if count and (is_personal or count == 1 and has_personal):
+            return False
+        self.used[digits] = (count + 1, has_personal or is_personal)
+        return True
+
+    def add_all(self, phones, dry_run=False):
+        """
+        Take the numbers of (digits, is_personal) phones of one employee:
+        all of them or, if any is forbidden or dry_run, none. Returns the
+        positions of the forbidden phones.
+        """
+        before = {digits: self.used.get(digits) for digits, _ in phones}
+        forbidden = [
+            position for position, (digits, is_personal) in enumerate(phones)
+            if not self.add(digits, is_personal)
+        ]
+        if forbidden or dry_run:
+            for digits, usage in before.items():
+                if usage is None:
+                    self.used.pop(digits, None)
+                else:
+                    self.used[digits] = usage
+        return forbidden
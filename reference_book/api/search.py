@@ -0,0 +1,334 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from . import sharding
+from .models import Employee, Organization, Phone, normalize_phone_number
+
+
+FTS_TABLE = 'api_search_index'
+ORGANIZATION = 'organization'
+EMPLOYEE = 'employee'
+PHONE = 'phone'
+
+# Триграммный токенайзер FTS5 не находит подстроки короче 3 символов
+FTS_MIN_TERM_LENGTH = 3
+
+# Не больше параметров в одном запросе, чем допускают старые SQLite
+REMOVE_BATCH_SIZE = 500
+
+REBUILD_BATCH_SIZE = 2000
+
+# Номер телефона: цифры со знаками записи номера, без букв
+PHONE_LIKE = re.compile(r'\+?[\d\s().-]*\d[\d\s().-]*')
+
+
+def phone_term_digits(term):
+    """Digits to look for among phones, '' unless term looks like one"""
+    if not PHONE_LIKE.fullmatch(term):
+        return ''
+    return normalize_phone_number(term)
+
+
+def organizations_in(queryset, lookup):
+    """
+    Q for the organizations that lookup of the rows of a sharded table
+    points to: a subquery, with sharding ids collected from every shard
+    """
+    if not sharding.is_enabled():
+        return Q(pk__in=queryset.values(lookup))
+    return Q(pk__in=set().union(*sharding.fan_out(
+        lambda: set(queryset.values_list(lookup, flat=True))
+    )))
+
+
+class BaseSearchBackend:
+    """
+    Search organizations by name, employee name and phone number.
+
+    Every search term is resolved to a set of organization ids with
+    semi-join subqueries, so no DISTINCT over the three joined tables
+    is needed.
+    """
+    vendor = None
+
+    def is_available(self):
+        return self.vendor is None or connection.vendor == self.vendor
+
+    def filter_queryset(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(self.match_term(term))
+        return queryset
+
+    def match_term(self, term):
+        query = (
+            Q(pk__in=Organization.objects.filter(
+                name__icontains=term
+            ).values('pk'))
+            | organizations_in(Employee.objects.filter(
+                name__icontains=term
+            ), 'organization_id')
+        )
+        digits = phone_term_digits(term)
+        if digits:
+            query |= organizations_in(Phone.objects.filter(
+                phone_digits__contains=digits
+            ), 'employee__organization_id')
+        return query
+
+    def match_name(self, kind, term):
+        """Q for the organizations or employees with term in the name"""
+        return Q(name__icontains=term)
+
+    def match_phone(self, digits):
+        """Q for the phones with digits anywhere in the number"""
+        return Q(phone_digits__contains=digits)
+
+    def index_organization(self, organization):
+        pass
+
+    def index_employee(self, employee):
+        pass
+
+    def index_phone(self, phone, organization_id):
+        pass
+
+    def index_bulk(self, organization_id, employees, phones):
+        """Index objects created with bulk_create (no signals are sent)"""
+        pass
+
+    def remove(self, kind, object_id):
+        pass
+
+    def remove_many(self, kind, object_ids):
+        """Remove objects changed or deleted in bulk (no signals are sent)"""
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    FTS5 trigram index kept in sync by model signals
+    (see api/signals.py).
+    """
+    vendor = 'sqlite'
+    _table_exists = False
+
+    def is_available(self):
+        if not super().is_available():
+            return False
+        if not self._table_exists:
+            self._table_exists = (
+                FTS_TABLE in connection.introspection.table_names()
+            )
+        return self._table_exists
+
+    def match_term(self, term):
+        fts_terms = [
+            value for value in {term, phone_term_digits(term)}
+            if len(value) >= FTS_MIN_TERM_LENGTH
+        ]
+        if not fts_terms:
+            return super().match_term(term)
+        match = ' OR '.join(
+            '"{}"'.format(value.replace('"', '""')) for value in fts_terms
+        )
+        return Q(pk__in=RawSQL(
+            f'SELECT organization_id FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s',
+            [match]
+        ))
+
+    def _match_kind(self, kind, value):
+        return Q(pk__in=RawSQL(
+            f'SELECT object_id FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND kind = %s',
+            ['"{}"'.format(value.replace('"', '""')), kind]
+        ))
+
+    def match_name(self, kind, term):
+        if len(term) >= FTS_MIN_TERM_LENGTH:
+            return self._match_kind(kind, term)
+        # LIKE в SQLite не различает регистр только у латиницы
+        query = Q()
+        for variant in {term, term.lower(), term.upper(), term.capitalize()}:
+            query |= Q(name__contains=variant)
+        return query
+
+    def match_phone(self, digits):
+        if len(digits) >= FTS_MIN_TERM_LENGTH:
+            return self._match_kind(PHONE, digits)
+        return super().match_phone(digits)
+
+    def _replace(self, kind, object_id, organization_id, content):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE kind = %s AND object_id = %s',
+                [kind, object_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} '
+                '(content, kind, object_id, organization_id) '
+                'VALUES (%s, %s, %s, %s)',
+                [content, kind, object_id, organization_id]
+            )
+
+    def index_organization(self, organization):
+        self._replace(
+            ORGANIZATION, organization.pk, organization.pk,
+            organization.name
+        )
+
+    def index_employee(self, employee):
+        self._replace(
+            EMPLOYEE, employee.pk, employee.organization_id,
+            employee.name
+        )
+
+    def index_phone(self, phone, organization_id):
+        self._replace(
+            PHONE, phone.pk, organization_id,
+            phone.phone_digits
+        )
+
+    def index_bulk(self, organization_id, employees, phones):
+        rows = [
+            (employee.name, EMPLOYEE, employee.pk, organization_id)
+            for employee in employees
+        ]
+        rows.extend(
+            (phone.phone_digits, PHONE, phone.pk, organization_id)
+            for phone in phones
+        )
+        with connection.cursor() as cursor:
+            self._insert_many(cursor, rows)
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            if kind == ORGANIZATION:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE organization_id = %s',
+                    [object_id]
+                )
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE kind = %s AND object_id = %s',
+                [kind, object_id]
+            )
+
+    def remove_many(self, kind, object_ids):
+        object_ids = list(object_ids)
+        with connection.cursor() as cursor:
+            # Колонки UNINDEXED: один проход по таблице на пачку id
+            for start in range(0, len(object_ids), REMOVE_BATCH_SIZE):
+                batch = object_ids[start:start + REMOVE_BATCH_SIZE]
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE kind = %s AND object_id '
+                    f'IN ({", ".join(["%s"] * len(batch))})',
+                    [kind, *batch]
+                )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} '
+                '(content, kind, object_id, organization_id) '
+                f"SELECT name, '{ORGANIZATION}', id, id "
+                f'FROM {Organization._meta.db_table}'
+            )
+            # Сотрудники основной базы копируются одним запросом
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} '
+                '(content, kind, object_id, organization_id) '
+                f"SELECT name, '{EMPLOYEE}', id, organization_id "
+                f'FROM {Employee._meta.db_table}'
+            )
+            for alias in sharding.shards():
+                if alias not in (None, DEFAULT_DB_ALIAS):
+                    self._insert_rows(
+                        cursor, EMPLOYEE,
+                        Employee.objects.using(alias).values_list(
+                            'id', 'name', 'organization_id'
+                        )
+                    )
+                self._insert_rows(
+                    cursor, PHONE, Phone.objects.using(alias).values_list(
+                        'id', 'phone_digits', 'employee__organization_id'
+                    )
+                )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+            )
+
+    def _insert_rows(self, cursor, kind, rows):
+        """Index (id, content, organization_id) rows in batches"""
+        batch = []
+        for object_id, content, organization_id in rows.iterator(
+            chunk_size=REBUILD_BATCH_SIZE
+        ):
+            batch.append((content, kind, object_id, organization_id))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                self._insert_many(cursor, batch)
+                batch = []
+        self._insert_many(cursor, batch)
+
+    def _insert_many(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} '
+                '(content, kind, object_id, organization_id) '
+                'VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Same semi-join lookups served by pg_trgm GIN indexes (migrations 0002,
+    0011). The name indexes are built on UPPER(name::text), the expression
+    icontains compiles to. PostgreSQL maintains the indexes itself, so
+    signal hooks are no-ops.
+    """
+    vendor = 'postgresql'
+
+    def rebuild(self):
+        for alias in sharding.shards():
+            with connections[alias or DEFAULT_DB_ALIAS].cursor() as cursor:
+                for index_name, _, _ in PG_TRIGRAM_INDEXES:
+                    cursor.execute(f'REINDEX INDEX {index_name}')
+
+
+PG_TRIGRAM_INDEXES = (
+    ('api_org_name_trgm', Organization._meta.db_table, 'UPPER(name::text)'),
+    ('api_emp_name_trgm', Employee._meta.db_table, 'UPPER(name::text)'),
+    ('api_phone_number_trgm', Phone._meta.db_table, 'phone_number'),
+    ('api_phone_digits_trgm', Phone._meta.db_table, 'phone_digits'),
+)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Configured backend or None if DRF SearchFilter should be used"""
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if not path:
+        return None
+    backend = _load_backend(path)
+    return backend if backend.is_available() else None
+
+
+def get_lookup_backend():
+    """Configured backend, BaseSearchBackend (plain LIKE) without one"""
+    return get_search_backend() or _load_backend(
+        'api.search.BaseSearchBackend'
+    )
@@ -1,13 +1,28 @@
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt import serializers as jwt_serializers
 
-from .models import Employee, Organization, Phone, PERSONAL
+from . import read_model, sharding
+from .authentication import EMAIL_CLAIM
+from .bulk import create_employees
+from .models import (
+    DeletionJob, Employee, Organization, Phone, PERSONAL, PHONE_TYPES,
+    normalize_phone_number
+)
+from .rules import (
+    CONFLICT_MESSAGE, DUPLICATE_NAME_MESSAGE, DUPLICATE_PHONE_MESSAGE,
+    PersonalNumberRule, concurrent_conflict
+)
 
 
 User = get_user_model()
 
+SEARCH_EMPLOYEES_LIMIT = 5
+BULK_MAX_ITEMS = 5000
+NON_FIELD_ERRORS = api_settings.NON_FIELD_ERRORS_KEY
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,6 +30,16 @@ class UserCreateSerializer(serializers.ModelSerializer):
         fields = ['email', 'password']
 
 
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Tokens with the email claim used by JWT_USER_MODE=claims"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[EMAIL_CLAIM] = user.email
+        return token
+
+
 class UserInfoSerializer(serializers.ModelSerializer):
     can_modify = serializers.SlugRelatedField(
         slug_field='name',
@@ -22,6 +47,16 @@ class UserInfoSerializer(serializers.ModelSerializer):
         many=True
     )
 
+    def validate_username(self, value):
+        dublicate = User.objects.filter(username=value)
+        if self.instance is not None:
+            dublicate = dublicate.exclude(pk=self.instance.pk)
+        if value and dublicate.exists():
+            raise serializers.ValidationError(
+                'Пользователь с таким именем уже существует'
+            )
+        return value
+
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'can_modify']
@@ -40,79 +75,197 @@ class PhoneSerialiser(serializers.ModelSerializer):
         Check if phone from data already used as personal and prevent from
         using work number as a personal
         """
-        existing_phone = None
+        if self.root is not self:
+            # Телефоны в составе сотрудника проверяются всем набором
+            # в validate_new_employees
+            return data
+        existing_phone = (
+            self.instance if isinstance(self.instance, Phone) else None
+        )
         existing_phone_pk = self.context['view'].kwargs.get('pk')
-        if existing_phone_pk:
-            try:
-                existing_phone = Phone.objects.get(pk=existing_phone_pk)
-            except ObjectDoesNotExist:
-                pass
+        if existing_phone is None and existing_phone_pk:
+            existing_phone = Phone.objects.filter(
+                pk=existing_phone_pk
+            ).only('pk', 'phone_type', 'phone_number').first()
         new_number = (
             data.get('phone_number') or existing_phone.phone_number
         )
-        dublicate = Phone.objects.filter(phone_number=new_number)
-        if (
-            # добавляемый номер не существует:
-            not dublicate
-            # номер встречается более 1 раза, значит не персональный -
-            # можем создать такой же неперсональный номер:
-            or len(dublicate) > 1 and data.get('phone_type') != PERSONAL
-            # номер встречается 1 раз и принадлежит текущему сотруднику
-            # тип запроса patch или put поскольку в url есть pk:
-            or len(dublicate) == 1 and dublicate[0] == existing_phone
-            # номер встречается 1 раз и он не персональный - не пытаемся
-            # создать такой же персональный номер:
-            or len(dublicate) == 1 and dublicate[0].phone_type != PERSONAL
-            and data.get('phone_type') != PERSONAL
-        ):
+        # PATCH без phone_type сохраняет прежний тип
+        new_type = data.get('phone_type') or (
+            existing_phone and existing_phone.phone_type
+        )
+        digits = normalize_phone_number(new_number)
+        # Сам изменяемый телефон номер не занимает
+        rule = PersonalNumberRule(
+            [digits],
+            exclude=None if existing_phone is None else [existing_phone.pk]
+        )
+        if rule.add(digits, new_type == PERSONAL):
             return data
-        raise serializers.ValidationError(
-            'Данный номер искользуется в качестве личного иным'
-            ' сотрудником либо вы пытаетесь сохранить рабочий номер'
-            ' в качестве личного'
+        raise serializers.ValidationError(DUPLICATE_PHONE_MESSAGE)
+
+    def create(self, validated_data):
+        with concurrent_conflict(DUPLICATE_PHONE_MESSAGE):
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with concurrent_conflict(DUPLICATE_PHONE_MESSAGE):
+            return super().update(instance, validated_data)
+
+
+class PhoneOwnerSerializer(serializers.ModelSerializer):
+    employee_id = serializers.IntegerField(source='employee.id')
+    employee_name = serializers.CharField(source='employee.name')
+    organization_id = serializers.IntegerField(
+        source='employee.organization.id'
+    )
+    organization_name = serializers.CharField(
+        source='employee.organization.name'
+    )
+
+    class Meta:
+        model = Phone
+        fields = (
+            'id', 'phone_type', 'phone_number', 'employee_id',
+            'employee_name', 'organization_id', 'organization_name',
         )
 
 
+def phone_number_field(**kwargs):
+    return serializers.CharField(
+        max_length=16, validators=[Phone.phone_regex], **kwargs
+    )
+
+
+class PhoneReplaceSerializer(serializers.Serializer):
+    old_number = phone_number_field(label='Заменяемый номер')
+    new_number = phone_number_field(label='Новый номер')
+
+
+class PhoneBulkAddSerializer(serializers.Serializer):
+    employees = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+        label='Сотрудники'
+    )
+    phone_type = serializers.ChoiceField(
+        choices=PHONE_TYPES, label='Тип номера'
+    )
+    phone_number = phone_number_field(label='Номер')
+
+
+class PhoneBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+        label='Телефоны'
+    )
+
+
+def validate_new_employees(organization_id, employees):
+    """
+    Duplicate names and the personal number rule for a batch of new
+    employees: two queries for any batch size. Returns errors per item.
+    """
+    existing_names = set(Employee.objects.filter(
+        organization_id=organization_id,
+        name__in=[employee['name'] for employee in employees]
+    ).values_list('name', flat=True))
+    rule = PersonalNumberRule(
+        normalize_phone_number(phone['phone_number'])
+        for employee in employees for phone in employee['phones']
+    )
+    errors = []
+    for employee in employees:
+        item_errors = {}
+        if employee['name'] in existing_names:
+            item_errors[NON_FIELD_ERRORS] = [DUPLICATE_NAME_MESSAGE]
+        existing_names.add(employee['name'])
+        phone_errors = [
+            {} if rule.add(
+                normalize_phone_number(phone['phone_number']),
+                phone['phone_type'] == PERSONAL
+            ) else {NON_FIELD_ERRORS: [DUPLICATE_PHONE_MESSAGE]}
+            for phone in employee['phones']
+        ]
+        if any(phone_errors):
+            item_errors['phones'] = phone_errors
+        errors.append(item_errors)
+    return errors
+
+
+class EmployeeListSerializer(serializers.ListSerializer):
+    """Employees created at once, validated and saved as one batch"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > BULK_MAX_ITEMS:
+            raise serializers.ValidationError({NON_FIELD_ERRORS: [
+                f'Не более {BULK_MAX_ITEMS} сотрудников в одном запросе'
+            ]})
+        employees = super().to_internal_value(data)
+        errors = validate_new_employees(
+            self.context['view'].kwargs['org_id'], employees
+        )
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return employees
+
+    def create(self, validated_data):
+        with concurrent_conflict(CONFLICT_MESSAGE):
+            return create_employees(
+                validated_data[0]['organization'], validated_data
+            )
+
+
 class EmployeeSerializer(serializers.ModelSerializer):
-    phones = PhoneSerialiser(many=True)
+    phones = PhoneSerialiser(
+        many=True, allow_empty=False,
+        error_messages={'empty': 'Укажите хотя бы один телефон'}
+    )
 
     def validate(self, data):
         """
         Check if the employee with same name exists in current organization
+        and new phones do not break the personal number rule. Items of
+        a list are checked together by EmployeeListSerializer.
         """
+        if self.parent is not None:
+            return super().validate(data)
         kwargs = self.context['view'].kwargs
+        if self.instance is None:
+            errors, = validate_new_employees(kwargs['org_id'], [data])
+            if errors:
+                raise serializers.ValidationError(errors)
+            return super().validate(data)
         name = data.get('name')
         if name:
-            try:
-                dublicate = Employee.objects.get(
-                    name=name,
-                    organization_id=kwargs['org_id']
-                )
-                request_emp_id = kwargs.get('pk')
-                if request_emp_id:
-                    request_emp_id = int(request_emp_id)
-                if dublicate and dublicate.id != request_emp_id:
-                    raise serializers.ValidationError(
-                        'Сотрудник с таким ФИО уже существует'
-                    )
-            except ObjectDoesNotExist:
-                pass
+            dublicate = Employee.objects.filter(
+                name=name,
+                organization_id=kwargs['org_id']
+            ).exclude(pk=self.instance.pk)
+            if dublicate.exists():
+                raise serializers.ValidationError(DUPLICATE_NAME_MESSAGE)
         return super().validate(data)
 
     def create(self, validated_data):
-        phone_data = validated_data.pop('phones')
-        employee = Employee.objects.create(**validated_data)
-        Phone.objects.create(employee=employee, **phone_data[0])
+        with concurrent_conflict(CONFLICT_MESSAGE):
+            employee, = create_employees(
+                validated_data['organization'], [validated_data]
+            )
         return employee
 
     def update(self, instance, validated_data):
         # Phone's information can be updated through phones/ endpoint
         validated_data.pop('phones', {})
-        return super().update(instance, validated_data)
+        with concurrent_conflict(DUPLICATE_NAME_MESSAGE):
+            return super().update(instance, validated_data)
 
     class Meta:
         model = Employee
         fields = ('id', 'name', 'position', 'phones')
+        list_serializer_class = EmployeeListSerializer
 
 
 class OrganizationListSerializer(serializers.ModelSerializer):
@@ -127,12 +280,52 @@ class OrganizationListSerializer(serializers.ModelSerializer):
         if not search:
             self.fields.pop('employees')
 
-    def get_employees(self, obj):
-        search = self.context['request'].query_params.get('q')
-        employees = obj.employees.filter(
+    @staticmethod
+    def matching_employees(search):
+        """Up to SEARCH_EMPLOYEES_LIMIT matching employees per organization"""
+        matching = Employee.objects.filter(
             Q(name__icontains=search)
-            | Q(phones__phone_number__icontains=search)
-        )[:5]
+            | Q(Exists(Phone.objects.filter(
+                employee=OuterRef('pk'),
+                phone_number__icontains=search
+            )))
+        )
+        top = matching.filter(
+            organization_id=OuterRef('organization_id')
+        ).order_by('pk').values('pk')[:SEARCH_EMPLOYEES_LIMIT]
+        return matching.filter(pk__in=Subquery(top)).order_by('pk')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, search):
+        """
+        Load matching employees and their phones in two queries for the
+        whole page (one with the read model: phones come with the card).
+        A prefetch reads one database, so with sharding employees are
+        loaded per organization by get_employees.
+        """
+        if sharding.is_enabled():
+            return queryset
+        employees = cls.matching_employees(search)
+        if read_model.is_enabled():
+            employees = employees.select_related('card')
+        else:
+            employees = employees.prefetch_related('phones')
+        return queryset.prefetch_related(Prefetch(
+            'employees', queryset=employees, to_attr='found_employees'
+        ))
+
+    def get_employees(self, obj):
+        employees = getattr(obj, 'found_employees', None)
+        if employees is None:
+            search = self.context['request'].query_params.get('q')
+            employees = obj.employees.filter(
+                Q(name__icontains=search)
+                | Q(phones__phone_number__icontains=search)
+            ).distinct().order_by('pk')[:SEARCH_EMPLOYEES_LIMIT]
+        elif read_model.is_enabled():
+            cards = [getattr(employee, 'card', None) for employee in employees]
+            if None not in cards:
+                return [card.document for card in cards]
         return EmployeeSerializer(employees, many=True).data
 
     class Meta:
@@ -151,3 +344,27 @@ class OrganizationCRUDSerializer(serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = ('id', 'name', 'address', 'description', 'modifiers',)
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(
+        view_name='deletion-jobs-detail'
+    )
+    progress = serializers.SerializerMethodField()
+
+    def get_progress(self, obj):
+        """Share of deleted rows, percent"""
+        total = obj.total_employees + obj.total_phones
+        if obj.status == DeletionJob.DONE or not total:
+            return 100 if obj.status == DeletionJob.DONE else 0
+        deleted = obj.deleted_employees + obj.deleted_phones
+        return min(100 * deleted // total, 99)
+
+    class Meta:
+        model = DeletionJob
+        fields = (
+            'id', 'url', 'organization_id', 'organization_name', 'status',
+            'progress', 'total_employees', 'total_phones',
+            'deleted_employees', 'deleted_phones', 'error', 'created_at',
+            'finished_at',
+        )
@@ -0,0 +1,292 @@
+"""
+Horizontal partitioning by organization. Organizations, users and the
+change feed counter stay in the default database; employees, phones, their
+tombstones and read model cards of an organization live in its shard, one
+of SHARD_DATABASES chosen when the organization is created and kept in
+Organization.shard.
+ShardRouter sends queries of those tables to the shard of the instance or
+to the shard activated for the current request by the per-organization
+views. Searches over the whole directory run on every shard in parallel
+(fan_out, everywhere) and merge the results.
+"""
+import contextvars
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .models import Employee, Organization, Phone
+
+
+SHARDED_MODELS = {'employee', 'phone', 'employeecard', 'tombstone'}
+
+# Шард, в который идут запросы к таблицам сотрудников и телефонов
+_current = contextvars.ContextVar('shard', default=None)
+
+_executor = None
+
+
+def is_enabled():
+    return bool(settings.SHARD_DATABASES)
+
+
+def shards():
+    """
+    Aliases to run a query of the sharded tables on. Without sharding it is
+    [None]: QuerySet.using(None) leaves the choice to the routers.
+    """
+    return settings.SHARD_DATABASES if is_enabled() else [None]
+
+
+def choose_shard(name):
+    """Shard for a new organization, '' (default) without sharding"""
+    if not is_enabled():
+        return ''
+    aliases = settings.SHARD_DATABASES
+    return aliases[zlib.crc32(name.encode()) % len(aliases)]
+
+
+def shard_of(organization):
+    return organization.shard or DEFAULT_DB_ALIAS
+
+
+def organization_shard(organization_id):
+    shard = Organization.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=organization_id
+    ).values_list('shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def current():
+    return _current.get()
+
+
+def activate(alias):
+    return _current.set(alias)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def use(alias):
+    """Send queries of the sharded tables to alias inside the block"""
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def use_organization(organization):
+    return use(shard_of(organization) if is_enabled() else None)
+
+
+def atomic():
+    """
+    Transaction on the active shard, the default database without one.
+    Writes take no lock in the default database (see changes.sequence).
+    """
+    return transaction.atomic(using=_current.get() or DEFAULT_DB_ALIAS)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.SHARD_FANOUT_WORKERS,
+            thread_name_prefix='api-shard'
+        )
+    return _executor
+
+
+def _call_on(alias, function):
+    token = _current.set(alias)
+    try:
+        return function()
+    finally:
+        _current.reset(token)
+
+
+def _call_in_thread(alias, function):
+    try:
+        return _call_on(alias, function)
+    finally:
+        connections[alias].close_if_unusable_or_obsolete()
+
+
+def fan_out(function):
+    """
+    Call function once per shard with that shard active and return the
+    results in SHARD_DATABASES order. The calls run in parallel threads,
+    inside a transaction one by one in this thread, so that they see its
+    uncommitted rows. Without sharding function is called once.
+    """
+    if not is_enabled():
+        return [function()]
+    aliases = settings.SHARD_DATABASES
+    if any(connections[alias].in_atomic_block for alias in aliases):
+        return [_call_on(alias, function) for alias in aliases]
+    # Контекст копируется, чтобы запросы учитывались в метриках запроса
+    futures = [
+        get_executor().submit(
+            contextvars.copy_context().run,
+            partial(_call_in_thread, alias, function)
+        )
+        for alias in aliases
+    ]
+    return [future.result() for future in futures]
+
+
+def ordering_key(fields):
+    """Ordering value of a model instance or of a .values() row"""
+    def key(row):
+        if isinstance(row, dict):
+            return tuple(row[field] for field in fields)
+        return tuple(getattr(row, field) for field in fields)
+    return key
+
+
+class ShardedQuerySet:
+    """
+    The same queryset run on every shard, rows merged in its ordering. Only
+    what ResultsSetPagination and the lookups need: filter, exclude,
+    order_by, count and slicing with a stop. key gives the ordering value
+    of a row; by default the order_by fields are read from instances or
+    .values() dicts, .values_list() rows need an explicit key.
+    """
+
+    def __init__(self, queryset, key=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.key = key or ordering_key(queryset.query.order_by)
+
+    def filter(self, *args, **kwargs):
+        return type(self)(self.queryset.filter(*args, **kwargs), self.key)
+
+    def exclude(self, *args, **kwargs):
+        return type(self)(self.queryset.exclude(*args, **kwargs), self.key)
+
+    def order_by(self, *fields):
+        return type(self)(self.queryset.order_by(*fields))
+
+    def count(self):
+        return sum(fan_out(lambda: self.queryset.all().count()))
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.stop is None or key.step:
+            raise TypeError('ShardedQuerySet supports only [start:stop]')
+        # Каждая база отдает первые stop строк, слияние берет нужные
+        results = fan_out(lambda: list(self.queryset.all()[:key.stop]))
+        return list(islice(
+            heapq.merge(*results, key=self.key), key.start or 0, key.stop
+        ))
+
+
+def everywhere(queryset, key=None):
+    """
+    queryset over all shards; the queryset itself without sharding or for
+    tables of the default database
+    """
+    if is_enabled() and queryset.model._meta.model_name in SHARDED_MODELS:
+        return ShardedQuerySet(queryset, key)
+    return queryset
+
+
+def exclude_deleting(lookup):
+    """
+    Q for rows of organizations that are not being deleted, lookup is the
+    path to the organization. With sharding the organizations table is in
+    another database, so the few deleting ones are excluded by id.
+    """
+    if not is_enabled():
+        return Q(**{f'{lookup}__deleting': False})
+    return ~Q(**{f'{lookup}_id__in': list(
+        Organization.objects.using(DEFAULT_DB_ALIAS).filter(
+            deleting=True
+        ).values_list('pk', flat=True)
+    )})
+
+
+def instance_shard(instance):
+    if isinstance(instance, Organization):
+        return shard_of(instance)
+    if instance._state.db:
+        return instance._state.db
+    organization_id = getattr(instance, 'organization_id', None)
+    if organization_id is not None:
+        return organization_shard(organization_id)
+    employee = instance._state.fields_cache.get('employee')
+    return instance_shard(employee) if employee is not None else None
+
+
+class ShardRouter:
+    """
+    Employees, phones and cards go to the shard of the instance in hints or
+    to the active shard; everything else is left to the next router.
+    """
+
+    def _db_for(self, model, **hints):
+        if (model._meta.app_label != 'api'
+                or model._meta.model_name not in SHARDED_MODELS):
+            return None
+        instance = hints.get('instance')
+        alias = instance_shard(instance) if instance is not None else None
+        return alias or _current.get()
+
+    db_for_read = _db_for
+    db_for_write = _db_for
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Связи между базами держит код, а не внешние ключи
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема во всех базах одна, лишние таблицы остаются пустыми
+        return True if db in settings.SHARD_DATABASES else None
+
+
+def reserve_id_ranges(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: ids of employees and phones in shard number n
+    start at n * SHARD_ID_RANGE, so they stay unique in the whole directory
+    (the search index, autocomplete and the change feed rely on that)
+    """
+    if using not in settings.SHARD_DATABASES:
+        return
+    start = settings.SHARD_DATABASES.index(using) * settings.SHARD_ID_RANGE
+    if not start:
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in (Employee, Phone):
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, 'id')", [table]
+                )
+                sequence, = cursor.fetchone()
+                cursor.execute(f'SELECT last_value FROM {sequence}')
+                if cursor.fetchone()[0] < start:
+                    cursor.execute(
+                        'SELECT setval(%s, %s, false)', [sequence, start]
+                    )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'DELETE FROM sqlite_sequence WHERE name = %s '
+                    'AND seq < %s',
+                    [table, start - 1]
+                )
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) '
+                    'SELECT %s, %s WHERE NOT EXISTS ('
+                    'SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, start - 1, table]
+                )
@@ -0,0 +1,135 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import autocomplete, deletion, read_model, sharding
+from .authentication import users
+from .cache import (
+    ORGANIZATIONS, acl_scope, bump_generation, organization_scope
+)
+from .models import Employee, Organization, Phone, Tombstone, User
+from .search import EMPLOYEE, ORGANIZATION, PHONE, get_search_backend
+
+
+def phone_organization_id(phone):
+    return Employee.objects.using(phone._state.db).filter(
+        pk=phone.employee_id
+    ).values_list('organization_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Organization)
+def organization_placed(sender, instance, **kwargs):
+    if not instance.shard:
+        instance.shard = sharding.choose_shard(instance.name)
+
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, **kwargs):
+    bump_generation(
+        ORGANIZATIONS, organization_scope(instance.pk), acl_scope(instance.pk)
+    )
+    backend = get_search_backend()
+    if backend:
+        backend.index_organization(instance)
+    autocomplete.update('index_organization', instance)
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, using, **kwargs):
+    # Карточка обновляется до сброса кэша, иначе в кэш попадет старая
+    if read_model.is_enabled():
+        with sharding.use(using):
+            read_model.refresh_employees([instance.pk])
+    bump_generation(
+        ORGANIZATIONS, organization_scope(instance.organization_id)
+    )
+    backend = get_search_backend()
+    if backend:
+        backend.index_employee(instance)
+    autocomplete.update('index_employee', instance, using=using)
+
+
+@receiver(post_save, sender=Phone)
+def phone_saved(sender, instance, using, **kwargs):
+    if read_model.is_enabled():
+        with sharding.use(using):
+            read_model.refresh_employees([instance.employee_id])
+    org_id = phone_organization_id(instance)
+    bump_generation(ORGANIZATIONS, organization_scope(org_id))
+    backend = get_search_backend()
+    if backend:
+        backend.index_phone(instance, org_id)
+    autocomplete.update('index_phone', instance, org_id, using=using)
+
+
+@receiver(pre_delete, sender=Organization)
+def organization_deleting(sender, instance, using, **kwargs):
+    # Каскад удаления доходит только до строк базы самой организации
+    if sharding.is_enabled():
+        deletion.purge_shards(instance, using)
+
+
+@receiver(post_delete, sender=Organization)
+def organization_deleted(sender, instance, using, **kwargs):
+    Tombstone.record(sender, [instance.pk], instance.pk, using=using)
+    bump_generation(
+        ORGANIZATIONS, organization_scope(instance.pk), acl_scope(instance.pk)
+    )
+    backend = get_search_backend()
+    if backend:
+        backend.remove(ORGANIZATION, instance.pk)
+    autocomplete.update('remove', ORGANIZATION, instance.pk)
+
+
+@receiver(post_delete, sender=Employee)
+def employee_deleted(sender, instance, using, **kwargs):
+    Tombstone.record(
+        sender, [instance.pk], instance.organization_id, using=using
+    )
+    bump_generation(
+        ORGANIZATIONS, organization_scope(instance.organization_id)
+    )
+    backend = get_search_backend()
+    if backend:
+        backend.remove(EMPLOYEE, instance.pk)
+    autocomplete.update('remove', EMPLOYEE, instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Phone)
+def phone_deleted(sender, instance, using, **kwargs):
+    org_id = phone_organization_id(instance)
+    Tombstone.record(sender, [instance.pk], org_id, using=using)
+    if read_model.is_enabled():
+        with sharding.use(using):
+            read_model.refresh_employees(
+                [instance.employee_id], create=False
+            )
+    bump_generation(ORGANIZATIONS, organization_scope(org_id))
+    backend = get_search_backend()
+    if backend:
+        backend.remove(PHONE, instance.pk)
+    autocomplete.update('remove', PHONE, instance.pk, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    users.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=Organization.modifiers.through)
+def modifiers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        org_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear' and reverse:
+        # instance - пользователь, после очистки связи уже не найти
+        org_ids = list(instance.can_modify.values_list('pk', flat=True))
+    elif action == 'post_clear' and not reverse:
+        org_ids = [instance.pk]
+    else:
+        return
+    bump_generation(*[
+        scope for org_id in org_ids
+        for scope in (organization_scope(org_id), acl_scope(org_id))
+    ])
@@ -0,0 +1,16 @@
+'use strict';
+{
+    const $ = django.jQuery;
+    // Выбор в AutocompleteFilter открывает перечень с этим фильтром
+    $(document).on('change', 'select.autocomplete-filter', function() {
+        const queryString = this.dataset.queryString;
+        const value = $(this).val();
+        if (!value) {
+            window.location = queryString;
+            return;
+        }
+        window.location = queryString + (queryString.length > 1 ? '&' : '') +
+            encodeURIComponent(this.dataset.parameter) + '=' +
+            encodeURIComponent(value);
+    });
+}
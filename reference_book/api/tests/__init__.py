@@ -0,0 +1,4 @@
+import logging
+
+# Строка лога на каждый запрос тестового клиента засоряет вывод
+logging.getLogger('api.requests').setLevel(logging.WARNING)
@@ -0,0 +1,43 @@
+from django import test
+from django.conf import settings
+
+from api import sharding
+from api.models import Employee, Organization, Phone
+from api.utils import create_user_with_username
+
+
+# С разделением (DB_SHARDS) сотрудники и телефоны пишутся во все базы
+DATABASES = {'default', *settings.SHARD_DATABASES}
+
+
+class TestCase(test.TestCase):
+    databases = DATABASES
+
+
+class TransactionTestCase(test.TransactionTestCase):
+    databases = DATABASES
+
+
+def create_user(email='owner@example.com', **fields):
+    return create_user_with_username(email, password='password', **fields)
+
+
+def create_organization(owner, name, employees=0, phones=1, **fields):
+    """Organization with employees, each with phones work numbers"""
+    organization = Organization.objects.create(
+        name=name, address='Адрес', description='Описание', owner=owner,
+        **fields
+    )
+    with sharding.use_organization(organization):
+        for number in range(employees):
+            employee = Employee.objects.create(
+                name=f'{name} сотрудник {number}', position='Инженер',
+                organization=organization
+            )
+            for phone in range(phones):
+                Phone.objects.create(
+                    employee=employee, phone_number=(
+                        f'+7916{organization.pk:03}{number:02}{phone:02}'
+                    )
+                )
+    return organization
@@ -0,0 +1,205 @@
+from unittest import mock
+
+from django.contrib.admin.views.main import PAGE_VAR
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import admin as api_admin
+from api.models import DeletionJob, Employee, Organization, Phone
+
+from .helpers import TestCase, create_organization, create_user
+
+# Сессия, пользователь, число строк, итог без фильтров и строки страницы
+CHANGELIST_QUERIES = 5
+
+
+class AdminTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user(
+            'admin@example.com', is_staff=True, is_superuser=True
+        )
+        # Админка видит сотрудников и телефоны только основной базы
+        cls.school = create_organization(
+            cls.admin, 'ГБОУ Школа', employees=1, shard='default'
+        )
+        cls.clinic = create_organization(cls.admin, 'Поликлиника')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        response = self.client.get(
+            f'/admin/api/{model}/', params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def found(self, model, **params):
+        changelist = self.changelist(model, **params).context['cl']
+        return [str(obj) for obj in changelist.result_list]
+
+
+class AdminSearchTests(AdminTestCase):
+
+    def test_organization_search_ignores_case(self):
+        for term in ('гбоу', 'Школа', 'школа', 'ШКОЛА', 'бо'):
+            with self.subTest(term=term):
+                self.assertEqual(
+                    self.found('organization', q=term),
+                    [str(self.school)]
+                )
+
+    def test_organization_search_in_the_middle_of_the_name(self):
+        self.assertEqual(
+            self.found('organization', q='клиник'), [str(self.clinic)]
+        )
+
+    def test_employee_search_ignores_case(self):
+        employee = Employee.objects.get(organization=self.school)
+        for term in ('СОТРУДНИК', 'гбоу', 'ко'):
+            with self.subTest(term=term):
+                self.assertEqual(
+                    self.found('employee', q=term), [str(employee)]
+                )
+
+    def test_phone_search_without_country_code(self):
+        phone = Phone.objects.get(employee__organization=self.school)
+        digits = phone.phone_digits
+        for term in (digits[1:4], digits[1:], '+' + digits[:5], digits[-2:]):
+            with self.subTest(term=term):
+                self.assertIn(str(phone), self.found('phone', q=term))
+
+    def test_phone_search_without_digits_finds_nothing(self):
+        self.assertEqual(self.found('phone', q='abc'), [])
+
+
+class AdminPaginationTests(AdminTestCase):
+
+    def one_per_page(self):
+        return mock.patch.object(
+            api_admin.OrganizationAdmin, 'list_per_page', 1
+        )
+
+    def test_filtered_count_shows_that_there_are_more(self):
+        with mock.patch.object(api_admin, 'COUNT_LIMIT', 1), \
+                self.one_per_page():
+            response = self.changelist(
+                'organization', q='а', **{PAGE_VAR: 0}
+            )
+        # Строка первой страницы и хотя бы одна после неё
+        self.assertEqual(str(response.context['cl'].result_count), '2+')
+        self.assertContains(response, '2+')
+
+    def test_pages_past_the_count_limit_are_reachable(self):
+        create_organization(self.admin, 'Амбулатория')
+        with mock.patch.object(api_admin, 'COUNT_LIMIT', 1), \
+                self.one_per_page():
+            names = [
+                self.found('organization', q='а', o='1', **{PAGE_VAR: page})
+                for page in range(3)
+            ]
+        self.assertEqual(
+            names,
+            [['Амбулатория'], ['ГБОУ Школа'], ['Поликлиника']]
+        )
+
+    def test_unfiltered_count_is_exact_for_small_tables(self):
+        response = self.changelist('organization')
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class AdminChangelistQueryTests(AdminTestCase):
+    """The number of queries does not grow with the number of rows"""
+
+    def assertChangelistQueries(self, model, queries, add_rows):
+        with self.assertNumQueries(queries):
+            self.changelist(model)
+        add_rows()
+        with self.assertNumQueries(queries):
+            self.changelist(model)
+
+    def add_organization(self):
+        create_organization(self.admin, 'Больница', employees=3, phones=2)
+
+    def test_organization_changelist(self):
+        self.assertChangelistQueries(
+            'organization', CHANGELIST_QUERIES, self.add_organization
+        )
+
+    def test_employee_changelist(self):
+        self.assertChangelistQueries(
+            'employee', CHANGELIST_QUERIES, self.add_organization
+        )
+
+    def test_phone_changelist(self):
+        self.assertChangelistQueries(
+            'phone', CHANGELIST_QUERIES, self.add_organization
+        )
+
+    def test_deletion_job_changelist(self):
+        def add_rows():
+            for organization in Organization.objects.all():
+                DeletionJob.objects.create(
+                    organization_id=organization.pk,
+                    organization_name=organization.name,
+                    requested_by=self.admin
+                )
+        self.assertChangelistQueries(
+            'deletionjob', CHANGELIST_QUERIES, add_rows
+        )
+
+
+class AdminDeleteConfirmationTests(AdminTestCase):
+    """Deletion runs as a DeletionJob: the page shows counts only"""
+
+    def confirmation(self, organization):
+        with mock.patch(
+            'django.contrib.admin.utils.NestedObjects.collect'
+        ) as collect:
+            response = self.client.get(
+                f'/admin/api/organization/{organization.pk}/delete/'
+            )
+        collect.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_counts(self):
+        response = self.confirmation(self.school)
+        self.assertEqual(dict(response.context['model_count']), {
+            'organizations': 1, 'employees': 1, 'phones': 1,
+        })
+        self.assertEqual(
+            response.context['deleted_objects'],
+            [f'Organization: {self.school}']
+        )
+        self.assertFalse(response.context['perms_lacking'])
+
+    def test_queries_do_not_grow_with_employees(self):
+        organization = create_organization(
+            self.admin, 'Больница', employees=1
+        )
+        with CaptureQueriesContext(connection) as small:
+            self.confirmation(organization)
+        for number in range(5):
+            Employee.objects.create(
+                name=f'Новый сотрудник {number}', position='Врач',
+                organization=organization
+            )
+        with self.assertNumQueries(len(small)):
+            response = self.confirmation(organization)
+        self.assertEqual(
+            dict(response.context['model_count'])['employees'], 6
+        )
+
+    def test_bulk_action_confirmation(self):
+        response = self.client.post('/admin/api/organization/', {
+            'action': 'delete_selected',
+            '_selected_action': [self.school.pk, self.clinic.pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(response.context['model_count']), {
+            'organizations': 2, 'employees': 1, 'phones': 1,
+        })
+        self.assertFalse(DeletionJob.objects.exists())
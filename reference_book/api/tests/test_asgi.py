@@ -0,0 +1,124 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import async_views
+from api.models import Employee
+
+from .helpers import TransactionTestCase, create_organization, create_user
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class AsyncReadViewTests(TransactionTestCase):
+    """
+    Read views under ASYNC_ROOT_URLCONF run in a thread pool with their own
+    connections, which see only committed rows: TransactionTestCase.
+    """
+
+    def setUp(self):
+        self.owner = create_user()
+        self.stranger = create_user('stranger@example.com')
+        self.organization = create_organization(
+            self.owner, 'Поликлиника', employees=3
+        )
+        create_organization(self.owner, 'Больница', employees=1)
+        self.employee = Employee.objects.filter(
+            organization=self.organization
+        ).first()
+        self.employees_url = (
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+        )
+
+    @staticmethod
+    def token(user):
+        return f'Bearer {AccessToken.for_user(user)}' if user else None
+
+    def wsgi(self, method, url, user=None, data=None):
+        client = APIClient()
+        if user:
+            client.credentials(HTTP_AUTHORIZATION=self.token(user))
+        return getattr(client, method)(url, data, format='json')
+
+    def asgi(self, method, url, user=None, data=None):
+        headers = [(b'host', b'testserver')]
+        if user:
+            headers.append((b'authorization', self.token(user).encode()))
+        extra = {'headers': headers}
+        if data is not None:
+            body = json.dumps(data).encode()
+            extra.update(data=body, content_type='application/json')
+            # headers заменяют собранные клиентом, вместе с длиной тела
+            headers += [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ]
+        with override_settings(ROOT_URLCONF=settings.ASYNC_ROOT_URLCONF):
+            return asyncio.run(getattr(AsyncClient(), method)(url, **extra))
+
+    def assertSameResponse(self, url, user=None, status=None):
+        expected = self.wsgi('get', url, user)
+        actual = self.asgi('get', url, user)
+        self.assertEqual(actual.status_code, expected.status_code)
+        if status is not None:
+            self.assertEqual(actual.status_code, status)
+        self.assertEqual(actual['Content-Type'], expected['Content-Type'])
+        self.assertEqual(
+            json.loads(actual.content), json.loads(expected.content)
+        )
+
+    def test_lists(self):
+        for url in (
+            '/api/v1/organizations/',
+            '/api/v1/organizations/?page_size=1',
+            '/api/v1/organizations/?cursor=&page_size=1',
+            '/api/v1/organizations/search/?q=Поликлиника',
+            self.employees_url,
+            f'{self.employees_url}?count=false&page_size=2',
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+            f'{self.employee.pk}/phones/',
+        ):
+            with self.subTest(url=url):
+                self.assertSameResponse(url, self.owner, 200)
+
+    def test_retrieve(self):
+        with mock.patch.object(
+            async_views, '_run_read_view', wraps=async_views._run_read_view
+        ) as run_read_view:
+            self.assertSameResponse(
+                f'{self.employees_url}{self.employee.pk}/', self.owner, 200
+            )
+        # Ответ ASGI собран в пуле потоков
+        run_read_view.assert_called_once()
+
+    def test_permissions(self):
+        url = f'{self.employees_url}{self.employee.pk}/'
+        self.assertSameResponse(url, self.stranger, 403)
+        self.assertSameResponse(url, None, 401)
+
+    def test_not_found(self):
+        for url in (
+            f'/api/v1/organizations/{self.organization.pk + 100}/employees/',
+            f'{self.employees_url}{self.employee.pk + 100}/',
+            '/api/v1/organizations/?page=100',
+        ):
+            with self.subTest(url=url):
+                self.assertSameResponse(url, self.owner, 404)
+
+    def test_writes_are_served(self):
+        response = self.asgi(
+            'patch', f'{self.employees_url}{self.employee.pk}/', self.owner,
+            {'position': 'Главный врач'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.position, 'Главный врач')
+        response = self.asgi(
+            'patch', f'{self.employees_url}{self.employee.pk}/',
+            self.stranger, {'position': 'Врач'}
+        )
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import authentication
+from api.models import User
+
+from .helpers import TestCase, create_user
+
+
+CHANGES_URL = '/api/v1/changes/'
+
+
+class JWTUserModeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+
+    def setUp(self):
+        authentication.users.clear()
+        self.user = User.objects.get(pk=self.user.pk)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(CHANGES_URL)
+        self.assertEqual(response.status_code, 200)
+        return sum('"api_user"' in query['sql'] for query in context)
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        for mode in (authentication.DATABASE, authentication.CACHED,
+                     authentication.CLAIMS):
+            with self.subTest(mode=mode), override_settings(
+                JWT_USER_MODE=mode
+            ):
+                response = self.client.get(CHANGES_URL)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response.data['code'], 'user_inactive'
+                )
+
+    @override_settings(JWT_USER_MODE=authentication.DATABASE)
+    def test_database_reads_the_row_on_every_request(self):
+        self.assertEqual(self.user_queries(), 1)
+        self.assertEqual(self.user_queries(), 1)
+
+    @override_settings(JWT_USER_MODE=authentication.CLAIMS)
+    def test_claims_check_the_cached_row(self):
+        self.assertEqual(self.user_queries(), 1)
+        self.assertEqual(self.user_queries(), 0)
+        # Сигнал сбрасывает запись, следующий запрос видит деактивацию
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(CHANGES_URL).status_code, 401)
+
+    @override_settings(JWT_USER_MODE=authentication.CLAIMS)
+    def test_claims_deleted_user(self):
+        User.objects.filter(pk=self.user.pk).delete()
+        response = self.client.get(CHANGES_URL)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import override_settings
+
+from api import autocomplete, bulk
+from api.models import Employee, Organization, Phone
+from api.search import EMPLOYEE, ORGANIZATION, PHONE
+
+from .helpers import TransactionTestCase, create_organization, create_user
+
+
+@override_settings(AUTOCOMPLETE_ENABLED=True, AUTOCOMPLETE_MAX_AGE=3600)
+class PrefixIndexUpdateTests(TransactionTestCase):
+    """Index writes happen after commit; on_commit needs real commits"""
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.owner = create_user()
+        self.organization = create_organization(
+            self.owner, 'Поликлиника', employees=1
+        )
+
+    def texts(self, query, kind=ORGANIZATION):
+        index = autocomplete.get_index(build_missing=True)
+        return [
+            item['text'] for item in index.lookup(query)
+            if item['type'] == kind
+        ]
+
+    def test_rolled_back_create_is_not_indexed(self):
+        self.assertEqual(self.texts('пол'), ['Поликлиника'])
+        with self.assertRaises(ValueError), transaction.atomic():
+            Organization.objects.create(
+                name='Полиция', address='Адрес', description='Описание',
+                owner=self.owner
+            )
+            raise ValueError
+        self.assertEqual(self.texts('пол'), ['Поликлиника'])
+        with transaction.atomic():
+            Organization.objects.create(
+                name='Полиция', address='Адрес', description='Описание',
+                owner=self.owner
+            )
+            self.assertEqual(self.texts('пол'), ['Поликлиника'])
+        self.assertEqual(self.texts('пол'), ['Поликлиника', 'Полиция'])
+
+    def test_rolled_back_bulk_delete_keeps_phones(self):
+        phone = Phone.objects.get()
+        self.texts('79', PHONE)
+        with self.assertRaises(ValueError), transaction.atomic():
+            bulk.delete_phones(self.organization, [phone.pk])
+            raise ValueError
+        self.assertEqual(self.texts('79', PHONE), [phone.phone_number])
+        bulk.delete_phones(self.organization, [phone.pk])
+        self.assertEqual(self.texts('79', PHONE), [])
+
+    def test_writes_during_rebuild_are_replayed(self):
+        self.texts('пол')
+        build = autocomplete.build
+
+        def build_then_write():
+            # Снимок прочитан, затем другой запрос меняет справочник
+            index = build()
+            Employee.objects.filter(name__startswith='Поликлиника').delete()
+            Organization.objects.create(
+                name='Полиция', address='Адрес', description='Описание',
+                owner=self.owner
+            )
+            return index
+
+        with mock.patch('api.autocomplete.build', build_then_write):
+            autocomplete._rebuild()
+        self.assertEqual(self.texts('пол'), ['Поликлиника', 'Полиция'])
+        self.assertEqual(self.texts('пол', EMPLOYEE), [])
+
+    def test_failed_rebuild_after_reset(self):
+        self.texts('пол')
+        autocomplete.reset()
+        with mock.patch('api.autocomplete.build', side_effect=RuntimeError), \
+                self.assertLogs('api.autocomplete', 'ERROR'):
+            autocomplete._rebuild()
+        self.assertIsNone(autocomplete.get_index())
+        self.assertEqual(self.texts('пол'), ['Поликлиника'])
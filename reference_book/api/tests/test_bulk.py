@@ -0,0 +1,259 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import autocomplete, bulk, read_model
+from api.models import Employee, PERSONAL, Phone, WORK
+from api.rules import DUPLICATE_PHONE_MESSAGE
+from api.search import PHONE, get_lookup_backend
+
+from .helpers import (
+    TestCase, TransactionTestCase, create_organization, create_user
+)
+
+
+SHARED = '+79990000001'
+NEW = '+79990000002'
+OTHER_PERSONAL = '+79990000009'
+
+
+def indexed_phones(digits):
+    return set(Phone.objects.filter(
+        get_lookup_backend().match_phone(digits)
+    ).values_list('pk', flat=True))
+
+
+@override_settings(READ_MODEL_ENABLED=True, API_CACHE_TIMEOUT=0)
+class BulkPhoneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.stranger = create_user('stranger@example.com')
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника', employees=2
+        )
+        cls.first, cls.second = cls.organization.employees.order_by('pk')
+        cls.shared = [
+            Phone.objects.create(employee=employee, phone_number=SHARED)
+            for employee in (cls.first, cls.second)
+        ]
+        other = create_organization(cls.owner, 'Больница', employees=1)
+        cls.foreign = other.employees.get()
+        cls.foreign_shared = Phone.objects.create(
+            employee=cls.foreign, phone_number=SHARED
+        )
+        Phone.objects.create(
+            employee=cls.foreign, phone_number=OTHER_PERSONAL,
+            phone_type=PERSONAL
+        )
+        cls.url = f'/api/v1/organizations/{cls.organization.pk}/phones/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def post(self, action, data, status=200):
+        response = self.client.post(
+            f'{self.url}{action}/', data, format='json'
+        )
+        self.assertEqual(response.status_code, status)
+        return response.data
+
+    def numbers(self, employee):
+        return list(employee.phones.order_by('pk').values_list(
+            'phone_number', flat=True
+        ))
+
+    def test_replace(self):
+        result = self.post('replace', {
+            'old_number': SHARED, 'new_number': NEW
+        })
+        self.assertEqual(result, {
+            bulk.UPDATED: 2,
+            bulk.FAILED: 0,
+            'results': [
+                {'id': phone.pk, 'status': bulk.UPDATED}
+                for phone in self.shared
+            ],
+        })
+        for employee in (self.first, self.second):
+            self.assertEqual(self.numbers(employee)[-1], NEW)
+        # Телефоны других организаций не меняются
+        self.foreign_shared.refresh_from_db()
+        self.assertEqual(self.foreign_shared.phone_number, SHARED)
+        self.assertEqual(read_model.check(), [])
+        self.assertEqual(
+            indexed_phones('79990000002'), {phone.pk for phone in self.shared}
+        )
+        self.assertEqual(
+            indexed_phones('79990000001'), {self.foreign_shared.pk}
+        )
+
+    def test_replace_into_a_personal_number(self):
+        result = self.post('replace', {
+            'old_number': SHARED, 'new_number': OTHER_PERSONAL
+        })
+        self.assertEqual(result[bulk.UPDATED], 0)
+        self.assertEqual(result[bulk.FAILED], 2)
+        self.assertEqual(result['results'], [
+            {'id': phone.pk, 'errors': [DUPLICATE_PHONE_MESSAGE]}
+            for phone in self.shared
+        ])
+        self.assertEqual(self.numbers(self.first)[-1], SHARED)
+
+    def test_replace_a_personal_phone_into_a_used_number(self):
+        personal = Phone.objects.create(
+            employee=self.first, phone_number='+79990000003',
+            phone_type=PERSONAL
+        )
+        result = self.post('replace', {
+            'old_number': '+79990000003', 'new_number': SHARED
+        })
+        self.assertEqual(result['results'], [
+            {'id': personal.pk, 'errors': [DUPLICATE_PHONE_MESSAGE]}
+        ])
+        personal.refresh_from_db()
+        self.assertEqual(personal.phone_number, '+79990000003')
+
+    def test_replace_unknown_number(self):
+        self.assertEqual(self.post('replace', {
+            'old_number': '+79990000005', 'new_number': NEW
+        }), {bulk.UPDATED: 0, bulk.FAILED: 0, 'results': []})
+
+    def test_add(self):
+        missing = Employee.objects.order_by('pk').last().pk + 100
+        result = self.post('add', {
+            'employees': [
+                self.first.pk, self.foreign.pk, self.second.pk,
+                self.first.pk, missing,
+            ],
+            'phone_type': WORK,
+            'phone_number': NEW,
+        })
+        first, second = [
+            Phone.objects.get(employee=employee, phone_number=NEW)
+            for employee in (self.first, self.second)
+        ]
+        self.assertEqual(result, {
+            bulk.CREATED: 2,
+            bulk.FAILED: 2,
+            'results': [
+                {
+                    'employee_id': self.foreign.pk,
+                    'errors': [bulk.EMPLOYEE_NOT_FOUND_MESSAGE],
+                },
+                {
+                    'employee_id': missing,
+                    'errors': [bulk.EMPLOYEE_NOT_FOUND_MESSAGE],
+                },
+                {
+                    'employee_id': self.first.pk, 'id': first.pk,
+                    'status': bulk.CREATED,
+                },
+                {
+                    'employee_id': self.second.pk, 'id': second.pk,
+                    'status': bulk.CREATED,
+                },
+            ],
+        })
+        self.assertFalse(self.foreign.phones.filter(phone_number=NEW))
+        self.assertEqual(read_model.check(), [])
+        self.assertEqual(indexed_phones('79990000002'), {first.pk, second.pk})
+
+    def test_add_personal_number_once(self):
+        result = self.post('add', {
+            'employees': [self.first.pk, self.second.pk],
+            'phone_type': PERSONAL,
+            'phone_number': NEW,
+        })
+        self.assertEqual(result[bulk.CREATED], 1)
+        self.assertEqual(result['results'][0], {
+            'employee_id': self.second.pk,
+            'errors': [DUPLICATE_PHONE_MESSAGE],
+        })
+        self.assertEqual(self.numbers(self.first)[-1], NEW)
+        self.assertNotIn(NEW, self.numbers(self.second))
+
+    def test_add_used_number_as_personal(self):
+        result = self.post('add', {
+            'employees': [self.first.pk],
+            'phone_type': PERSONAL,
+            'phone_number': SHARED,
+        })
+        self.assertEqual(result[bulk.FAILED], 1)
+
+    def test_invalid_requests(self):
+        self.post('add', {
+            'employees': [], 'phone_type': WORK, 'phone_number': NEW
+        }, 400)
+        self.post('replace', {'old_number': SHARED, 'new_number': 'x'}, 400)
+
+    def test_stranger_is_refused(self):
+        self.client.force_authenticate(self.stranger)
+        self.post('replace', {'old_number': SHARED, 'new_number': NEW}, 403)
+        self.post('add', {
+            'employees': [self.first.pk], 'phone_type': WORK,
+            'phone_number': NEW,
+        }, 403)
+        self.assertEqual(self.numbers(self.first)[-1], SHARED)
+
+    def count_queries(self, operation, *args):
+        with CaptureQueriesContext(connection) as context:
+            operation(self.organization, *args)
+        return len(context)
+
+    @override_settings(READ_MODEL_ENABLED=False)
+    def test_queries_do_not_depend_on_the_batch(self):
+        small = self.count_queries(bulk.replace_number, SHARED, NEW)
+        # Точка сохранения и ее освобождение, использование номера,
+        # заменяемые телефоны, UPDATE, удаление и вставка в поисковый
+        # индекс. Ревизии выдает лента изменений, не запись
+        self.assertEqual(small, 7)
+        for employee in (self.first, self.second):
+            for number in range(3):
+                Phone.objects.create(employee=employee, phone_number=NEW)
+        # Заменяются 8 телефонов
+        self.assertEqual(
+            self.count_queries(bulk.replace_number, NEW, SHARED), small
+        )
+        self.assertEqual(
+            self.count_queries(
+                bulk.add_phone, [self.first.pk], WORK, '+79990000003'
+            ),
+            self.count_queries(
+                bulk.add_phone, [self.first.pk, self.second.pk], WORK,
+                '+79990000004'
+            )
+        )
+
+
+@override_settings(AUTOCOMPLETE_ENABLED=True, AUTOCOMPLETE_MAX_AGE=3600)
+class BulkPhoneAutocompleteTests(TransactionTestCase):
+    """Index writes happen after commit; on_commit needs real commits"""
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.organization = create_organization(
+            create_user(), 'Поликлиника', employees=2, phones=0
+        )
+
+    def numbers(self, query):
+        index = autocomplete.get_index(build_missing=True)
+        return sorted(
+            item['text'] for item in index.lookup(query)
+            if item['type'] == PHONE
+        )
+
+    def test_add_and_replace(self):
+        self.assertEqual(self.numbers('7999'), [])
+        bulk.add_phone(
+            self.organization,
+            list(self.organization.employees.values_list('pk', flat=True)),
+            WORK, SHARED
+        )
+        self.assertEqual(self.numbers('7999'), [SHARED, SHARED])
+        bulk.replace_number(self.organization, SHARED, NEW)
+        self.assertEqual(self.numbers('7999'), [NEW, NEW])
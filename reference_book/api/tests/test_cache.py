@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.cache import acl_scope, get_generations, organization_scope
+from api.models import Employee, Phone
+
+from .helpers import TransactionTestCase, create_organization, create_user
+
+
+@override_settings(API_CACHE_TIMEOUT=300)
+class ResponseCacheTests(TransactionTestCase):
+    """Generations are bumped on commit; on_commit needs real commits"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user()
+        self.stranger = create_user('stranger@example.com')
+        self.organization = create_organization(
+            self.owner, 'Поликлиника', employees=1
+        )
+        self.employee = Employee.objects.get()
+        self.employees_url = (
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+        )
+        self.client = self.client_for(self.owner)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def get(self, url, client=None, **headers):
+        response = (client or self.client).get(url, **headers)
+        self.assertIn(response.status_code, (200, 304, 401, 403, 404))
+        return response
+
+    def organization_names(self):
+        response = self.get('/api/v1/organizations/')
+        return [row['name'] for row in response.data['results']]
+
+    def employee_phones(self):
+        response = self.get(f'{self.employees_url}{self.employee.pk}/')
+        return [phone['phone_number'] for phone in response.data['phones']]
+
+    def test_etag_and_not_modified(self):
+        response = self.get('/api/v1/organizations/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+        response = self.get(
+            '/api/v1/organizations/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+        response = self.get(
+            '/api/v1/organizations/', HTTP_IF_NONE_MATCH='"other", ' + etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_data(self):
+        etag = self.get('/api/v1/organizations/')['ETag']
+        self.organization.name = 'Больница'
+        self.organization.save()
+        response = self.get(
+            '/api/v1/organizations/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_query_string_is_part_of_the_key(self):
+        create_organization(self.owner, 'Больница')
+        all_names = self.organization_names()
+        response = self.get('/api/v1/organizations/?page_size=1')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(all_names), 2)
+
+    def test_organization_change_invalidates_the_list(self):
+        self.assertEqual(self.organization_names(), ['Поликлиника'])
+        self.organization.name = 'Больница'
+        self.organization.save()
+        self.assertEqual(self.organization_names(), ['Больница'])
+        create_organization(self.owner, 'Аптека')
+        self.assertEqual(self.organization_names(), ['Аптека', 'Больница'])
+
+    def test_employee_change_invalidates_the_organization(self):
+        self.assertEqual(len(self.get(self.employees_url).data['results']), 1)
+        Employee.objects.create(
+            name='Иванов', position='Врач', organization=self.organization
+        )
+        self.assertEqual(len(self.get(self.employees_url).data['results']), 2)
+        self.employee.delete()
+        self.assertEqual(len(self.get(self.employees_url).data['results']), 1)
+
+    def test_phone_change_invalidates_the_employee(self):
+        phone = Phone.objects.get()
+        self.assertEqual(self.employee_phones(), [phone.phone_number])
+        phone.phone_number = '+79990000001'
+        phone.save()
+        self.assertEqual(self.employee_phones(), ['+79990000001'])
+        phone.delete()
+        self.assertEqual(self.employee_phones(), [])
+
+    def test_modifiers_change_bumps_the_organization(self):
+        scopes = [
+            organization_scope(self.organization.pk),
+            acl_scope(self.organization.pk),
+        ]
+        before = get_generations(scopes)
+        self.organization.modifiers.add(self.stranger)
+        added = get_generations(scopes)
+        self.organization.modifiers.remove(self.stranger)
+        removed = get_generations(scopes)
+        self.assertTrue(all(a > b for a, b in zip(added, before)))
+        self.assertTrue(all(a > b for a, b in zip(removed, added)))
+
+    def test_other_organizations_keep_their_entries(self):
+        other = create_organization(self.owner, 'Больница', employees=1)
+        other_scope = [organization_scope(other.pk)]
+        before = get_generations(other_scope)
+        self.employee.name = 'Петров'
+        self.employee.save()
+        self.assertEqual(get_generations(other_scope), before)
+
+    def test_cached_retrieve_is_not_served_to_other_users(self):
+        url = f'{self.employees_url}{self.employee.pk}/'
+        self.assertEqual(self.get(url).status_code, 200)
+        for user in (self.stranger, None):
+            with self.subTest(user=user):
+                response = self.get(url, self.client_for(user))
+                self.assertIn(response.status_code, (401, 403))
+                self.assertNotIn('ETag', response)
+
+    def test_not_modified_needs_permission(self):
+        url = f'{self.employees_url}{self.employee.pk}/'
+        etag = self.get(url)['ETag']
+        response = self.get(
+            url, self.client_for(self.stranger), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_errors_are_not_cached(self):
+        url = f'{self.employees_url}{self.employee.pk + 1000}/'
+        with mock.patch.object(cache, 'set') as cache_set:
+            self.assertEqual(self.get(url).status_code, 404)
+            self.get(f'/api/v1/organizations/{self.organization.pk + 1}'
+                     f'/employees/')
+        cache_set.assert_not_called()
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_disabled_cache_has_no_etag(self):
+        response = self.get('/api/v1/organizations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
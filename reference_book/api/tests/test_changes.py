@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import changes, sharding
+from api.models import (
+    PENDING, Employee, Organization, Phone, RevisionCounter, Tombstone
+)
+
+from .helpers import TestCase, create_organization, create_user
+
+
+CHANGES_URL = '/api/v1/changes/'
+
+
+class ChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника', employees=3, phones=2
+        )
+        create_organization(cls.owner, 'Школа', employees=1)
+        employee = cls.organization.employees.order_by('pk').first()
+        employee.position = 'Главный инженер'
+        employee.save()
+        cls.deleted_phone = employee.phones.order_by('pk').first()
+        cls.deleted_phone_id = cls.deleted_phone.pk
+        cls.deleted_phone.delete()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def get(self, **params):
+        return self.client.get(CHANGES_URL, params)
+
+    def walk(self, since=0, limit=3):
+        pages = []
+        while True:
+            response = self.get(since=since, limit=limit)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            since = response.data['next']
+            if not response.data['has_more']:
+                return pages
+
+    def test_full_walk_rebuilds_directory(self):
+        state = {}
+        for page in self.walk():
+            for change in page['changes']:
+                key = change['type'], change['id']
+                if change['op'] == changes.DELETE:
+                    state.pop(key, None)
+                else:
+                    state[key] = change['data']
+        expected = {}
+        for kind, (queryset, fields) in changes.FEEDS.items():
+            for row in queryset.values(*fields):
+                expected[kind, row['id']] = row
+        self.assertEqual(state, expected)
+        self.assertEqual(
+            state['employee', self.deleted_phone.employee_id]['position'],
+            'Главный инженер'
+        )
+
+    def test_pages_are_ordered_and_complete(self):
+        pages = self.walk(limit=4)
+        revisions = [
+            change['revision']
+            for page in pages for change in page['changes']
+        ]
+        self.assertEqual(revisions, sorted(set(revisions)))
+        self.assertTrue(all(len(page['changes']) <= 4 for page in pages))
+        for previous, page in zip(pages, pages[1:]):
+            self.assertEqual(page['since'], previous['next'])
+            self.assertEqual(
+                previous['next'], previous['changes'][-1]['revision']
+            )
+        last, _ = changes.get_counter()
+        self.assertEqual(pages[-1]['next'], last)
+        self.assertEqual(revisions[-1], last)
+        self.assertEqual(len(revisions), sum(
+            sharding.everywhere(queryset).count()
+            for queryset, _ in changes.FEEDS.values()
+        ) + sharding.everywhere(Tombstone.objects.all()).count())
+
+    def test_deleted_phone_is_only_tombstone(self):
+        phone_changes = [
+            change
+            for page in self.walk()
+            for change in page['changes']
+            if change['type'] == 'phone'
+            and change['id'] == self.deleted_phone_id
+        ]
+        self.assertEqual(
+            [change['op'] for change in phone_changes], [changes.DELETE]
+        )
+        self.assertEqual(
+            phone_changes[0]['organization_id'], self.organization.pk
+        )
+
+    def test_nothing_new(self):
+        last = changes.sequence()
+        response = self.get(since=last)
+        self.assertEqual(response.data['changes'], [])
+        self.assertEqual(response.data['next'], last)
+        self.assertFalse(response.data['has_more'])
+        Phone.objects.create(
+            employee=self.deleted_phone.employee,
+            phone_number='+79990000001'
+        )
+        change, = self.get(since=last).data['changes']
+        self.assertEqual(change['revision'], last + 1)
+
+    def test_gone_after_pruning(self):
+        changes.sequence()
+        sharding.fan_out(lambda: Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        ))
+        self.assertEqual(changes.prune_tombstones(30), 1)
+        _, pruned = changes.get_counter()
+        self.assertEqual(self.get(since=pruned - 1).status_code, 410)
+        self.assertEqual(self.get(since=pruned).status_code, 200)
+        # Полная синхронизация доступна всегда
+        self.assertEqual(self.get(since=0).status_code, 200)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.get(since=-1).status_code, 400)
+        self.assertEqual(self.get(since='abc').status_code, 400)
+        self.assertEqual(self.get(limit='abc').status_code, 400)
+
+    def test_counter_is_recreated(self):
+        # Так выглядит база после flush в TransactionTestCase
+        for alias in sharding.shards():
+            with sharding.use(alias):
+                for model in (Phone, Employee, Organization, Tombstone):
+                    model.objects.all().delete()
+        RevisionCounter.objects.all().delete()
+        self.assertEqual(self.get(since=0).data['changes'], [])
+        organization = create_organization(self.owner, 'Гимназия')
+        self.assertEqual(len(self.get(since=0).data['changes']), 1)
+        organization.refresh_from_db()
+        self.assertEqual(organization.revision, 1)
+        self.assertEqual(changes.get_counter(), (1, 0))
+
+    def test_revisions_are_given_by_the_feed(self):
+        last = changes.sequence()
+        employee = self.organization.employees.order_by('pk').last()
+        employee.position = 'Врач'
+        employee.save()
+        employee.refresh_from_db()
+        self.assertEqual(employee.revision, PENDING)
+        # Записи не ждут счетчик: ревизию выдает чтение ленты
+        self.assertEqual(changes.get_counter()[0], last)
+        change, = self.get(since=last).data['changes']
+        self.assertEqual(
+            (change['type'], change['id'], change['revision']),
+            ('employee', employee.pk, last + 1)
+        )
+        employee.refresh_from_db()
+        self.assertEqual(employee.revision, last + 1)
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from api import bulk, db, deletion
+from api.models import (
+    DeletionJob, Employee, EmployeeCard, Organization, Phone, Tombstone
+)
+
+from .helpers import TestCase, create_organization, create_user
+
+
+@override_settings(READ_MODEL_ENABLED=True)
+class DeletionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника', employees=5, phones=2
+        )
+        cls.other = create_organization(
+            cls.owner, 'Школа', employees=2, phones=2
+        )
+
+    def test_delete_rows_in_batches(self):
+        ids = list(Phone.objects.filter(
+            employee__organization=self.organization
+        ).values_list('pk', flat=True))
+        with mock.patch.object(db, 'DELETE_BATCH_SIZE', 3):
+            deleted = db.delete_rows(Phone, 'id', ids + [0])
+        self.assertEqual(deleted, 10)
+        self.assertFalse(
+            Phone.objects.filter(employee__organization=self.organization)
+        )
+        self.assertEqual(
+            Phone.objects.filter(employee__organization=self.other).count(),
+            4
+        )
+
+    def test_bulk_delete_phones(self):
+        phone = Phone.objects.filter(
+            employee__organization=self.organization
+        ).first()
+        foreign = Phone.objects.filter(
+            employee__organization=self.other
+        ).first()
+        result = bulk.delete_phones(self.organization, [phone.pk, foreign.pk])
+        self.assertEqual(
+            [item.get('status') for item in result['results']],
+            [bulk.DELETED, None]
+        )
+        self.assertFalse(Phone.objects.filter(pk=phone.pk).exists())
+        self.assertTrue(Phone.objects.filter(pk=foreign.pk).exists())
+        self.assertTrue(Tombstone.objects.filter(
+            kind='phone', object_id=phone.pk
+        ).exists())
+
+    def test_job_deletes_organization(self):
+        job = deletion.schedule(self.organization, self.owner)
+        self.assertTrue(deletion.run(job, chunk_size=2))
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertEqual(
+            (job.deleted_employees, job.deleted_phones), (5, 10)
+        )
+        self.assertFalse(
+            Organization.objects.filter(pk=self.organization.pk).exists()
+        )
+        for model in (Employee, EmployeeCard):
+            self.assertFalse(
+                model.objects.filter(organization=self.organization).exists()
+            )
+        self.assertEqual(Employee.objects.count(), 2)
+        self.assertEqual(Phone.objects.count(), 4)
+        self.assertEqual(Tombstone.objects.filter(
+            organization_id=self.organization.pk
+        ).count(), 1 + 5 + 10)
@@ -0,0 +1,73 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Employee
+
+from .helpers import TestCase, create_organization, create_user
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class EmployeeCreateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(cls.owner, 'Поликлиника')
+        cls.url = f'/api/v1/organizations/{cls.organization.pk}/employees/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def employee(self, name, *numbers):
+        return {
+            'name': name, 'position': 'Врач',
+            'phones': [
+                {'phone_type': 'work', 'phone_number': number}
+                for number in numbers
+            ],
+        }
+
+    def test_all_phones_are_saved(self):
+        response = self.client.post(
+            self.url, self.employee('Иванов', '+79990000001', '+79990000002'),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['phones']), 2)
+        self.assertEqual(
+            Employee.objects.get(name='Иванов').phones.count(), 2
+        )
+
+    def test_employee_without_phones_is_rejected(self):
+        response = self.client.post(
+            self.url, self.employee('Иванов'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['phones'],
+            {'non_field_errors': ['Укажите хотя бы один телефон']}
+        )
+        self.assertFalse(Employee.objects.filter(name='Иванов').exists())
+
+    def test_batch_with_employee_without_phones_is_rejected(self):
+        response = self.client.post(self.url, [
+            self.employee('Иванов', '+79990000001'),
+            self.employee('Петров'),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('phones', response.data[1])
+        self.assertFalse(Employee.objects.filter(
+            name__in=['Иванов', 'Петров']
+        ).exists())
+
+    def test_partial_update_without_phones(self):
+        employee = Employee.objects.create(
+            name='Иванов', position='Врач', organization=self.organization
+        )
+        response = self.client.patch(
+            f'{self.url}{employee.pk}/', {'position': 'Главный врач'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
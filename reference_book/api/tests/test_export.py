@@ -0,0 +1,88 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.export import export_rows, parse_cursor
+from api.models import Employee, Organization, PERSONAL
+
+from .helpers import TestCase, create_organization, create_user
+
+
+def cursor(row):
+    return ':'.join(
+        str(row[column] or '')
+        for column in ('organization_id', 'employee_id', 'phone_id')
+    )
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = create_user()
+        cls.full = create_organization(owner, 'Аптека', employees=2, phones=2)
+        cls.empty = create_organization(owner, 'Склад')
+        cls.partial = create_organization(owner, 'Школа', employees=1)
+        cls.no_phones = Employee.objects.create(
+            name='Сторож', position='Сторож', organization=cls.partial
+        )
+        deleting = create_organization(owner, 'Закрыта', employees=1)
+        Organization.objects.filter(pk=deleting.pk).update(deleting=True)
+
+    def test_outer_rows(self):
+        rows = list(export_rows(chunk_size=2))
+        self.assertEqual(
+            [
+                (row['organization_name'], row['employee_name'],
+                 row['phone_number'] is not None)
+                for row in rows
+            ],
+            [
+                ('Аптека', 'Аптека сотрудник 0', True),
+                ('Аптека', 'Аптека сотрудник 0', True),
+                ('Аптека', 'Аптека сотрудник 1', True),
+                ('Аптека', 'Аптека сотрудник 1', True),
+                ('Склад', None, False),
+                ('Школа', 'Школа сотрудник 0', True),
+                ('Школа', 'Сторож', False),
+            ]
+        )
+        empty = rows[4]
+        self.assertEqual(empty['organization_id'], self.empty.pk)
+        self.assertIsNone(empty['employee_id'])
+        self.assertIsNone(rows[6]['phone_id'])
+
+    def test_resume_from_every_row(self):
+        rows = list(export_rows())
+        for position, row in enumerate(rows):
+            with self.subTest(row=cursor(row)):
+                self.assertEqual(
+                    list(export_rows(
+                        after=parse_cursor(cursor(row)), chunk_size=1
+                    )),
+                    rows[position + 1:]
+                )
+
+    def test_phone_type_filter(self):
+        rows = list(export_rows(phone_type=PERSONAL))
+        self.assertEqual(rows, [])
+        rows = list(export_rows(phone_type='work', organization_id=(
+            self.partial.pk
+        )))
+        self.assertEqual(
+            [row['employee_name'] for row in rows], ['Школа сотрудник 0']
+        )
+
+    def test_csv_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(create_user('reader@example.com'))
+        response = client.get('/api/v1/export/', {
+            'organization': self.empty.pk
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines()[1],
+            f'{self.empty.pk},Склад,,,,,,'
+        )
+        response = client.get('/api/v1/export/', {'after': '12'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,91 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api import sharding
+from api.models import Employee, FAX, Organization, PERSONAL, Phone
+
+from .helpers import TestCase, create_organization, create_user
+
+
+@override_settings(API_CACHE_TIMEOUT=0, READ_MODEL_ENABLED=False)
+class FastSerializationContractTests(TestCase):
+    """Rows from .values() render byte for byte like the DRF serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника "Здоровье"', employees=7, phones=2
+        )
+        for number in range(3):
+            create_organization(cls.owner, f'Поликлиника {number}')
+        Organization.objects.create(
+            name='Школа', address='Адрес', description='', owner=cls.owner
+        )
+        with sharding.use_organization(cls.organization):
+            cls.employee = Employee.objects.create(
+                name='Иванов Иван\tИванович', position='Врач <терапевт>',
+                organization=cls.organization
+            )
+            Phone.objects.create(
+                employee=cls.employee, phone_number='+79990000001',
+                phone_type=PERSONAL
+            )
+            Phone.objects.create(
+                employee=cls.employee, phone_number='79990000002',
+                phone_type=FAX
+            )
+            # Сотрудник без телефонов
+            Employee.objects.create(
+                name='Петров', position='Врач', organization=cls.organization
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def assert_same_output(self, url, params):
+        responses = []
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION=fast):
+                responses.append(self.client.get(url, params))
+        drf, fast = responses
+        self.assertEqual(fast.status_code, drf.status_code)
+        self.assertEqual(fast.content, drf.content)
+        self.assertEqual(fast['Content-Type'], drf['Content-Type'])
+
+    def check(self, url, *variants):
+        for params in ({}, {'page_size': 3}, {'page': 2, 'page_size': 3},
+                       {'count': 'false', 'page_size': 3},
+                       {'cursor': '', 'page_size': 3}, *variants):
+            with self.subTest(url=url, params=params):
+                self.assert_same_output(url, params)
+
+    def test_organizations(self):
+        self.check(
+            '/api/v1/organizations/',
+            {'q': 'Поликлиника'},
+            {'q': 'Поликлиника "Здоровье" сотрудник 1'},
+            {'q': 'Иванов'},
+            {'q': '+79990000001'},
+            {'q': 'нет такого'},
+        )
+        self.check('/api/v1/organizations/search/', {'q': 'Поликлиника'})
+
+    def test_employees(self):
+        self.check(
+            f'/api/v1/organizations/{self.organization.pk}/employees/',
+            {'q': 'Иванов'},
+            {'q': '79990000002'},
+        )
+
+    def test_phones(self):
+        self.check(
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+            f'{self.employee.pk}/phones/'
+        )
+        empty = self.employee.organization.employees.get(name='Петров')
+        self.check(
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+            f'{empty.pk}/phones/'
+        )
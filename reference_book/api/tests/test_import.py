@@ -0,0 +1,193 @@
+import io
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api import deletion, sharding
+from api.importer import DELETING_MESSAGE, DirectoryImporter, read_csv
+from api.models import Employee, PERSONAL, Phone, WORK
+from api.rules import (
+    CONFLICT_MESSAGE, DUPLICATE_NAME_MESSAGE, DUPLICATE_PHONE_MESSAGE
+)
+
+from .helpers import TestCase, create_organization, create_user
+
+
+CSV_HEADER = 'name,position,phone_type,phone_number\r\n'
+
+
+def run_import(organization, text, importer_class=DirectoryImporter):
+    stream = io.StringIO(CSV_HEADER + text, newline='')
+    return importer_class(organization).run(read_csv(stream))
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(cls.owner, 'Больница')
+        other = create_organization(cls.owner, 'Аптека', employees=1)
+        cls.employee = other.employees.get()
+        with sharding.use_organization(other):
+            cls.shared = Phone.objects.create(
+                employee=cls.employee, phone_number='+79990000001'
+            )
+            Phone.objects.create(
+                employee=cls.employee, phone_number='+79990000001'
+            )
+            cls.personal = Phone.objects.create(
+                employee=cls.employee, phone_number='+79990000002',
+                phone_type=PERSONAL
+            )
+
+    def test_multiline_quoted_field(self):
+        report = run_import(
+            self.organization,
+            '"Иванов И.И.","Врач\r\nхирург",work,+79161112233\r\n'
+        )
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(
+            Employee.objects.get(name='Иванов И.И.').position,
+            'Врач\r\nхирург'
+        )
+
+    def test_personal_number_rule_matches_serializer(self):
+        report = run_import(
+            self.organization,
+            # Номер уже у двух рабочих телефонов: еще один рабочий можно
+            'Петров,Врач,work,79990000001\r\n'
+            # Личный номер другого сотрудника
+            'Сидоров,Врач,work,+79990000002\r\n'
+            # Занятый номер нельзя сделать личным
+            'Смирнов,Врач,personal,+79990000001\r\n'
+        )
+        self.assertEqual(report['created_employees'], 1)
+        self.assertEqual(report['errors'], [
+            {'line': 3, 'errors': [
+                f'+79990000002: {DUPLICATE_PHONE_MESSAGE}'
+            ]},
+            {'line': 4, 'errors': [
+                f'+79990000001: {DUPLICATE_PHONE_MESSAGE}'
+            ]},
+        ])
+
+    def test_rejected_row_does_not_take_numbers(self):
+        Employee.objects.create(
+            name='Петров', position='Врач', organization=self.organization
+        )
+        report = run_import(
+            self.organization,
+            'Петров,Врач,personal,+79161112233\r\n'
+            'Козлов,Врач,personal,+79161112233\r\n'
+        )
+        self.assertEqual(report['created_employees'], 1)
+        self.assertEqual(report['errors'], [
+            {'line': 2, 'errors': [DUPLICATE_NAME_MESSAGE]},
+        ])
+        self.assertTrue(Phone.objects.filter(
+            employee__name='Козлов', phone_type=PERSONAL
+        ).exists())
+
+    def test_concurrent_insert_is_a_row_error(self):
+        organization = self.organization
+
+        class RacingImporter(DirectoryImporter):
+            def validate_rules(self, record, existing_names, rule):
+                valid = super().validate_rules(record, existing_names, rule)
+                if record['name'] == 'Петров':
+                    # Тот же сотрудник добавлен другим запросом
+                    Employee.objects.create(
+                        name='Петров', position='Врач',
+                        organization=organization
+                    )
+                return valid
+
+        report = run_import(
+            organization,
+            'Петров,Врач,work,+79161112233\r\n'
+            'Козлов,Врач,work,+79161112244\r\n',
+            RacingImporter
+        )
+        self.assertEqual(report['created_employees'], 1)
+        self.assertEqual(
+            report['errors'], [{'line': 2, 'errors': [CONFLICT_MESSAGE]}]
+        )
+        self.assertEqual(
+            Phone.objects.filter(phone_digits='79161112233').count(), 0
+        )
+        self.assertEqual(
+            Phone.objects.get(phone_digits='79161112244').phone_type, WORK
+        )
+
+    def test_upload_keeps_newlines_in_quoted_fields(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        upload = SimpleUploadedFile('employees.csv', (
+            CSV_HEADER + '"Иванов И.И.","Врач\r\nхирург",work,+79161112233\r\n'
+        ).encode())
+        response = client.post(
+            f'/api/v1/organizations/{self.organization.pk}/employees/import/',
+            {'file': upload}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(
+            Employee.objects.get(name='Иванов И.И.').position,
+            'Врач\r\nхирург'
+        )
+
+    def test_deleting_organization_is_refused(self):
+        deletion.schedule(self.organization, self.owner)
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        upload = SimpleUploadedFile(
+            'employees.csv',
+            (CSV_HEADER + 'Иванов И.И.,Врач,work,+79161112233\r\n').encode()
+        )
+        response = client.post(
+            f'/api/v1/organizations/{self.organization.pk}/employees/import/',
+            {'file': upload}
+        )
+        self.assertEqual(response.status_code, 404)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write(CSV_HEADER + 'Иванов И.И.,Врач,work,+79161112233\n')
+            file.flush()
+            with self.assertRaisesMessage(
+                CommandError, 'Organization is being deleted'
+            ):
+                call_command(
+                    'import_directory', file.name,
+                    organization=self.organization.pk
+                )
+        self.assertFalse(self.organization.employees.exists())
+
+    def test_import_stops_when_deletion_is_scheduled(self):
+        organization = self.organization
+
+        class DeletedImporter(DirectoryImporter):
+            def save(self, records):
+                super().save(records)
+                # Удаление поставлено в очередь во время импорта
+                deletion.schedule(organization)
+
+        stream = io.StringIO(CSV_HEADER + (
+            'Иванов,Врач,work,+79161112233\r\n'
+            'Петров,Врач,work,+79161112244\r\n'
+            'Козлов,Врач,work,+79161112255\r\n'
+        ), newline='')
+        report = DeletedImporter(organization, chunk_size=1).run(
+            read_csv(stream)
+        )
+        self.assertEqual(report['created_employees'], 1)
+        self.assertEqual(
+            report['errors'], [{'line': 3, 'errors': [DELETING_MESSAGE]}]
+        )
+        self.assertEqual(
+            list(organization.employees.values_list('name', flat=True)),
+            ['Иванов']
+        )
@@ -0,0 +1,52 @@
+import asyncio
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from api import db, metrics
+from api.middleware import ReplicaRoutingMiddleware, RequestMetricsMiddleware
+
+
+class AsyncMiddlewareTests(TestCase):
+
+    def test_async_chain_stays_async(self):
+        seen = {}
+
+        async def view(request):
+            seen['replica'] = db._read_alias.get()
+            seen['metrics'] = metrics.current_request()
+            return HttpResponse()
+
+        handler = RequestMetricsMiddleware(ReplicaRoutingMiddleware(view))
+        self.assertTrue(asyncio.iscoroutinefunction(handler))
+        request = RequestFactory().get('/api/v1/organizations/')
+        with override_settings(REPLICA_DATABASES=['replica']):
+            response = asyncio.run(handler(request))
+        self.assertEqual(seen['replica'], 'replica')
+        self.assertIsNotNone(seen['metrics'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIsNone(db._read_alias.get())
+
+    def test_sync_chain_stays_sync(self):
+        handler = RequestMetricsMiddleware(
+            ReplicaRoutingMiddleware(lambda request: HttpResponse())
+        )
+        self.assertFalse(asyncio.iscoroutinefunction(handler))
+        response = handler(RequestFactory().get('/api/v1/organizations/'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+
+class MetricsViewTests(TestCase):
+
+    @override_settings(METRICS_TOKEN='')
+    def test_refused_without_configured_token(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_served_with_token(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        response = self.client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'api_request_duration_seconds', response.content)
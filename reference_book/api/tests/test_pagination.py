@@ -0,0 +1,126 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Organization, Phone
+
+from .helpers import TestCase, create_organization, create_user
+
+
+def encode(position):
+    return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        for number in range(5):
+            create_organization(cls.owner, f'Организация {number}')
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника', employees=5
+        )
+        cls.employees_url = (
+            f'/api/v1/organizations/{cls.organization.pk}/employees/'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def walk(self, url, params, field):
+        """Values of field on every page following next links"""
+        response = self.client.get(url, params)
+        values = []
+        pages = 0
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data['count'])
+            self.assertIsNone(response.data['previous'])
+            values.extend(row[field] for row in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return values, pages
+            response = self.client.get(response.data['next'])
+
+    def test_organizations_past_the_first_page(self):
+        names, pages = self.walk(
+            '/api/v1/organizations/', {'cursor': '', 'page_size': 2}, 'name'
+        )
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            names,
+            list(Organization.objects.order_by('name', 'id').values_list(
+                'name', flat=True
+            ))
+        )
+
+    def test_employees_past_the_first_page(self):
+        ids, pages = self.walk(
+            self.employees_url, {'cursor': '', 'page_size': 2}, 'id'
+        )
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 5)
+
+    def test_search_past_the_first_page(self):
+        names, _ = self.walk(
+            '/api/v1/organizations/search/',
+            {'q': 'Организация', 'cursor': '', 'page_size': 2}, 'name'
+        )
+        self.assertEqual(names, [f'Организация {n}' for n in range(5)])
+
+    def test_phone_lookup_past_the_first_page(self):
+        numbers, pages = self.walk(
+            '/api/v1/phones/lookup/',
+            {'prefix': '7916', 'cursor': '', 'page_size': 2}, 'phone_number'
+        )
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            numbers,
+            list(Phone.objects.order_by('phone_digits', 'id').values_list(
+                'phone_number', flat=True
+            ))
+        )
+
+    def test_tampered_cursors_are_not_found(self):
+        organizations = [
+            'not base64 !', encode({'name': 'x'}), encode(['x']),
+            encode(['x', 1, 2]), encode([None, None]), encode(['x', 'abc']),
+            encode(['x', {'id': 1}]), encode(['x', [1]]), encode(['x', True]),
+            encode([['x'], 1]), encode(['x', 2 ** 70]), encode(['x', None]),
+            encode(['x' * 300, 1]),
+        ]
+        for cursor in organizations:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/v1/organizations/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+        for cursor in (encode(['a']), encode([None]), encode([{'pk': 1}])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.employees_url, {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+        for cursor in (encode(['7916', 'x']), encode([None, 1])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/v1/phones/lookup/', {
+                    'prefix': '7916', 'cursor': cursor
+                })
+                self.assertEqual(response.status_code, 404)
+
+    def test_values_are_converted_to_the_field_type(self):
+        response = self.client.get(
+            '/api/v1/organizations/', {'cursor': encode(['Организация', '0'])}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        response = self.client.get('/api/v1/phones/lookup/', {
+            'prefix': '7916', 'cursor': encode([7916, 1])
+        })
+        self.assertEqual(response.status_code, 200)
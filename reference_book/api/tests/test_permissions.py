@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Employee, Organization
+
+from .helpers import TransactionTestCase, create_organization, create_user
+
+
+@override_settings(ACL_CACHE_TIMEOUT=300, API_CACHE_TIMEOUT=300)
+class AclCacheTests(TransactionTestCase):
+    """The ACL generation is bumped on commit; on_commit needs commits"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user()
+        self.modifier = create_user('modifier@example.com')
+        self.organization = create_organization(
+            self.owner, 'Поликлиника', employees=1
+        )
+        self.organization.modifiers.add(self.modifier)
+        self.employee = Employee.objects.get()
+        self.url = (
+            f'/api/v1/organizations/{self.organization.pk}'
+            f'/employees/{self.employee.pk}/'
+        )
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def edit(self, user):
+        return self.client_for(user).patch(
+            self.url, {'position': 'Главный врач'}, format='json'
+        ).status_code
+
+    def read(self, user):
+        return self.client_for(user).get(self.url).status_code
+
+    def test_decision_is_cached(self):
+        self.assertEqual(self.edit(self.modifier), 200)
+        # Удаление связи без m2m_changed: поколение не меняется, решение
+        # берется из кэша
+        Organization.modifiers.through.objects.filter(
+            user_id=self.modifier.pk
+        ).delete()
+        self.assertEqual(self.edit(self.modifier), 200)
+
+    def test_revoked_modifier_is_refused(self):
+        self.assertEqual(self.edit(self.modifier), 200)
+        self.organization.modifiers.remove(self.modifier)
+        self.assertEqual(self.edit(self.modifier), 403)
+        self.organization.modifiers.add(self.modifier)
+        self.assertEqual(self.edit(self.modifier), 200)
+
+    def test_cleared_modifiers_are_refused(self):
+        self.assertEqual(self.edit(self.modifier), 200)
+        self.modifier.can_modify.clear()
+        self.assertEqual(self.edit(self.modifier), 403)
+
+    def test_owner_change(self):
+        self.assertEqual(self.edit(self.owner), 200)
+        self.organization.owner = self.modifier
+        self.organization.save()
+        self.organization.modifiers.clear()
+        self.assertEqual(self.edit(self.owner), 403)
+        self.assertEqual(self.edit(self.modifier), 200)
+
+    def test_new_owner_with_a_cached_refusal(self):
+        stranger = create_user('stranger@example.com')
+        self.assertEqual(self.edit(stranger), 403)
+        self.organization.owner = stranger
+        self.organization.save()
+        self.assertEqual(self.edit(stranger), 200)
+
+    def test_retrieve_checks_permissions_before_the_cache(self):
+        self.assertEqual(self.read(self.modifier), 200)
+        self.organization.modifiers.remove(self.modifier)
+        self.assertEqual(self.read(self.modifier), 403)
+        self.assertEqual(self.read(self.owner), 200)
+
+    def test_list_stays_public(self):
+        response = APIClient().get(
+            f'/api/v1/organizations/{self.organization.pk}/employees/'
+        )
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,45 @@
+from django.test import override_settings
+
+from api.models import Employee, Phone, digits_prefix
+
+from .helpers import TestCase, create_organization, create_user
+
+
+LOOKUP_URL = '/api/v1/phones/lookup/'
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class PhoneLookupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        organization = create_organization(create_user(), 'Поликлиника')
+        employee = Employee.objects.create(
+            name='Иванов', position='Врач', organization=organization
+        )
+        for number in ('+79161299999', '+79161300000', '+79199999999',
+                       '+79200000000', '+99999999999'):
+            Phone.objects.create(employee=employee, phone_number=number)
+
+    def lookup(self, prefix):
+        response = self.client.get(
+            LOOKUP_URL, {'prefix': prefix, 'page_size': 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [phone['phone_number'] for phone in response.data['results']]
+
+    def test_prefix_ending_with_nine(self):
+        self.assertEqual(self.lookup('7916129'), ['+79161299999'])
+        self.assertEqual(self.lookup('+7 (919)'), ['+79199999999'])
+        self.assertEqual(self.lookup('7919999999'), ['+79199999999'])
+
+    def test_prefix_of_nines_has_no_upper_bound(self):
+        self.assertEqual(self.lookup('99'), ['+99999999999'])
+
+    def test_upper_bound_carries(self):
+        for digits, upper in (('7916', '7917'), ('7916129', '791613'),
+                              ('7999', '8'), ('99', None)):
+            with self.subTest(digits=digits):
+                bounds = dict(digits_prefix('phone_digits', digits).children)
+                self.assertEqual(bounds['phone_digits__gte'], digits)
+                self.assertEqual(bounds.get('phone_digits__lt'), upper)
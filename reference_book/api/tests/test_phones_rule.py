@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Employee, PERSONAL, Phone, WORK
+from api.rules import DUPLICATE_PHONE_MESSAGE
+
+from .helpers import (
+    TestCase, TransactionTestCase, create_organization, create_user
+)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class PersonalNumberRuleTests(TestCase):
+    """The four accepted cases of PhoneSerialiser.validate and refusals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        organization = create_organization(cls.owner, 'Поликлиника')
+        cls.employee = Employee.objects.create(
+            name='Иванов', position='Врач', organization=organization
+        )
+        other = Employee.objects.create(
+            name='Петров', position='Врач', organization=organization
+        )
+        for number in ('+79990000001', '+79990000001', '+79990000002'):
+            Phone.objects.create(employee=other, phone_number=number)
+        Phone.objects.create(
+            employee=other, phone_number='+79990000003', phone_type=PERSONAL
+        )
+        cls.url = (
+            f'/api/v1/organizations/{organization.pk}/employees/'
+            f'{cls.employee.pk}/phones/'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def add(self, phone_type, phone_number):
+        return self.client.post(self.url, {
+            'phone_type': phone_type, 'phone_number': phone_number
+        })
+
+    def assert_refused(self, response):
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['non_field_errors'], [DUPLICATE_PHONE_MESSAGE]
+        )
+
+    def test_new_number(self):
+        self.assertEqual(self.add(PERSONAL, '+79161234567').status_code, 201)
+
+    def test_number_used_several_times_takes_work_phone(self):
+        self.assertEqual(self.add(WORK, '79990000001').status_code, 201)
+        self.assert_refused(self.add(PERSONAL, '+79990000001'))
+
+    def test_own_phone_keeps_its_number(self):
+        phone = Phone.objects.create(
+            employee=self.employee, phone_number='+79161234567',
+            phone_type=PERSONAL
+        )
+        response = self.client.put(f'{self.url}{phone.pk}/', {
+            'phone_type': PERSONAL, 'phone_number': '79161234567'
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_work_number_used_once(self):
+        self.assertEqual(self.add(WORK, '+79990000002').status_code, 201)
+        self.assert_refused(self.add(PERSONAL, '+79990000002'))
+
+    def test_personal_number_of_another_employee(self):
+        self.assert_refused(self.add(WORK, '+79990000003'))
+        self.assert_refused(self.add(PERSONAL, '+79990000003'))
+
+    def test_patch_without_type_keeps_personal(self):
+        phone = Phone.objects.create(
+            employee=self.employee, phone_number='+79161234567',
+            phone_type=PERSONAL
+        )
+        response = self.client.patch(
+            f'{self.url}{phone.pk}/', {'phone_number': '+79990000002'}
+        )
+        self.assert_refused(response)
+
+    def test_concurrent_personal_number_is_400(self):
+        # Проверка прошла до того, как другой запрос занял номер
+        with mock.patch('api.rules.PersonalNumberRule.add', return_value=True):
+            response = self.add(PERSONAL, '+79990000003')
+        self.assert_refused(response)
+        self.assertFalse(self.employee.phones.exists())
+
+
+class UniquePersonalPhoneMigrationTests(TransactionTestCase):
+    before = [('api', '0003_phone_digits')]
+    after = [('api', '0004_unique_personal_phone')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_shared_personal_numbers_become_work(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        User = apps.get_model('api', 'User')
+        Organization = apps.get_model('api', 'Organization')
+        Employee = apps.get_model('api', 'Employee')
+        Phone = apps.get_model('api', 'Phone')
+        owner = User.objects.create(email='owner@example.com')
+        employee = Employee.objects.create(
+            name='Иванов', position='Врач',
+            organization=Organization.objects.create(
+                name='Поликлиника', address='Адрес', description='',
+                owner=owner
+            )
+        )
+        for number, phone_type in (('+79161234567', PERSONAL),
+                                   ('79161234567', PERSONAL),
+                                   ('+79990000001', PERSONAL)):
+            Phone.objects.create(
+                employee=employee, phone_number=number,
+                phone_digits=number.lstrip('+'), phone_type=phone_type
+            )
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        self.assertEqual(
+            dict(Phone.objects.values_list('phone_number', 'phone_type')),
+            {
+                '+79161234567': WORK,
+                '79161234567': WORK,
+                '+79990000001': PERSONAL,
+            }
+        )
@@ -0,0 +1,131 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api import read_model
+from api.models import Employee, EmployeeCard, Phone
+
+from .helpers import TestCase, create_organization, create_user
+
+
+@override_settings(READ_MODEL_ENABLED=True, API_CACHE_TIMEOUT=0)
+class ReadModelTests(TestCase):
+    """Cards are kept by signals only while the read model is enabled"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user()
+        cls.organization = create_organization(
+            cls.owner, 'Поликлиника', employees=3, phones=2
+        )
+        create_organization(cls.owner, 'Больница', employees=1)
+        cls.employees_url = (
+            f'/api/v1/organizations/{cls.organization.pk}/employees/'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.employee = Employee.objects.filter(
+            organization=self.organization
+        ).first()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def assertSameAsSerializers(self, url):
+        cards = self.get(url)
+        for fast in (False, True):
+            with self.subTest(url=url, fast=fast), override_settings(
+                READ_MODEL_ENABLED=False, FAST_SERIALIZATION=fast
+            ):
+                self.assertEqual(self.get(url), cards)
+
+    def assertInSync(self):
+        self.assertEqual(list(read_model.check()), [])
+        self.assertEqual(
+            set(EmployeeCard.objects.values_list('pk', flat=True)),
+            set(Employee.objects.values_list('pk', flat=True))
+        )
+        self.assertSameAsSerializers(self.employees_url)
+        for employee in self.organization.employees.all():
+            self.assertSameAsSerializers(
+                f'{self.employees_url}{employee.pk}/'
+            )
+
+    def test_output_matches_the_serializers(self):
+        for url in (
+            self.employees_url,
+            f'{self.employees_url}?page_size=2&page=2',
+            f'{self.employees_url}?cursor=&page_size=2',
+            f'{self.employees_url}?count=false',
+            f'{self.employees_url}?q=сотрудник 1',
+            f'{self.employees_url}{self.employee.pk}/',
+        ):
+            self.assertSameAsSerializers(url)
+
+    def test_rebuild(self):
+        EmployeeCard.objects.all().delete()
+        self.assertEqual(len(read_model.check()), 4)
+        self.assertEqual(read_model.rebuild(chunk_size=2), 4)
+        self.assertInSync()
+
+    def test_phone_edit(self):
+        phone = self.employee.phones.first()
+        response = self.client.patch(
+            f'{self.employees_url}{self.employee.pk}/phones/{phone.pk}/',
+            {'phone_number': '+79990000001', 'phone_type': 'personal'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            '+79990000001',
+            [row['phone_number'] for row in self.get(
+                f'{self.employees_url}{self.employee.pk}/'
+            )['phones']]
+        )
+        self.assertInSync()
+
+    def test_phone_delete(self):
+        self.employee.phones.first().delete()
+        self.assertInSync()
+
+    def test_employee_edit(self):
+        response = self.client.patch(
+            f'{self.employees_url}{self.employee.pk}/',
+            {'position': 'Главный врач'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertInSync()
+
+    def test_employee_cascade_delete(self):
+        response = self.client.delete(
+            f'{self.employees_url}{self.employee.pk}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Phone.objects.filter(employee=self.employee.pk))
+        self.assertFalse(EmployeeCard.objects.filter(pk=self.employee.pk))
+        self.assertInSync()
+
+    def test_organization_cascade_delete(self):
+        other = create_organization(self.owner, 'Аптека', employees=2)
+        other.delete()
+        self.assertInSync()
+
+    def test_import(self):
+        upload = SimpleUploadedFile('employees.csv', (
+            'name,position,phone_type,phone_number\r\n'
+            'Иванов И.И.,Врач,work,+79161112233\r\n'
+            'Иванов И.И.,Врач,personal,+79161112234\r\n'
+            'Петров П.П.,Медсестра,work,+79161112235\r\n'
+        ).encode())
+        response = self.client.post(
+            f'{self.employees_url}import/', {'file': upload}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [])
+        self.assertInSync()
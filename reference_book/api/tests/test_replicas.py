@@ -0,0 +1,139 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import transaction
+from django.test import (
+    SimpleTestCase, TransactionTestCase, override_settings
+)
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import db
+from api.checks import check_replica_sticky_cache
+from api.models import Organization, User
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@skipUnless(settings.REPLICA_DATABASES, 'DB_REPLICAS is not set')
+@override_settings(API_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primary and replica are separate SQLite files, nothing is replicated:
+    the organizations a request sees tell which database it read. Reads
+    inside transactions go to the primary, so TestCase would hide routing.
+    """
+
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def setUp(self):
+        db.sticky_cache().clear()
+        self.writer = self.create_user('writer@example.com')
+        self.reader = self.create_user('reader@example.com')
+        for alias in ('default', 'replica_1'):
+            Organization.objects.using(alias).create(
+                name=f'Организация {alias}', address='Адрес',
+                description='Описание', owner_id=self.writer.pk
+            )
+
+    @staticmethod
+    def create_user(email):
+        user = User.objects.create_user(
+            username=email.split('@')[0], email=email, password='password'
+        )
+        user.save(using='replica_1', force_insert=True)
+        return user
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+        )
+        return client
+
+    def names(self, client):
+        response = client.get('/api/v1/organizations/')
+        self.assertEqual(response.status_code, 200)
+        return [
+            organization['name'] for organization in response.data['results']
+        ]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(
+            self.names(APIClient()), ['Организация replica_1']
+        )
+        self.assertEqual(
+            self.names(self.client_for(self.reader)),
+            ['Организация replica_1']
+        )
+
+    def test_writer_reads_primary(self):
+        writer = self.client_for(self.writer)
+        response = writer.post('/api/v1/organizations/new/', {
+            'name': 'Новая', 'address': 'Адрес', 'description': 'Описание'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(
+            Organization.objects.using('replica_1').filter(
+                name='Новая'
+            ).exists()
+        )
+        self.assertCountEqual(
+            self.names(writer), ['Организация default', 'Новая']
+        )
+        # Отметка о записи есть только у автора изменений
+        self.assertEqual(
+            self.names(self.client_for(self.reader)),
+            ['Организация replica_1']
+        )
+
+    def test_failed_write_does_not_pin(self):
+        writer = self.client_for(self.writer)
+        response = writer.post('/api/v1/organizations/new/', {})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.names(writer), ['Организация replica_1'])
+
+    def test_reads_in_transaction_go_to_primary(self):
+        token = db.use_replica('replica_1')
+        try:
+            self.assertEqual(
+                Organization.objects.get().name, 'Организация replica_1'
+            )
+            with transaction.atomic():
+                self.assertEqual(
+                    Organization.objects.get().name, 'Организация default'
+                )
+        finally:
+            db.reset_replica(token)
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class ReplicaStickyCacheCheckTests(SimpleTestCase):
+
+    def check_ids(self):
+        return [error.id for error in check_replica_sticky_cache(None)]
+
+    @override_settings(REPLICA_STICKY_CACHE='sticky')
+    def test_undefined_alias(self):
+        self.assertEqual(self.check_ids(), ['api.E001'])
+
+    @override_settings(CACHES={'default': {'BACKEND': LOCMEM}})
+    def test_process_local_cache(self):
+        self.assertEqual(self.check_ids(), ['api.E002'])
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': LOCMEM}, 'sticky': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/reference_book_sticky',
+        }},
+        REPLICA_STICKY_CACHE='sticky'
+    )
+    def test_shared_cache(self):
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(
+        REPLICA_DATABASES=[], CACHES={'default': {'BACKEND': LOCMEM}}
+    )
+    def test_without_replicas(self):
+        self.assertEqual(self.check_ids(), [])
@@ -0,0 +1,65 @@
+from unittest import skipIf
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .helpers import TestCase, create_organization, create_user
+
+
+SEARCH_URL = '/api/v1/organizations/search/'
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class SearchQueryCountTests(TestCase):
+    """A search page costs the same queries whatever its size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = create_user()
+        for number in range(12):
+            create_organization(
+                owner, f'Поликлиника {number}', employees=7, phones=2
+            )
+
+    def count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                SEARCH_URL, {'q': 'Поликлиника', 'page_size': page_size}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(context)
+
+    def assert_fixed_queries(self, expected):
+        for page_size in (1, 5, 12):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.count_queries(page_size), expected)
+
+    # С разделением сотрудники читаются из других баз, а в поиске через
+    # сериализатор - отдельно для каждой организации
+    @skipIf(settings.SHARD_DATABASES, 'queries of the shards are not counted')
+    @override_settings(FAST_SERIALIZATION=False)
+    def test_serializer(self):
+        # count, страница, сотрудники, их телефоны
+        self.assert_fixed_queries(4)
+
+    @skipIf(settings.SHARD_DATABASES, 'queries of the shards are not counted')
+    @override_settings(FAST_SERIALIZATION=True)
+    def test_fast_serialization(self):
+        self.assert_fixed_queries(4)
+
+    @override_settings(FAST_SERIALIZATION=False)
+    def test_matching_employees_limit(self):
+        response = self.client.get(
+            SEARCH_URL, {'q': 'Поликлиника 3 сотрудник', 'page_size': 100}
+        )
+        organization, = [
+            organization for organization in response.data['results']
+            if organization['name'] == 'Поликлиника 3'
+        ]
+        self.assertEqual(
+            [employee['name'] for employee in organization['employees']],
+            [f'Поликлиника 3 сотрудник {number}' for number in range(5)]
+        )
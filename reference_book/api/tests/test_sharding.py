@@ -0,0 +1,308 @@
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import changes, deletion, read_model, sharding
+from api.models import (
+    DeletionJob, Employee, EmployeeCard, Organization, Phone, Tombstone
+)
+
+from .helpers import create_user
+
+
+# Без DB_SHARDS разделение включается только здесь, на тестовой базе из
+# settings.TEST_SHARD_DATABASES
+if settings.SHARD_DATABASES:
+    SHARDS = settings.SHARD_DATABASES
+    ROUTERS = settings.DATABASE_ROUTERS
+elif settings.TEST_SHARD_DATABASES:
+    SHARDS = [DEFAULT_DB_ALIAS, *settings.TEST_SHARD_DATABASES]
+    ROUTERS = ['api.sharding.ShardRouter', *settings.DATABASE_ROUTERS]
+else:
+    SHARDS = ROUTERS = []
+
+
+@skipUnless(SHARDS, 'DB_SHARDS is not set')
+@override_settings(
+    API_CACHE_TIMEOUT=0, SHARD_DATABASES=SHARDS, DATABASE_ROUTERS=ROUTERS
+)
+class ShardingTests(TransactionTestCase):
+    """
+    Every shard is a separate SQLite file. Fan-out runs in threads only
+    outside transactions, so TestCase would not exercise it.
+    """
+
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        # Тестовые базы мигрированы до override_settings
+        for alias in SHARDS:
+            sharding.reserve_id_ranges(alias)
+        self.owner = create_user()
+        self.local, self.remote = settings.SHARD_DATABASES[:2]
+        self.clinic = self.create_organization('Поликлиника', self.local)
+        self.school = self.create_organization('Школа', self.remote)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def create_organization(self, name, shard, employees=2):
+        organization = Organization.objects.create(
+            name=name, address='Адрес', description='Описание',
+            owner=self.owner, shard=shard
+        )
+        with sharding.use(shard):
+            for number in range(employees):
+                employee = Employee.objects.create(
+                    name=f'{name} сотрудник {number}', position='Инженер',
+                    organization=organization
+                )
+                Phone.objects.create(
+                    employee=employee,
+                    phone_number=f'+7916{organization.pk:03}{number:02}00'
+                )
+        return organization
+
+    def rows(self, alias, organization):
+        return (
+            Employee.objects.using(alias).filter(
+                organization_id=organization.pk
+            ).count(),
+            Phone.objects.using(alias).filter(
+                employee__organization_id=organization.pk
+            ).count(),
+        )
+
+    def test_rows_are_written_to_the_shard_of_the_organization(self):
+        self.assertEqual(self.rows(self.remote, self.school), (2, 2))
+        self.assertEqual(self.rows(self.local, self.school), (0, 0))
+        self.assertEqual(self.rows(self.local, self.clinic), (2, 2))
+
+    def test_ids_come_from_the_range_of_the_shard(self):
+        start = (
+            settings.SHARD_DATABASES.index(self.remote)
+            * settings.SHARD_ID_RANGE
+        )
+        ids = Employee.objects.using(self.remote).values_list('pk', flat=True)
+        self.assertTrue(all(pk >= start for pk in ids))
+
+    def test_foreign_keys_are_kept_only_in_default(self):
+        for alias in SHARDS:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, Employee._meta.db_table
+                )
+            foreign_keys = [
+                constraint['foreign_key']
+                for constraint in constraints.values()
+                if constraint['columns'] == ['organization_id']
+                and constraint['foreign_key']
+            ]
+            with self.subTest(alias=alias):
+                self.assertEqual(
+                    bool(foreign_keys), alias == DEFAULT_DB_ALIAS
+                )
+
+    def test_api_writes_and_reads_the_shard(self):
+        url = f'/api/v1/organizations/{self.school.pk}/employees/'
+        response = self.client.post(url, {
+            'name': 'Новый сотрудник', 'position': 'Врач',
+            'phones': [
+                {'phone_type': 'work', 'phone_number': '+79990000001'}
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Employee.objects.using(self.remote).filter(
+            name='Новый сотрудник'
+        ).exists())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_fan_out_merges_shards_in_order(self):
+        queryset = sharding.everywhere(Employee.objects.order_by('name'))
+        self.assertEqual(queryset.count(), 4)
+        self.assertEqual(
+            [employee.name for employee in queryset[1:4]],
+            [
+                'Поликлиника сотрудник 1', 'Школа сотрудник 0',
+                'Школа сотрудник 1',
+            ]
+        )
+
+    def test_phone_lookup_merges_shards(self):
+        response = self.client.get('/api/v1/phones/lookup/', {
+            'prefix': '7916'
+        })
+        self.assertEqual(response.status_code, 200)
+        digits = [phone['phone_number'] for phone in response.data['results']]
+        self.assertEqual(len(digits), 4)
+        self.assertEqual(digits, sorted(digits))
+
+    def test_move_organization(self):
+        old_ids = set(Employee.objects.using(self.local).filter(
+            organization_id=self.clinic.pk
+        ).values_list('pk', flat=True))
+        old_phone_ids = set(Phone.objects.using(self.local).filter(
+            employee__organization_id=self.clinic.pk
+        ).values_list('pk', flat=True))
+        call_command(
+            'move_organization', self.clinic.pk, self.remote, grace=0,
+            stdout=StringIO()
+        )
+        self.clinic.refresh_from_db()
+        self.assertEqual(sharding.shard_of(self.clinic), self.remote)
+        self.assertFalse(self.clinic.moving)
+        self.assertEqual(self.rows(self.remote, self.clinic), (2, 2))
+        self.assertEqual(self.rows(self.local, self.clinic), (0, 0))
+        # Ключи сохраняются: для клиентов ленты изменений это правка
+        changes.sequence()
+        self.assertEqual(
+            set(Employee.objects.using(self.remote).filter(
+                organization_id=self.clinic.pk, revision__gt=0
+            ).values_list('pk', flat=True)),
+            old_ids
+        )
+        self.assertEqual(
+            set(Phone.objects.using(self.remote).filter(
+                employee__organization_id=self.clinic.pk
+            ).values_list('pk', flat=True)),
+            old_phone_ids
+        )
+        self.assertFalse(Tombstone.objects.exists())
+        response = self.client.get(
+            f'/api/v1/organizations/{self.clinic.pk}/employees/'
+        )
+        self.assertEqual(response.data['count'], 2)
+
+    def test_sqlite_moves_only_to_later_shards(self):
+        if connections[self.local].vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with self.assertRaises(CommandError):
+            call_command(
+                'move_organization', self.school.pk, self.local, grace=0,
+                stdout=StringIO()
+            )
+        self.assertEqual(self.rows(self.remote, self.school), (2, 2))
+
+    @override_settings(READ_MODEL_ENABLED=True)
+    def test_check_read_model_repairs_every_shard(self):
+        # Сотрудники созданы без модели чтения: карточек нет
+        with self.assertRaises(CommandError):
+            call_command('check_read_model', stdout=StringIO())
+        call_command('check_read_model', repair=True, stdout=StringIO())
+        self.assertEqual(read_model.check(), [])
+        for alias, organization in (
+            (self.local, self.clinic), (self.remote, self.school)
+        ):
+            with self.subTest(alias=alias):
+                self.assertEqual(
+                    EmployeeCard.objects.using(alias).filter(
+                        organization_id=organization.pk
+                    ).count(),
+                    2
+                )
+
+    def test_writes_do_not_wait_for_each_other(self):
+        if connections[self.remote].is_in_memory_db():
+            self.skipTest('SQLite in memory locks the whole table')
+        last = changes.sequence()
+        written = threading.Event()
+        release = threading.Event()
+        default_queries = []
+
+        def write_remote():
+            try:
+                with sharding.use(self.remote), transaction.atomic(
+                    using=self.remote
+                ), CaptureQueriesContext(
+                    connections[DEFAULT_DB_ALIAS]
+                ) as context:
+                    Employee.objects.create(
+                        name='Учитель', position='Учитель',
+                        organization=self.school
+                    )
+                    default_queries.extend(
+                        query['sql'] for query in context.captured_queries
+                    )
+                    written.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=write_remote)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        self.assertTrue(written.wait(10))
+        # Транзакция в другой базе не держит счетчик ревизий
+        self.assertFalse([
+            sql for sql in default_queries if 'api_revisioncounter' in sql
+        ])
+        with sharding.use(self.local):
+            Employee.objects.create(
+                name='Врач', position='Врач', organization=self.clinic
+            )
+        served = changes.changes_since(last)
+        self.assertEqual(
+            [change['data']['name'] for change in served['changes']],
+            ['Врач']
+        )
+        release.set()
+        thread.join()
+        # Запись, зафиксированная позже, получает ревизию после выданных
+        later = changes.changes_since(served['next'])
+        self.assertEqual(
+            [change['data']['name'] for change in later['changes']],
+            ['Учитель']
+        )
+        self.assertGreater(later['changes'][0]['revision'], served['next'])
+
+    def test_delete_purges_the_shard(self):
+        self.school.delete()
+        self.assertEqual(self.rows(self.remote, self.school), (0, 0))
+        self.assertEqual(self.rows(self.local, self.clinic), (2, 2))
+
+    def test_queryset_delete_purges_the_shard(self):
+        Organization.objects.filter(pk=self.school.pk).delete()
+        self.assertEqual(self.rows(self.remote, self.school), (0, 0))
+
+    def test_admin_delete_is_run_as_a_deletion_job(self):
+        admin = create_user(
+            'admin@example.com', is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/api/organization/{self.school.pk}/delete/',
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        job = DeletionJob.objects.get(organization_id=self.school.pk)
+        self.assertTrue(deletion.run(job))
+        self.assertFalse(
+            Organization.objects.filter(pk=self.school.pk).exists()
+        )
+        self.assertEqual(self.rows(self.remote, self.school), (0, 0))
+
+    def test_admin_bulk_delete_is_run_as_deletion_jobs(self):
+        admin = create_user(
+            'admin@example.com', is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+        response = self.client.post('/admin/api/organization/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [self.clinic.pk, self.school.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        for job in DeletionJob.objects.all():
+            self.assertTrue(deletion.run(job))
+        self.assertFalse(Organization.objects.exists())
+        self.assertEqual(self.rows(self.remote, self.school), (0, 0))
+        self.assertEqual(self.rows(self.local, self.clinic), (0, 0))
@@ -0,0 +1,78 @@
+import threading
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test import TransactionTestCase
+
+from api import utils
+from api.models import User
+
+
+def register_in_thread(username, email):
+    """Commit a registration from another connection, as a parallel request"""
+    def register():
+        try:
+            User.objects.create_user(
+                username=username, email=email, password='password'
+            )
+        finally:
+            connection.close()
+    thread = threading.Thread(target=register)
+    thread.start()
+    thread.join()
+
+
+class ConcurrentUsernameTests(TransactionTestCase):
+
+    def allocate_then(self, action):
+        """set_username that runs action between allocation and insert"""
+        set_username = utils.set_username
+
+        def allocate(email):
+            username = set_username(email)
+            action(username)
+            return username
+        return mock.patch('api.utils.set_username', side_effect=allocate)
+
+    def test_taken_username_is_allocated_again(self):
+        User.objects.create_user(
+            username='ivanov', email='ivanov@mail.ru', password='password'
+        )
+        calls = []
+
+        def race(username):
+            # Вторая регистрация успевает занять тот же ivanov1
+            if not calls:
+                register_in_thread(username, 'ivanov@example.com')
+            calls.append(username)
+        with self.allocate_then(race):
+            user = utils.create_user_with_username(
+                'ivanov@gmail.com', password='password'
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(user.username, 'ivanov2')
+        self.assertCountEqual(
+            User.objects.values_list('username', flat=True),
+            ['ivanov', 'ivanov1', 'ivanov2']
+        )
+
+    def test_other_integrity_error_is_not_retried(self):
+        User.objects.create_user(
+            username='ivanov', email='ivanov@mail.ru', password='password'
+        )
+        with self.allocate_then(lambda username: None) as allocate:
+            with self.assertRaises(IntegrityError):
+                utils.create_user_with_username(
+                    'ivanov@mail.ru', password='password'
+                )
+        self.assertEqual(allocate.call_count, 1)
+
+    def test_attempts_are_limited(self):
+        def race(username):
+            register_in_thread(username, f'{username}@example.com')
+        with self.allocate_then(race) as allocate:
+            with self.assertRaises(IntegrityError):
+                utils.create_user_with_username(
+                    'petrov@mail.ru', password='password'
+                )
+        self.assertEqual(allocate.call_count, utils.USERNAME_ATTEMPTS)
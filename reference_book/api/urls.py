@@ -8,13 +8,21 @@ from rest_framework_simplejwt.views import (
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .serializers import TokenObtainPairSerializer
 from .views import (
+    AutocompleteViewSet,
     OrganizationCRUDViewSet,
     OrganizationListViewSet,
     EmployeeViewSet,
+    ChangesViewSet,
+    DeletionJobViewSet,
+    ExportViewSet,
+    PhoneBulkViewSet,
     PhoneCRUDViewSet,
+    PhoneLookupViewSet,
     CreateUserViewSet,
     UserInfoViewSet,
+    metrics_view,
 )
 
 
@@ -30,6 +38,11 @@ router_1.register(
     OrganizationCRUDViewSet,
     basename='organization-detail'
 )
+router_1.register(
+    'organizations/deletions',
+    DeletionJobViewSet,
+    basename='deletion-jobs'
+)
 router_1.register(
     r'organizations/(?P<org_id>[\d]+)/employees',
     EmployeeViewSet,
@@ -40,6 +53,31 @@ router_1.register(
     PhoneCRUDViewSet,
     basename='phones'
 )
+router_1.register(
+    r'organizations/(?P<org_id>[\d]+)/phones',
+    PhoneBulkViewSet,
+    basename='phones-bulk'
+)
+router_1.register(
+    'autocomplete',
+    AutocompleteViewSet,
+    basename='autocomplete'
+)
+router_1.register(
+    'phones/lookup',
+    PhoneLookupViewSet,
+    basename='phone-lookup'
+)
+router_1.register(
+    'changes',
+    ChangesViewSet,
+    basename='changes'
+)
+router_1.register(
+    'export',
+    ExportViewSet,
+    basename='export'
+)
 router_1.register(
     'users',
     CreateUserViewSet,
@@ -84,11 +122,18 @@ swagger_urlpatterns = [
 
 
 auth_urlpatterns = [
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path(
+        'token/',
+        TokenObtainPairView.as_view(
+            serializer_class=TokenObtainPairSerializer
+        ),
+        name='token_obtain_pair'
+    ),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
 
 urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
     path('v1/auth/', include(auth_urlpatterns)),
     path('v1/', include(router_1.urls)),
     path('v1/', include(swagger_urlpatterns))
@@ -1,13 +1,50 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 
 
 User = get_user_model()
 
+USERNAME_ATTEMPTS = 10
 
-def set_username(email):
-    username = email.split('@')[0]
+
+def next_free_username(base, taken):
+    if base not in taken:
+        return base
+    suffixes = {
+        int(username[len(base):]) for username in taken
+        if username[len(base):].isdigit()
+    }
     counter = 1
-    while User.objects.filter(username=username):
-        username = username + str(counter)
+    while counter in suffixes:
         counter += 1
-    return username
\ No newline at end of file
+    return base + str(counter)
+
+
+def set_username(email):
+    """Email local part with the lowest free numeric suffix, one query"""
+    username = email.split('@')[0]
+    taken = set(User.objects.filter(
+        username__startswith=username
+    ).values_list('username', flat=True))
+    return next_free_username(username, taken)
+
+
+def create_user_with_username(email, **fields):
+    """
+    Create a user with an allocated username. A concurrent registration
+    may take the same name first - the unique_username constraint rejects
+    the insert and the allocation is repeated.
+    """
+    for attempt in range(USERNAME_ATTEMPTS):
+        username = set_username(email)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    username=username, email=email, **fields
+                )
+        except IntegrityError:
+            last_attempt = attempt == USERNAME_ATTEMPTS - 1
+            if last_attempt or not User.objects.filter(
+                username=username
+            ).exists():
+                raise
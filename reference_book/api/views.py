@@ -1,41 +1,97 @@
+import io
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
+from . import (
+    autocomplete, bulk, changes, deletion, export, fast_serializers,
+    importer, metrics, read_model, sharding
+)
+from .cache import CachedResponseMixin, organization_scope
 from .filters import CustomSearchFilter
-from .models import Employee, Organization
+from .models import (
+    DeletionJob, EmployeeCard, Organization, Phone, PHONE_TYPES,
+    digits_prefix, normalize_phone_number
+)
 from .serializers import (
+    DeletionJobSerializer,
     EmployeeSerializer,
     OrganizationCRUDSerializer,
     OrganizationListSerializer,
+    PhoneBulkAddSerializer,
+    PhoneBulkDeleteSerializer,
+    PhoneOwnerSerializer,
+    PhoneReplaceSerializer,
     PhoneSerialiser,
     UserCreateSerializer,
     UserInfoSerializer
 )
 from .pagination import ResultsSetPagination
+from .rules import DUPLICATE_PHONE_MESSAGE, concurrent_conflict
 from .permissions import (
+    IsOrganizationOwnerOrModifier,
     IsOwnerOrModifierOrReadOnly,
     IsOwnerOrModifier,
-    IsOwner
+    IsOwner,
+    get_employee,
+    get_organization
 )
-from .utils import set_username
+from .utils import create_user_with_username
 
 
 User = get_user_model()
 
 
+class OrganizationMoving(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        'Организация переносится в другую базу данных, повторите позже'
+    )
+    default_code = 'organization_moving'
+
+
+class OrganizationShardMixin:
+    """
+    Endpoints of one organization: employees and phones are read from and
+    written to the shard of the organization from the url. Writes are
+    refused while move_organization moves it to another shard.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        if sharding.is_enabled():
+            organization = get_organization(self)
+            self._shard_token = sharding.activate(
+                sharding.shard_of(organization)
+            )
+        super().initial(request, *args, **kwargs)
+        if (sharding.is_enabled() and get_organization(self).moving
+                and request.method not in permissions.SAFE_METHODS):
+            raise OrganizationMoving()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            sharding.deactivate(token)
+            self._shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 class CreateUserViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = User.objects.all()
     serializer_class = UserCreateSerializer
     permission_classes = [permissions.AllowAny]
 
     def perform_create(self, serializer):
-        username = set_username(serializer.validated_data['email'])
-        User.objects.create_user(
-            username=username, **serializer.validated_data
-        )
+        create_user_with_username(**serializer.validated_data)
 
 
 class UserInfoViewSet(viewsets.GenericViewSet):
@@ -59,33 +115,66 @@ class UserInfoViewSet(viewsets.GenericViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class OrganizationListViewSet(viewsets.GenericViewSet,
+class OrganizationListViewSet(CachedResponseMixin,
+                              viewsets.GenericViewSet,
                               mixins.ListModelMixin):
     """List of organization with /search endpoint"""
-    queryset = Organization.objects.all()
+    queryset = Organization.objects.filter(deleting=False)
     serializer_class = OrganizationListSerializer
     pagination_class = ResultsSetPagination
+    keyset_ordering = ('name', 'id')
     permission_classes = [permissions.AllowAny]
     filter_backends = [CustomSearchFilter]
+    use_search_backend = True
     search_fields = [
         'name',
         'employees__name',
         'employees__phones__phone_number'
     ]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        search = self.request.query_params.get('q')
+        if search:
+            queryset = self.get_serializer_class().setup_eager_loading(
+                queryset, search
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        handler = (
+            self.list_rows if fast_serializers.is_enabled()
+            else super().list
+        )
+        return self.cached(handler, request, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        """Same output as OrganizationListSerializer from .values() rows"""
+        queryset = fast_serializers.organizations.values(
+            self.filter_queryset(super().get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        data = fast_serializers.serialize_organizations(
+            queryset if page is None else page,
+            request.query_params.get(CustomSearchFilter.search_param)
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
     @action(
         methods=['get'], detail=False,
         url_path='search', url_name='search'
     )
     def search(self, request, *args, **kwargs):
-        return self.list(self, request, *args, **kwargs)
+        return self.list(request, *args, **kwargs)
 
 
 class OrganizationCRUDViewSet(viewsets.GenericViewSet,
                               mixins.RetrieveModelMixin,
                               mixins.UpdateModelMixin,
                               mixins.DestroyModelMixin):
-    queryset = Organization.objects.all()
+    queryset = Organization.objects.filter(deleting=False)
     serializer_class = OrganizationCRUDSerializer
     permission_classes = [
         IsOwner,
@@ -103,11 +192,38 @@ class OrganizationCRUDViewSet(viewsets.GenericViewSet,
         serializer.save(owner=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        The organization disappears at once, its employees and phones are
+        deleted in the background: 202 with the deletion job
+        """
+        organization = self.get_object()
+        if organization.moving:
+            raise OrganizationMoving()
+        job = deletion.schedule(organization, request.user)
+        data = DeletionJobSerializer(job, context={'request': request}).data
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': data['url']}
+        )
+
+
+class DeletionJobViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    """Status and progress of an organization deletion"""
+    serializer_class = DeletionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        return DeletionJob.objects.filter(requested_by_id=self.request.user.pk)
+
+
+class EmployeeViewSet(OrganizationShardMixin, CachedResponseMixin,
+                      viewsets.ModelViewSet):
     serializer_class = EmployeeSerializer
     permission_classes = [IsOwnerOrModifierOrReadOnly]
     pagination_class = ResultsSetPagination
+    # pk совпадает у сотрудника и его карточки из read model
+    keyset_ordering = ('pk',)
     filter_backends = [CustomSearchFilter]
     search_fields = [
         'name',
@@ -115,35 +231,364 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         'phones__phone_number'
     ]
 
-    def get_queryset(self):
-        organization = get_object_or_404(
-            Organization.objects.prefetch_related('employees'),
-            id=self.kwargs['org_id']
+    def get_cache_scopes(self):
+        return [organization_scope(self.kwargs['org_id'])]
+
+    def list(self, request, *args, **kwargs):
+        if read_model.is_enabled():
+            handler = self.list_cards
+        elif fast_serializers.is_enabled():
+            handler = self.list_rows
+        else:
+            handler = super().list
+        return self.cached(handler, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Ответ из кэша минует get_object(), поэтому права на объект
+        # проверяются заранее - они зависят только от организации
+        self.check_object_permissions(request, get_organization(self))
+        handler = (
+            self.retrieve_card if read_model.is_enabled()
+            else super().retrieve
         )
-        return organization.employees.all()
+        return self.cached(handler, request, *args, **kwargs)
+
+    def list_cards(self, request, *args, **kwargs):
+        """Ready documents from the read model, no nested serializers"""
+        cards = EmployeeCard.objects.filter(
+            sharding.exclude_deleting('organization'),
+            organization_id=self.kwargs['org_id']
+        ).order_by('pk')
+        if request.query_params.get(CustomSearchFilter.search_param):
+            cards = cards.filter(pk__in=self.filter_queryset(
+                self.get_queryset()
+            ).values('pk'))
+        page = self.paginate_queryset(cards)
+        documents = [
+            card.document for card in (cards if page is None else page)
+        ]
+        if not documents:
+            # Пустая выдача: 404, если нет самой организации
+            get_organization(self)
+        if page is None:
+            return Response(documents)
+        return self.get_paginated_response(documents)
+
+    def list_rows(self, request, *args, **kwargs):
+        """Same output as EmployeeSerializer from .values() rows"""
+        queryset = fast_serializers.employees.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        data = fast_serializers.serialize_employees(
+            queryset if page is None else page
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve_card(self, request, *args, **kwargs):
+        card = get_object_or_404(
+            EmployeeCard.objects.only('document'),
+            pk=self.kwargs['pk'], organization_id=self.kwargs['org_id']
+        )
+        return Response(card.document)
+
+    def get_queryset(self):
+        return get_organization(self).employees.order_by('pk')
+
+    def get_serializer(self, *args, **kwargs):
+        # POST со списком создает сотрудников одним пакетом
+        if self.action == 'create' and isinstance(kwargs.get('data'), list):
+            kwargs.update(many=True, allow_empty=False)
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
-        organization = get_object_or_404(
-            Organization, id=self.kwargs['org_id']
+        serializer.save(organization=get_organization(self))
+
+    @action(
+        methods=['post'], detail=False,
+        url_path='import', url_name='import',
+        parser_classes=[MultiPartParser]
+    )
+    def import_directory(self, request, *args, **kwargs):
+        """Bulk import of employees with phones from CSV or JSON Lines"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': ['Файл не передан']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        file_format = (
+            request.data.get('format') or importer.guess_format(upload.name)
+        )
+        if file_format not in importer.FORMATS:
+            return Response(
+                {'format': [
+                    f'Допустимые форматы: {", ".join(importer.FORMATS)}'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # newline='': переводы строк внутри кавычек CSV сохраняются
+        stream = io.TextIOWrapper(
+            upload.file, encoding='utf-8-sig', newline=''
+        )
+        report = importer.DirectoryImporter(get_organization(self)).run(
+            importer.READERS[file_format](stream)
         )
-        serializer.save(organization=organization)
+        return Response(report, status=status.HTTP_200_OK)
 
 
-class PhoneCRUDViewSet(viewsets.ModelViewSet):
+class PhoneCRUDViewSet(OrganizationShardMixin, viewsets.ModelViewSet):
     serializer_class = PhoneSerialiser
     permission_classes = [IsOwnerOrModifier]
     pagination_class = ResultsSetPagination
 
     def get_queryset(self):
-        employee = get_object_or_404(
-            Employee.objects.prefetch_related('phones'),
-            id=self.kwargs['emp_id'], organization_id=self.kwargs['org_id']
+        return get_employee(self).phones.order_by('pk')
+
+    def list(self, request, *args, **kwargs):
+        if not fast_serializers.is_enabled():
+            return super().list(request, *args, **kwargs)
+        queryset = fast_serializers.phones.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        data = fast_serializers.serialize_phones(
+            queryset if page is None else page
         )
-        return employee.phones.all()
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
     def perform_create(self, serializer):
-        employee = get_object_or_404(
-            Employee.objects.prefetch_related('phones'),
-            id=self.kwargs['emp_id'], organization_id=self.kwargs['org_id']
+        serializer.save(employee=get_employee(self))
+
+
+class PhoneBulkViewSet(OrganizationShardMixin, viewsets.GenericViewSet):
+    """
+    Bulk phone operations across one organization. Each call is a single
+    transaction and answers with a result for every item.
+    """
+    permission_classes = [IsOrganizationOwnerOrModifier]
+    serializer_classes = {
+        'replace': PhoneReplaceSerializer,
+        'add': PhoneBulkAddSerializer,
+        'delete_many': PhoneBulkDeleteSerializer,
+    }
+
+    def get_serializer_class(self):
+        return self.serializer_classes[self.action]
+
+    def get_queryset(self):
+        return Phone.objects.filter(
+            employee__organization=get_organization(self)
+        )
+
+    def run(self, request, operation):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with concurrent_conflict(DUPLICATE_PHONE_MESSAGE):
+            result = operation(
+                get_organization(self), **serializer.validated_data
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False)
+    def replace(self, request, *args, **kwargs):
+        """Replace a number on every phone of the organization"""
+        return self.run(request, bulk.replace_number)
+
+    @action(methods=['post'], detail=False)
+    def add(self, request, *args, **kwargs):
+        """Add the same phone to many employees"""
+        return self.run(request, bulk.add_phone)
+
+    # Не delete: метод с таким именем принимал бы и HTTP DELETE
+    @action(
+        methods=['post'], detail=False,
+        url_path='delete', url_name='delete'
+    )
+    def delete_many(self, request, *args, **kwargs):
+        """Delete a set of phones of the organization"""
+        return self.run(request, bulk.delete_phones)
+
+
+class AutocompleteViewSet(viewsets.ViewSet):
+    """
+    Typeahead: ?q= is the start of an organization name, of any word of an
+    employee name or of a phone number, ?limit= up to 50 (10 by default).
+    Answered from the in-memory prefix index of api.autocomplete.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(
+                request.query_params.get('limit', autocomplete.DEFAULT_LIMIT)
+            )
+        except ValueError:
+            raise ValidationError({'limit': ['Ожидается целое число']})
+        limit = min(max(limit, 1), autocomplete.MAX_LIMIT)
+        index = autocomplete.get_index(build_missing=True)
+        if index is None:
+            return Response(autocomplete.lookup_database(query, limit))
+        return Response(index.lookup(query, limit))
+
+
+class PhoneLookupViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
+    """
+    Who owns this number: ?number= exact match on the normalized digits,
+    ?prefix= all numbers starting with the given digits. Both are range
+    scans of the phone_digits index. With sharding every shard is scanned
+    in parallel and the rows merged by number.
+    """
+    serializer_class = PhoneOwnerSerializer
+    pagination_class = ResultsSetPagination
+    keyset_ordering = ('phone_digits', 'id')
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        if not sharding.is_enabled():
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.get_queryset())
+        # Организации - в основной базе: одним запросом на страницу
+        organizations = Organization.objects.in_bulk({
+            phone.employee.organization_id for phone in page
+        })
+        page = [
+            phone for phone in page
+            if phone.employee.organization_id in organizations
+        ]
+        for phone in page:
+            phone.employee.organization = organizations[
+                phone.employee.organization_id
+            ]
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
         )
-        serializer.save(employee=employee)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Phone.objects.filter(
+            sharding.exclude_deleting('employee__organization')
+        ).select_related(
+            'employee' if sharding.is_enabled()
+            else 'employee__organization'
+        ).order_by('phone_digits', 'id')
+        queryset = sharding.everywhere(queryset)
+        if 'number' in params:
+            digits = normalize_phone_number(params['number'])
+            if digits:
+                return queryset.filter(phone_digits=digits)
+        elif 'prefix' in params:
+            digits = normalize_phone_number(params['prefix'])
+            if digits:
+                return queryset.filter(digits_prefix('phone_digits', digits))
+        raise ValidationError(
+            {'number': ['Укажите номер (number) или его начало (prefix)']}
+        )
+
+
+class ChangesViewSet(viewsets.ViewSet):
+    """
+    Change feed for sync clients: ?since=<revision> returns up to ?limit=
+    (500 by default, at most 5000) created, updated and deleted objects
+    after that revision, oldest first. The client applies them and asks
+    again with since=next while has_more is true; since=0 is a full sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        numbers = {}
+        errors = {}
+        for param, default in (
+            ('since', 0), ('limit', changes.DEFAULT_LIMIT)
+        ):
+            try:
+                numbers[param] = int(
+                    request.query_params.get(param, default)
+                )
+            except ValueError:
+                errors[param] = ['Ожидается целое число']
+        if not errors and numbers['since'] < 0:
+            errors['since'] = ['Ревизия не может быть отрицательной']
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(numbers['limit'], 1), changes.MAX_LIMIT)
+        try:
+            return Response(changes.changes_since(numbers['since'], limit))
+        except changes.FeedExpired as error:
+            return Response(
+                {'detail': (
+                    f'История удалений до ревизии {error.pruned} очищена, '
+                    'выполните полную синхронизацию с since=0'
+                )},
+                status=status.HTTP_410_GONE
+            )
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Streaming CSV/NDJSON dump of organization -> employee -> phone rows.
+    ?after=<organization_id>:<employee_id>:<phone_id> resumes from the
+    last received row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        output = params.get('output', export.CSV)
+        errors = {}
+        if output not in export.FORMATS:
+            errors['output'] = [
+                f'Допустимые форматы: {", ".join(export.FORMATS)}'
+            ]
+        phone_type = params.get('phone_type')
+        if phone_type and phone_type not in dict(PHONE_TYPES):
+            errors['phone_type'] = ['Недопустимый тип номера']
+        organization_id = after = None
+        try:
+            organization_id = int(params.get('organization') or 0) or None
+        except ValueError:
+            errors['organization'] = ['Ожидается целое число']
+        if params.get('after'):
+            try:
+                after = export.parse_cursor(params['after'])
+            except ValueError:
+                errors['after'] = [
+                    'Ожидается organization_id:employee_id:phone_id '
+                    'последней полученной строки'
+                ]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        rows = export.export_rows(
+            organization_id=organization_id,
+            phone_type=phone_type or None,
+            after=after
+        )
+        response = StreamingHttpResponse(
+            export.RENDERERS[output](rows),
+            content_type=export.CONTENT_TYPES[output]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="directory.{output}"'
+        )
+        return response
+
+
+@require_GET
+def metrics_view(request):
+    """Request histograms of this process in Prometheus text format"""
+    # Без METRICS_TOKEN метрики не отдаются: маршруты и нагрузка не
+    # должны быть видны кому угодно
+    if not settings.METRICS_TOKEN or not constant_time_compare(
+        request.headers.get('Authorization', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
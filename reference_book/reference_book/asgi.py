@@ -2,6 +2,8 @@
 ASGI config for reference_book project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are resolved against ASYNC_ROOT_URLCONF, where read endpoints of
+the directory API are async views backed by a bounded thread pool.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -9,8 +11,21 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reference_book.settings')
 
-application = get_asgi_application()
+
+class AsyncReadASGIHandler(ASGIHandler):
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASYNC_ROOT_URLCONF
+        return request, error_response
+
+
+django.setup(set_prefix=False)
+
+application = AsyncReadASGIHandler()
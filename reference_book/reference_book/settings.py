@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -25,10 +26,12 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'drf_yasg',
-    'api',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,13 +61,164 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'reference_book.wsgi.application'
 
-DATABASES = {
-    'default': {
+# URLconf для ASGI: чтение справочника через пул потоков (api/async_views.py)
+ASYNC_ROOT_URLCONF = 'reference_book.async_urls'
+
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', 16))
+
+# sqlite - локальная разработка, postgresql - production
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# pgbouncer - соединения идут через PgBouncer в режиме transaction
+DB_POOLER = os.getenv('DB_POOLER', '')
+
+# Проверка живости постоянных соединений перед каждым запросом
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'False') == 'True'
+
+
+def postgresql_database(host, port):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'reference_book'),
+        'USER': os.getenv('DB_USER', 'postgres'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': host,
+        'PORT': port,
+        # Через пулер соединения держит PgBouncer, а не Django
+        'CONN_MAX_AGE': (
+            0 if DB_POOLER else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        # Серверные курсоры (QuerySet.iterator) не переживают
+        # transaction pooling
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOLER == 'pgbouncer',
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': postgresql_database(
+            os.getenv('DB_HOST', 'localhost'), os.getenv('DB_PORT', '5432')
+        ),
+    }
+    # Реплики для чтения: host:port через запятую
+    for number, address in enumerate(filter(None, os.getenv(
+        'DB_REPLICAS', ''
+    ).split(',')), start=1):
+        host, _, port = address.strip().partition(':')
+        DATABASES[f'replica_{number}'] = {
+            **postgresql_database(host, port or '5432'),
+            'TEST': {'MIRROR': 'default'},
+        }
+    # Базы для сотрудников и телефонов организаций: host:port через запятую
+    for number, address in enumerate(filter(None, os.getenv(
+        'DB_SHARDS', ''
+    ).split(',')), start=1):
+        host, _, port = address.strip().partition(':')
+        DATABASES[f'shard_{number}'] = postgresql_database(
+            host, port or '5432'
+        )
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    # Для локальной проверки реплик и разделения - файлы баз через
+    # запятую. Данные в файлы реплик не копируются
+    for prefix, variable in (('replica', 'DB_REPLICAS'),
+                             ('shard', 'DB_SHARDS')):
+        for number, name in enumerate(filter(None, os.getenv(
+            variable, ''
+        ).split(',')), start=1):
+            DATABASES[f'{prefix}_{number}'] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': BASE_DIR / name.strip(),
+            }
+
+REPLICA_DATABASES = [
+    alias for alias in DATABASES if alias.startswith('replica_')
+]
+
+# Разделение по организациям (api/sharding.py): сотрудники и телефоны
+# организации хранятся в одной из этих баз, первая - основная. Новые базы
+# добавляются только в конец DB_SHARDS: от номера зависит диапазон id
+SHARD_DATABASES = [
+    alias for alias in DATABASES
+    if alias == 'default' or alias.startswith('shard_')
+]
+if len(SHARD_DATABASES) == 1:
+    SHARD_DATABASES = []
+
+# manage.py test без DB_SHARDS на SQLite: тесты разделения
+# (api/tests/test_sharding.py) включают его через override_settings на
+# этой базе, остальные тесты идут без разделения. База в файле: открытая
+# запись в базе в памяти блокирует чтение всей таблицы другими потоками
+TEST_SHARD_DATABASES = []
+if (DB_ENGINE != 'postgresql' and not SHARD_DATABASES
+        and sys.argv[1:2] == ['test']):
+    DATABASES['shard_test'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': BASE_DIR / 'shard_test.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'shard_test.sqlite3'},
+    }
+    TEST_SHARD_DATABASES = ['shard_test']
+
+# Сколько id сотрудников и телефонов отведено каждой базе
+SHARD_ID_RANGE = int(os.getenv('SHARD_ID_RANGE', 100000000))
+
+# Потоки для одновременных запросов ко всем базам при поиске
+SHARD_FANOUT_WORKERS = int(os.getenv('SHARD_FANOUT_WORKERS', 8))
+
+# Сколько секунд после записи пользователь читает основную базу
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Кэш (алиас из CACHES) для отметок о записи. Он должен быть общим для
+# всех процессов: иначе запрос, попавший в другой процесс, читает реплику
+# и не видит только что сделанных правок
+REPLICA_STICKY_CACHE = os.getenv('REPLICA_STICKY_CACHE', 'default')
+
+DATABASE_ROUTERS = (
+    (['api.sharding.ShardRouter'] if SHARD_DATABASES else [])
+    + (['api.db.ReplicaRouter'] if REPLICA_DATABASES else [])
+)
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Кэши в памяти процесса: изменения, сделанные в одном процессе, не видны
+# остальным
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Время жизни закэшированных ответов API в секундах, 0 - без кэша. По
+# умолчанию кэш включен только с общим для процессов CACHE_BACKEND: иначе
+# процессы не видят сброса поколений друг друга и отдают устаревшие ответы
+API_CACHE_TIMEOUT = int(os.getenv(
+    'API_CACHE_TIMEOUT',
+    0 if CACHE_BACKEND in PROCESS_LOCAL_CACHES else 300
+))
+
+# Выдача сотрудников из готовых карточек (api/read_model.py); после
+# включения выполнить python manage.py rebuild_read_model
+READ_MODEL_ENABLED = os.getenv('READ_MODEL_ENABLED', 'False') == 'True'
+
+# Время хранения решений о правах редактирования между запросами, 0 - выкл.
+ACL_CACHE_TIMEOUT = int(os.getenv('ACL_CACHE_TIMEOUT', 0))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,11 +254,80 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'api.authentication.JWTAuthentication',
+    ),
+    # Те же байты, что у JSONRenderer; через orjson, если он установлен
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Перечни организаций, сотрудников и телефонов из .values() без
+# сериализаторов DRF (api/fast_serializers.py)
+FAST_SERIALIZATION = os.getenv('FAST_SERIALIZATION', 'True') == 'True'
+
+SEARCH_BACKEND = os.getenv(
+    'SEARCH_BACKEND', 'api.search.SQLiteFTSSearchBackend'
+)
+
+# Автодополнение из префиксного индекса в памяти процесса: индекс больше
+# AUTOCOMPLETE_MAX_KEYS ключей не строится (запросы идут в БД), изменения
+# из других процессов видны после перестроения раз в AUTOCOMPLETE_MAX_AGE с
+AUTOCOMPLETE_ENABLED = os.getenv('AUTOCOMPLETE_ENABLED', 'True') == 'True'
+AUTOCOMPLETE_MAX_KEYS = int(os.getenv('AUTOCOMPLETE_MAX_KEYS', 2000000))
+AUTOCOMPLETE_MAX_AGE = int(os.getenv('AUTOCOMPLETE_MAX_AGE', 300))
+
+# Фоновое удаление организаций (run_deletion_jobs): сотрудников за одну
+# транзакцию и через сколько секунд без отметки задачу забирает другой
+DELETION_CHUNK_SIZE = int(os.getenv('DELETION_CHUNK_SIZE', 500))
+DELETION_POLL_SECONDS = int(os.getenv('DELETION_POLL_SECONDS', 5))
+DELETION_STALE_SECONDS = int(os.getenv('DELETION_STALE_SECONDS', 300))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=14),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+
+# Откуда берется пользователь по токену: database - запрос на каждый
+# запрос API, cached - кэш строк в памяти процесса, claims - из claims
+# токена, строка загружается только при обращении к другим полям. cached и
+# claims видят изменения из других процессов с задержкой, их включают явно
+JWT_USER_MODE = os.getenv('JWT_USER_MODE', 'database')
+
+# Размер кэша пользователей (строк на процесс) и время жизни записи, с
+# которым изменения из других процессов становятся видны
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', 1024))
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', 60))
+
+# Запросы дольше порога (мс) пишутся в лог api.slow_requests вместе с SQL
+# и местом вызова в коде, 0 - выкл. Пока порог задан, для каждого SQL
+# запроса ищется место вызова по стеку, поэтому по умолчанию выключено
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 0))
+
+SLOW_REQUEST_MAX_QUERIES = int(os.getenv('SLOW_REQUEST_MAX_QUERIES', 200))
+
+# Токен для доступа к /api/metrics/, пустой - метрики не отдаются
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'api.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}